@@ -0,0 +1,324 @@
+# Benchmarks for the RTD logger hot paths
+#
+# Runs entirely on the simulated backend, so it works on a laptop.
+#
+#   python benchmarks/bench_rtd.py                       # print results
+#   python benchmarks/bench_rtd.py --save base.json      # record a baseline
+#   python benchmarks/bench_rtd.py --compare base.json   # fail on regressions
+#
+# Each case reports the median of --repeat runs. With --compare, any case
+# slower than baseline * (1 + --tolerance) makes the script exit 1.
+
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'shared'))
+from buffered_writer import BufferedWriter
+from fleet_ingest import Layout
+from metrics import LoggerMetrics
+from reprocess import RowPlan, rewrite
+from robust_stats import RobustWindow
+from rtd_backend import get_backend
+from rtd_convert import CvdCoefficients
+from scanner import Scanner
+from sensor_table import load_fixed
+from window_engine import WindowEngine
+from window_stats import WindowAccumulator
+from wide_format import WideCsv
+
+REPO = Path(__file__).resolve().parents[1]
+FIXED_OFFSETS = REPO / 'fixed-array' / 'scripts' / 'sensor_offsets.json'
+
+# Fixed array layout: 4 hats x 8 channels
+SENSOR_KEYS = [(hat, ch, f"h{hat}c{ch}") for hat in range(4) for ch in range(1, 9)]
+SAMPLES_PER_PERIOD = 10
+
+
+# ------------------------------------------------------
+# Benchmark cases
+# Each case takes the parsed args and returns a callable to time,
+# plus the number of "units" it processes (for throughput).
+# ------------------------------------------------------
+def case_scan(args):
+    """One full 32-sensor scan (getRes + get per sensor)."""
+    rtd = get_backend('sim', latency=args.latency, seed=1)
+
+    def run():
+        for hat, ch, key in SENSOR_KEYS:
+            try:
+                rtd.getRes(hat, ch)
+                rtd.get(hat, ch)
+            except Exception:
+                pass
+    return run, len(SENSOR_KEYS)
+
+
+def case_scan_parallel(args):
+    """One full 32-sensor scan through Scanner (one worker per hat)."""
+    rtd = get_backend('sim', latency=args.latency, seed=1)
+    scanner = Scanner(rtd, [(hat, ch) for hat, ch, key in SENSOR_KEYS])
+    return scanner.scan, len(SENSOR_KEYS)
+
+
+def case_scan_res_only(args):
+    """Parallel scan reading getRes only, temperatures via vectorized CVD."""
+    rtd = get_backend('sim', latency=args.latency, seed=1)
+    coeffs = CvdCoefficients.load(REPO / 'fixed-array' / 'scripts' / 'sensor_coeffs.json',
+                                  [key for hat, ch, key in SENSOR_KEYS])
+    scanner = Scanner(rtd, [(hat, ch) for hat, ch, key in SENSOR_KEYS],
+                      read_mode='res', converter=coeffs)
+    return scanner.scan, len(SENSOR_KEYS)
+
+
+def case_aggregate(args):
+    """Accumulate 10 samples x 32 sensors and average one 5-min window."""
+    rtd = get_backend('sim', seed=2)
+    with open(FIXED_OFFSETS) as f:
+        offsets_dict = json.load(f)
+    scans = [
+        [(rtd.getRes(hat, ch), rtd.get(hat, ch)) for hat, ch, key in SENSOR_KEYS]
+        for _ in range(SAMPLES_PER_PERIOD)
+    ]
+
+    def run():
+        data_accum = {(hat, ch): [] for hat in range(4) for ch in range(1, 9)}
+        for scan in scans:
+            for (hat, ch, key), (resi, temp) in zip(SENSOR_KEYS, scan):
+                height, sensor_num, offset = offsets_dict.get(
+                    key, [float('nan'), float('nan'), 0]
+                )
+                data_accum[(hat, ch)].append((resi, temp, temp + offset))
+        for hat, ch, key in SENSOR_KEYS:
+            samples = data_accum[(hat, ch)]
+            sum(s[0] for s in samples) / len(samples)
+            sum(s[1] for s in samples) / len(samples)
+            sum(s[2] for s in samples) / len(samples)
+    return run, len(SENSOR_KEYS) * SAMPLES_PER_PERIOD
+
+
+def case_aggregate_streaming(args):
+    """Same window through WindowAccumulator (O(1) per sample, NaN-aware)."""
+    rtd = get_backend('sim', seed=2)
+    offsets = [-0.1] * len(SENSOR_KEYS)
+    scans = []
+    for _ in range(SAMPLES_PER_PERIOD):
+        resi = [rtd.getRes(hat, ch) for hat, ch, key in SENSOR_KEYS]
+        temp = [rtd.get(hat, ch) for hat, ch, key in SENSOR_KEYS]
+        scans.append((resi, temp, [t + o for t, o in zip(temp, offsets)]))
+    accum = WindowAccumulator(len(SENSOR_KEYS))
+
+    def run():
+        accum.reset()
+        for resi, temp, corr in scans:
+            accum.add(resi, temp, corr)
+        accum.result()
+    return run, len(SENSOR_KEYS) * SAMPLES_PER_PERIOD
+
+
+def case_aggregate_robust(args):
+    """Reduce one 2 Hz window (600 scans x 32 sensors) with each robust method."""
+    rng = np.random.default_rng(3)
+    n = 600
+    scans = rng.normal(-1.0, 0.05, (n, 3, len(SENSOR_KEYS)))
+    scans[::40, 1] += 5.0   # occasional spikes
+    windows = []
+    for method in ('median', 'trimmed', 'sigma_clip'):
+        window = RobustWindow(len(SENSOR_KEYS), n, method=method)
+        for scan in scans:
+            window.add(*scan)
+        windows.append(window)
+
+    def run():
+        for window in windows:
+            window.result()
+    return run, len(windows) * n * len(SENSOR_KEYS)
+
+
+def case_window_engine(args):
+    """One day of 30-sec scans (8 channels) through WindowEngine."""
+    values = ([-1.0] * 8, [99.6] * 8, [-1.1] * 8)
+    start = 1_767_225_600
+
+    def run():
+        engine = WindowEngine(8, fields=('temp', 'resi', 'corr'))
+        for k in range(2880):
+            engine.add(start + 30 * k, *values)
+    return run, 2880
+
+
+def case_csv_write(args):
+    """Append --windows 5-min windows of 32 long-format rows to a CSV."""
+    tmp_dir = tempfile.TemporaryDirectory()
+    data_file = Path(tmp_dir.name) / 'rtd_tower_data.csv'
+    start = datetime(2026, 1, 1)
+
+    def run():
+        data_file.write_text('')
+        for w in range(args.windows):
+            timestamp_5min = start + timedelta(minutes=5 * w)
+            with data_file.open('a') as f:
+                for hat, ch, key in SENSOR_KEYS:
+                    f.write(
+                        f"{timestamp_5min:%Y-%m-%d %H:%M:%S},"
+                        f"{hat},{ch},{hat * 120 + (ch - 1) * 15},{hat * 8 + ch},"
+                        f"{100.0:.1f},{-1.23:.2f},{-1.33:.2f}\n"
+                    )
+    run.tmp_dir = tmp_dir   # keep the directory alive while timing
+    return run, args.windows * len(SENSOR_KEYS)
+
+
+def case_csv_write_wide(args):
+    """Append --windows 5-min windows as one wide row each."""
+    tmp_dir = tempfile.TemporaryDirectory()
+    sensors = [{'height_cm': hat * 120 + (ch - 1) * 15} for hat, ch, key in SENSOR_KEYS]
+    wide = WideCsv(Path(tmp_dir.name) / 'rtd_tower_data_wide.csv', sensors)
+    values = {'corr': [-1.33] * len(SENSOR_KEYS)}
+    start = datetime(2026, 1, 1)
+
+    def run():
+        wide.path.write_text('')
+        for w in range(args.windows):
+            wide.write(start + timedelta(minutes=5 * w), values)
+    run.tmp_dir = tmp_dir
+    return run, args.windows * len(SENSOR_KEYS)
+
+
+def case_csv_write_buffered(args):
+    """Same rows through BufferedWriter: one journal fsync per window, one flush."""
+    tmp_dir = tempfile.TemporaryDirectory()
+    data_file = Path(tmp_dir.name) / 'rtd_tower_data.csv'
+    start = datetime(2026, 1, 1)
+
+    def run():
+        data_file.write_text('')
+        writer = BufferedWriter(Path(tmp_dir.name) / 'bench.journal', flush_interval=3600)
+        for w in range(args.windows):
+            timestamp_5min = start + timedelta(minutes=5 * w)
+            writer.write(data_file, ''.join(
+                f"{timestamp_5min:%Y-%m-%d %H:%M:%S},"
+                f"{hat},{ch},{hat * 120 + (ch - 1) * 15},{hat * 8 + ch},"
+                f"{100.0:.1f},{-1.23:.2f},{-1.33:.2f}\n"
+                for hat, ch, key in SENSOR_KEYS
+            ))
+            writer.commit()
+        writer.close()
+    run.tmp_dir = tmp_dir
+    return run, args.windows * len(SENSOR_KEYS)
+
+
+def case_metrics(args):
+    """Record one window of scans (10 x 32 sensors) and export it as .prom."""
+    tmp_dir = tempfile.TemporaryDirectory()
+    rtd = get_backend('sim', latency=0, seed=1)
+    scanner = Scanner(rtd, [(hat, ch) for hat, ch, key in SENSOR_KEYS], parallel=False)
+    snaps = [scanner.scan() for _ in range(SAMPLES_PER_PERIOD)]
+    metrics = LoggerMetrics(Path(tmp_dir.name) / 'rtd_bench.prom',
+                            [key for hat, ch, key in SENSOR_KEYS])
+
+    def run():
+        for snap in snaps:
+            metrics.record_scan(snap)
+        metrics.record_write(0.004, 4096)
+        metrics.export()
+    run.tmp_dir = tmp_dir
+    return run, SAMPLES_PER_PERIOD * len(SENSOR_KEYS)
+
+
+def case_reprocess(args):
+    """Re-derive corrected temps for --windows windows of 32 long-format rows."""
+    header = ("Time(UTC),Hat,Channel,Height_cm,Sensor_Number,Resistance_ohms,"
+              "RawTemp_degC,CorrectedTemp_degC,StdTemp_degC,N_Valid,Fault")
+    plan = RowPlan(Layout(header), load_fixed(FIXED_OFFSETS), 2)
+    start = datetime(2026, 1, 1)
+    data = ''.join(
+        f"{start + timedelta(minutes=5 * w):%Y-%m-%d %H:%M:%S},"
+        f"{hat},{ch},{hat * 120 + (ch - 1) * 15},{hat * 8 + ch},"
+        f"{100.0:.1f},{-1.23 + 0.01 * (w % 50):.2f},{-1.33:.2f},0.012,10,0\n"
+        for w in range(args.windows) for hat, ch, key in SENSOR_KEYS
+    ).encode()
+
+    def run():
+        rewrite(data, plan)
+    return run, args.windows * len(SENSOR_KEYS)
+
+
+CASES = {
+    'scan_32': case_scan,
+    'scan_32_parallel': case_scan_parallel,
+    'scan_32_res_only': case_scan_res_only,
+    'aggregate_window': case_aggregate,
+    'aggregate_window_streaming': case_aggregate_streaming,
+    'aggregate_window_robust': case_aggregate_robust,
+    'window_engine_day': case_window_engine,
+    'csv_write': case_csv_write,
+    'csv_write_wide': case_csv_write_wide,
+    'csv_write_buffered': case_csv_write_buffered,
+    'metrics_window': case_metrics,
+    'reprocess_rows': case_reprocess,
+}
+
+
+# ------------------------------------------------------
+# Runner
+# ------------------------------------------------------
+def time_case(run, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the RTD logger hot paths.')
+    parser.add_argument('cases', nargs='*', help=f"cases to run (default: all of {', '.join(CASES)})")
+    parser.add_argument('--repeat', type=int, default=5, help='runs per case, median is reported')
+    parser.add_argument('--latency', type=float, default=0.002, help='simulated seconds per librtd call')
+    parser.add_argument('--windows', type=int, default=288, help='windows written by csv_write (288 = 1 day)')
+    parser.add_argument('--save', type=Path, help='write results to a JSON baseline')
+    parser.add_argument('--compare', type=Path, help='compare against a JSON baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown vs baseline (0.25 = 25%%)')
+    args = parser.parse_args(argv)
+
+    names = args.cases or list(CASES)
+    unknown = [n for n in names if n not in CASES]
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(unknown)}")
+
+    results = {}
+    print(f"{'case':<28}{'median (ms)':>14}{'units/s':>14}")
+    print('-' * 56)
+    for name in names:
+        run, units = CASES[name](args)
+        seconds = time_case(run, args.repeat)
+        results[name] = seconds
+        print(f"{name:<28}{seconds * 1e3:>14.3f}{units / seconds:>14.0f}")
+
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2) + '\n')
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        regressions = [
+            (name, baseline[name], seconds)
+            for name, seconds in results.items()
+            if name in baseline and seconds > baseline[name] * (1 + args.tolerance)
+        ]
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before * 1e3:.3f} ms -> {after * 1e3:.3f} ms")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -20,17 +20,67 @@ A temperature offset is applyed to the corrected temp field using a .json file t
 '''
 
 
+import sys
+import atexit
+import math
+import signal
 import time
-import json
-from datetime import datetime, timedelta
+from datetime import datetime
 from pathlib import Path
-import librtd
+
+# Shared logger modules live in <repo>/shared
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'shared'))
+from adaptive import AdaptiveSampler, fast_ticks
+from buffered_writer import BufferedWriter
+from burst import BurstCapture, GradientTrigger, RateTrigger
+from data_files import prepare_data_file
+from live_snapshot import LivePublisher
+from metrics import LoggerMetrics, metrics_path
+from range_reader import update_index
+from raw_store import RawStoreWriter
+from recovery import GapLog, resume_samples
+from robust_stats import RobustWindow
+from rollups import Rollups
+from rtd_backend import get_backend
+from rtd_convert import CvdCoefficients
+from rtd_daemon import QueryServer
+from scanner import Scanner
+from scheduler import SampleScheduler
+from sensor_health import SensorHealth
+from sensor_table import load_fixed
+from wide_format import WideCsv
+from window_stats import WindowAccumulator
 
 # ------------------------------------------------------
 # File paths
 # ------------------------------------------------------
 data_file = Path('/home/meganmason/Documents/projects/cold-content/snowtemps_raspi/fixed-array/logger_files/rtd_tower_data.csv')
 log_file  = Path('/home/meganmason/Documents/projects/cold-content/snowtemps_raspi/fixed-array/logger_files/rtd_tower_log.txt')
+raw_file  = Path('/home/meganmason/Documents/projects/cold-content/snowtemps_raspi/fixed-array/logger_files/rtd_tower_raw.bin')
+wide_file = Path('/home/meganmason/Documents/projects/cold-content/snowtemps_raspi/fixed-array/logger_files/rtd_tower_data_wide.csv')
+journal_file = Path('/home/meganmason/Documents/projects/cold-content/snowtemps_raspi/fixed-array/logger_files/rtd_tower.journal')
+events_dir = Path('/home/meganmason/Documents/projects/cold-content/snowtemps_raspi/fixed-array/logger_files/events')
+
+# ------------------------------------------------------
+# Output settings
+# ------------------------------------------------------
+OUTPUT_LAYOUT = 'long'      # 'long' (row per sensor), 'wide' (row per window) or 'both'
+WIDE_FIELDS = ('corr',)     # wide columns per height: corr, raw, resi, std, n, fault
+WIDE_DECIMALS = 2           # decimals of wide temperatures: 2 -> 8.6-9.9x smaller than long, 1 -> 10.1-11.9x
+FLUSH_INTERVAL = 3600       # seconds between SD card flushes (journaled meanwhile)
+FLUSH_BYTES = 64 * 1024     # ...or flush earlier once this much is buffered
+ROLLUPS = True              # hourly / daily summaries in rtd_tower_data_hourly.csv / _daily.csv
+
+# ------------------------------------------------------
+# Buffered, journaled writes (replays anything a power
+# loss left in the journal before we start)
+# ------------------------------------------------------
+writer = BufferedWriter(journal_file, flush_interval=FLUSH_INTERVAL, flush_bytes=FLUSH_BYTES)
+atexit.register(writer.close)
+# SIGTERM (systemctl stop) ends the main loop at the next tick, rather
+# than raising out of whatever is running - possibly a flush
+stop_requested = []
+signal.signal(signal.SIGTERM, lambda signum, frame: stop_requested.append(signum))
 
 # ------------------------------------------------------
 # Logging function
@@ -38,26 +88,108 @@ log_file  = Path('/home/meganmason/Documents/projects/cold-content/snowtemps_ras
 def log_message(message):
     """Append message with UTC timestamp to the log file."""
     timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
-    with log_file.open('a') as f:
-        f.write(f"[{timestamp}] {message}\n")
+    writer.write(log_file, f"[{timestamp}] {message}\n")
+
+
+def report_flush():
+    io = writer.stats()
+    log_message(
+        f"Flushed to SD card: {io['bytes_written']} bytes, {io['syncs']} syncs, "
+        f"{io['file_writes']} file writes since start"
+    )
+
+writer.on_flush.append(report_flush)
 
 
 # ------------------------------------------------------
-# Load sensor offsets
+# Sensor backend (librtd on the Pi, RTD_BACKEND=sim elsewhere)
 # ------------------------------------------------------
-with open('sensor_offsets.json') as f:
-    offsets_dict = json.load(f)
+rtd = get_backend()
+
+
+# ------------------------------------------------------
+# Load sensor offsets: compiled and validated once into an
+# array-backed table (corrected = raw + offset)
+# ------------------------------------------------------
+sensor_table = load_fixed('sensor_offsets.json', missing_ok=True)
 
 log_message("Instrument restarted")
+if writer.replayed:
+    log_message(f"Recovered {writer.replayed} journaled bytes after an unclean shutdown")
+
+# A bad offsets entry costs only its sensor: still logged, with empty
+# height / number and NaN corrected temperature
+for warning in sensor_table.warnings:
+    log_message(warning)
+
+
+# ------------------------------------------------------
+# Sensor metadata, in hat/channel order
+# ------------------------------------------------------
+sensor_keys = list(zip(sensor_table.hat.tolist(), sensor_table.ch.tolist(), sensor_table.keys))
+sensor_meta = sensor_table.meta()
+
+# Hat, Channel, Height_cm, Sensor_Number columns of each long-format row
+row_prefix = [
+    f"{meta['hat']},{meta['ch']},{meta.get('height_cm', '')},{meta.get('sensor_num', '')},"
+    for meta in sensor_meta
+]
 
 
 # ------------------------------------------------------
 # Write header if data file does not yet exist
+# (a file from an older version with other columns is archived)
 # ------------------------------------------------------
-if not data_file.is_file():
-    with data_file.open('w') as f:
-        f.write("Time(UTC),Hat,Channel,Height_cm,Sensor_Number,Resistance_ohms,"
-                "RawTemp_degC,CorrectedTemp_degC\n")
+DATA_HEADER = ("Time(UTC),Hat,Channel,Height_cm,Sensor_Number,Resistance_ohms,"
+               "RawTemp_degC,CorrectedTemp_degC,StdTemp_degC,N_Valid,Fault\n")
+
+if OUTPUT_LAYOUT in ('long', 'both'):
+    archived = prepare_data_file(data_file, DATA_HEADER)
+    if archived:
+        log_message(f"WARNING: Data file columns changed, previous file archived as "
+                    f"{archived.name} (range_reader / rollups read it with the new one)")
+
+# Wide layout: one row per window, metadata in rtd_tower_data_wide.json
+wide_csv = None
+if OUTPUT_LAYOUT in ('wide', 'both'):
+    wide_csv = WideCsv(
+        wide_file,
+        [dict(meta, offset=float(offset) if math.isfinite(offset) else None)
+         for meta, offset in zip(sensor_meta, sensor_table.offset)],
+        fields=WIDE_FIELDS,
+        decimals=WIDE_DECIMALS,
+    )
+    archived = wide_csv.prepare()
+    if archived:
+        log_message(f"WARNING: Wide file columns changed, previous file archived as "
+                    f"{archived.name} (range_reader reads it with the new one)")
+
+# Keep the hourly time index (<file>.idx) of each data file current,
+# so shared/range_reader.py can seek straight to a date range
+indexed_files = []
+if OUTPUT_LAYOUT in ('long', 'both'):
+    indexed_files.append(data_file)
+if wide_csv is not None:
+    indexed_files.append(wide_file)
+
+for indexed_file in indexed_files:
+    update_index(indexed_file)
+    writer.on_flush.append(lambda path=indexed_file: update_index(path))
+
+# Hourly / daily rollups of the corrected temperature, updated as each
+# window closes; hours / days cut by a restart are rebuilt from the 5-min file
+rollups = None
+if ROLLUPS:
+    rollups = Rollups(data_file, sensor_table.labels(), writer.write)
+    for archived in rollups.prepare():
+        log_message(f"WARNING: Rollup columns changed, previous file archived as "
+                    f"{archived.name} (refilled from the data file and its archives)")
+    if OUTPUT_LAYOUT in ('long', 'both'):
+        replayed = rollups.replay(
+            data_file, ('Hat', 'Channel'), [(str(hat), str(ch)) for hat, ch, key in sensor_keys],
+            'CorrectedTemp_degC', 'N_Valid',
+        )
+        log_message(f"Rollups resumed from {replayed} logged windows")
 
 
 # ------------------------------------------------------
@@ -65,100 +197,309 @@ if not data_file.is_file():
 # ------------------------------------------------------
 SAMPLE_INTERVAL = 30        # seconds
 SAMPLES_PER_PERIOD = 10     # 10 samples × 30 sec = 5 min
+SCHEDULE_POLICY = 'catchup' # overrun handling: 'catchup' or 'skip'
+SCAN_PARALLEL = True        # one scan worker per hat
+BUS_LOCK = 'hat'            # 'hat' (hats overlap), 'bus' (fully serialized) or 'none'
+READ_MODE = 'both'          # 'both' (getRes + get) or 'res' (getRes only, CVD computed here)
+KEEP_RAW = True             # keep every 30-sec scan in the binary raw store
+PUBLISH_LIVE = True         # share each scan with rtd_run.py via /dev/shm
+RESUME_PARTIAL = True       # after a restart, finish the window in progress (refilled from the raw store)
+OVERSAMPLE_HZ = None        # e.g. 2 -> scan at 2 Hz instead of every 30 s (hardware permitting)
+ADAPTIVE = None             # None (fixed rate), 'sensor' (active heights read faster) or 'array' (all of them)
+ACTIVE_INTERVAL = 5         # seconds between reads of active sensors (must divide SAMPLE_INTERVAL)
+BURST_CAPTURE = False       # save every scan around sudden events to logger_files/events/
+BURST_PRE = 1800            # seconds kept before a trigger...
+BURST_POST = 1800           # ...and recorded after it
+BURST_HOLDOFF = 6 * 3600    # triggers ignored this long after an event (at most ~3 event files a day)
+# Rate trigger: 0.5 degC/min held for 10 min is a 5 degC step. Diurnal
+# warming in the pack is well under 0.1 degC/min, and probes in the air
+# (sun, wind) swing by tenths of a degree per minute, which a 10-min
+# span averages out; rain-on-snow or a wetting front is faster. Before
+# lowering it, check the 10-min rates in a season's raw store.
+BURST_RATE = 0.5            # trigger: any sensor changing faster than this (degC/min; None = off)...
+BURST_RATE_SPAN = 600       # ...measured over this many seconds
+BURST_GRADIENT = None       # trigger: adjacent heights further apart than this (degC/m; None = off)
+AGGREGATE = 'mean'          # window statistic: 'mean' (streaming), 'median', 'trimmed' or 'sigma_clip'
+METRICS = 'prom'            # timing metrics each window: 'prom' (Prometheus textfile), 'json' or None
+QUERY_PORT = 8765           # latest scan / open window / recent windows on localhost HTTP (None = off)
+QUERY_SOCKET = '/tmp/rtd_tower.sock'   # same queries on a Unix socket (None = off)
+FAULT_AFTER = 3             # consecutive failed reads before a sensor is skipped (Fault = 1)
+REPROBE_AFTER = 60          # seconds before re-reading a faulted sensor; doubles per failure...
+REPROBE_MAX = 3600          # ...up to this
+
+# Oversampling and adaptive sampling keep 5-min windows, with more
+# (shorter) ticks in each
+if OVERSAMPLE_HZ and ADAPTIVE:
+    raise ValueError("OVERSAMPLE_HZ and ADAPTIVE can't be combined")
+if OVERSAMPLE_HZ:
+    TICK_INTERVAL = 1 / OVERSAMPLE_HZ
+    TICKS_PER_PERIOD = round(SAMPLE_INTERVAL * SAMPLES_PER_PERIOD * OVERSAMPLE_HZ)
+elif ADAPTIVE:
+    TICK_INTERVAL = ACTIVE_INTERVAL
+    TICKS_PER_PERIOD = SAMPLES_PER_PERIOD * fast_ticks(SAMPLE_INTERVAL, ACTIVE_INTERVAL)
+else:
+    TICK_INTERVAL, TICKS_PER_PERIOD = SAMPLE_INTERVAL, SAMPLES_PER_PERIOD
+RAW_EVERY = TICKS_PER_PERIOD // SAMPLES_PER_PERIOD   # raw store stays at 30-sec resolution
+
+# Per-sensor Callendar-Van Dusen coefficients (used when READ_MODE = 'res')
+cvd_coeffs = CvdCoefficients.load('sensor_coeffs.json', [key for hat, ch, key in sensor_keys])
+
+# Scan engine: returns one snapshot of all 32 sensors per tick
+scanner = Scanner(rtd, [(hat, ch) for hat, ch, key in sensor_keys],
+                  parallel=SCAN_PARALLEL, bus_lock=BUS_LOCK,
+                  read_mode=READ_MODE, converter=cvd_coeffs)
+max_scan = max_skew = 0.0
+
+# Per-sensor circuit breakers: dead sensors are skipped instead of timing
+# out every scan, and their errors are summarized once per window
+health = SensorHealth([key for hat, ch, key in sensor_keys], threshold=FAULT_AFTER,
+                      backoff=REPROBE_AFTER, max_backoff=REPROBE_MAX)
+
+# Burst capture: recent scans at the full tick rate stay in RAM, and
+# are saved with what follows when a trigger fires (shared/burst.py)
+burst = None
+if BURST_CAPTURE:
+    triggers = []
+    if BURST_RATE:
+        triggers.append(RateTrigger(BURST_RATE, span=BURST_RATE_SPAN))
+    if BURST_GRADIENT:
+        triggers.append(GradientTrigger(
+            BURST_GRADIENT, [meta.get('height_cm', float('nan')) for meta in sensor_meta]
+        ))
+    burst = BurstCapture(events_dir, 'rtd_tower', sensor_meta, TICK_INTERVAL, triggers,
+                         pre=BURST_PRE, post=BURST_POST, holdoff=BURST_HOLDOFF,
+                         meta={'site': 'CSSL fixed array'})
+
+    def save_open_event():
+        message = burst.close()
+        if message:
+            log_message(message)
+
+    atexit.register(save_open_event)
+
+# Adaptive sampling: every sensor on the 30-sec grid, active ones (fast
+# change or scatter) also on the ticks in between (shared/adaptive.py)
+adaptive = None
+if ADAPTIVE:
+    adaptive = AdaptiveSampler(len(sensor_keys), RAW_EVERY, mode=ADAPTIVE)
+
+# Full-resolution raw samples (see shared/raw_store.py)
+raw_store = None
+if KEEP_RAW:
+    raw_store = RawStoreWriter(
+        raw_file, sensor_meta,
+        meta={'site': 'CSSL fixed array', 'interval_s': SAMPLE_INTERVAL},
+        # Resuming needs the scans of the window in progress, so each
+        # one is handed to the OS as it is taken; fsynced once per window
+        flush_each=RESUME_PARTIAL,
+    )
+    if raw_store.archived:
+        log_message(f"WARNING: Raw store sensor layout changed, previous store archived as "
+                    f"{raw_store.archived.name}")
+    writer.on_flush.append(raw_store.flush)
+    if RESUME_PARTIAL:
+        writer.on_commit.append(lambda: raw_store.flush(sync=True))
+
+# Latest scan for rtd_run.py, so field checks stay off the bus
+live = None
+if PUBLISH_LIVE:
+    live = LivePublisher('tower', [(hat, ch) for hat, ch, key in sensor_keys])
+    atexit.register(live.close)
+
+# Read latency, scan time, lateness and write cost, exported once per
+# window to /dev/shm/rtd_tower.prom (RTD_METRICS_DIR to change; see shared/metrics.py)
+metrics = None
+if METRICS:
+    metrics = LoggerMetrics(metrics_path('tower', METRICS), [key for hat, ch, key in sensor_keys])
+    atexit.register(metrics.export)
+
+# 5-min statistics for all sensors (NaN reads are skipped): streaming
+# mean, or every scan buffered for a robust estimate (shared/robust_stats.py)
+if AGGREGATE == 'mean':
+    accum = WindowAccumulator(len(sensor_keys), fields=('resi', 'temp', 'corr'))
+else:
+    accum = RobustWindow(len(sensor_keys), TICKS_PER_PERIOD,
+                         fields=('resi', 'temp', 'corr'), method=AGGREGATE)
+window_cpu = time.process_time()
 
-# Precompute sensor keys
-sensor_keys = [(hat, ch, f"h{hat}c{ch}") for hat in range(4) for ch in range(1, 9)]
 
-# Prepare accumulator for 5-min window
-data_accum = {(hat, ch): [] for hat in range(4) for ch in range(1, 9)}
+# ------------------------------------------------------
+# Align samples to exact 30-sec ticks from the next even
+# 5-minute boundary (deadlines on the monotonic clock)
+# ------------------------------------------------------
+scheduler = SampleScheduler(TICK_INTERVAL, TICKS_PER_PERIOD, policy=SCHEDULE_POLICY,
+                            join_current=RESUME_PARTIAL)
+
+log_message(f"Next 5-min average scheduled for {scheduler.first_window:%Y-%m-%d %H:%M:%S}")
+
+# Query endpoint (shared/rtd_daemon.py): latest scan, open window and
+# recent windows from memory, served from a background thread
+query = None
+if QUERY_PORT or QUERY_SOCKET:
+    query = QueryServer([key for hat, ch, key in sensor_keys], accum.fields, scheduler)
+    try:
+        query.start(port=QUERY_PORT, unix_path=QUERY_SOCKET)
+    except OSError as e:
+        log_message(f"Query endpoint not started: {e}")
+        query = None
 
 
 # ------------------------------------------------------
-# Align to next even 5-minute boundary
+# Restart recovery: mark windows lost since the last
+# written one, and refill the window we joined with the
+# scans the previous run left in the raw store
 # ------------------------------------------------------
-now = datetime.utcnow()
-prev_minute = now.minute - (now.minute % 5)
-aligned = now.replace(minute=prev_minute, second=0, microsecond=0)
-aligned += timedelta(minutes=5)
-
-log_message(f"Next 5-min average scheduled for {aligned:%Y-%m-%d %H:%M:%S}")
+gap_log = GapLog(data_file if OUTPUT_LAYOUT in ('long', 'both') else wide_file,
+                 writer.write, window_seconds=scheduler.window_seconds)
+gap = gap_log.check(scheduler.first_window)
+if gap:
+    log_message(
+        f"Data gap: {gap[2]} windows missing, "
+        f"{gap[0]:%Y-%m-%d %H:%M:%S} to {gap[1]:%Y-%m-%d %H:%M:%S}"
+    )
+
+if scheduler.joined_at:
+    resumed = resume_samples(raw_file, scheduler.anchor_wall, time.time())
+    for epoch, resi, temp in resumed:
+        accum.add(resi, temp, sensor_table.correct(temp))
+    log_message(f"Joined window in progress with {len(resumed)} scans from the raw store")
 
 
 # ======================================================
-# MAIN LOOP — 30-sec sampling + 5-min averaging
+# MAIN LOOP — 30-sec (or oversampled) sampling + 5-min averaging
 # ======================================================
-while True:
+for tick in scheduler:
+    if stop_requested:
+        break
+    if metrics:
+        metrics.record_tick(tick)
 
     # --------------------------------------------------
-    # Collect 10 samples spaced 30 sec apart
+    # Sample all sensors on this 30-sec tick
     # --------------------------------------------------
-    for _ in range(SAMPLES_PER_PERIOD):
-        for hat, ch, key in sensor_keys:
-            try:
-                resi = librtd.getRes(hat, ch)
-                temp = librtd.get(hat, ch)
-            except Exception as e:
-                resi = float('nan')
-                temp = float('nan')
-                log_message(f"Error reading {key}: {e}")
-
-            # Offset file format: [height_cm, sensor_number, offset]
-            height, sensor_num, offset = offsets_dict.get(
-                key, [float('nan'), float('nan'), 0]
-            )
-
-            corr_temp = temp + offset
-
-            # Accumulate in 5-min storage
-            data_accum[(hat, ch)].append((resi, temp, corr_temp))
-
-        time.sleep(SAMPLE_INTERVAL)
+    if not tick.skipped:
+        skip = health.skip()
+        if adaptive:
+            skip = sorted(set(skip).union(adaptive.skip(tick)))
+        snap = scanner.scan(skip=skip)
+        max_scan = max(max_scan, snap.duration)
+        max_skew = max(max_skew, snap.skew)
+        if metrics:
+            metrics.record_scan(snap)
+
+        # First error per sensor and window, and faulted / recovered changes
+        for message in health.update(snap):
+            log_message(message)
+        if adaptive:
+            adaptive.update(snap)
+
+        # Accumulate in 5-min storage (offsets applied to the whole scan at once).
+        # Adaptive: the 30-sec grid only - the extra reads of active sensors
+        # (activity detection, burst capture, queries) would otherwise weight
+        # the mean toward whichever part of the window was active
+        corr = sensor_table.correct(snap.temp)
+        if not adaptive or tick.sample_in_window % RAW_EVERY == 0:
+            accum.add(snap.resi, snap.temp, corr)
+
+        if burst:
+            message = burst.add(snap.started, snap.resi, snap.temp, bad=snap.bad)
+            if message:
+                log_message(message)
+
+        if raw_store and tick.sample_in_window % RAW_EVERY == 0:
+            raw_store.append(snap.started, snap.resi, snap.temp, bad=snap.bad)
+
+        # (adaptive: only full scans, so quiet sensors don't show as failed)
+        if live and (not adaptive or tick.sample_in_window % RAW_EVERY == 0):
+            live.publish(snap)
+
+        # Open-window statistics are refreshed on the 30-sec grid only
+        if query:
+            query.publish_scan(snap, (snap.resi, snap.temp, corr))
+            if tick.sample_in_window % RAW_EVERY == 0 and not tick.last_in_window:
+                query.publish_window(tick.window_start, accum.result())
+
+    if not tick.last_in_window:
+        continue
 
 
     # --------------------------------------------------
-    # Write 5-min averages
+    # Write 5-min averages (labelled with window start)
     # --------------------------------------------------
-    timestamp_5min = aligned
-
-    with data_file.open('a') as f:
-        for hat, ch, key in sensor_keys:
-            samples = data_accum[(hat, ch)]
-
-            if len(samples) > 0:
-                avg_resi = sum(s[0] for s in samples) / len(samples)
-                avg_temp = sum(s[1] for s in samples) / len(samples)
-                avg_corr = sum(s[2] for s in samples) / len(samples)
-            else:
-                avg_resi = avg_temp = avg_corr = float('nan')
-
-            height, sensor_num, offset = offsets_dict.get(
-                key, [float('nan'), float('nan'), 0]
+    timestamp_5min = tick.window_start
+    window = accum.result()
+    avg_resi, avg_temp, avg_corr = window.mean
+    std_temp = window.std[accum.field('temp')]
+    n_valid = window.count[accum.field('temp')]
+    fault = health.window_fault.astype(int)
+
+    if wide_csv:
+        writer.write(wide_file, wide_csv.format_row(timestamp_5min, {
+            'corr': avg_corr, 'raw': avg_temp, 'resi': avg_resi,
+            'std': std_temp, 'n': n_valid, 'fault': fault,
+        }))
+
+    if OUTPUT_LAYOUT in ('long', 'both'):
+        stamp = f"{timestamp_5min:%Y-%m-%d %H:%M:%S},"
+        lines = []
+        for i, prefix in enumerate(row_prefix):
+            lines.append(
+                f"{stamp}{prefix}"
+                f"{avg_resi[i]:.1f},{avg_temp[i]:.2f},{avg_corr[i]:.2f},"
+                f"{std_temp[i]:.3f},{n_valid[i]},{fault[i]}\n"
             )
-
-            line = (
-                f"{timestamp_5min:%Y-%m-%d %H:%M:%S},"
-                f"{hat},{ch},{height},{sensor_num},"
-                f"{avg_resi:.1f},{avg_temp:.2f},{avg_corr:.2f}\n"
-            )
-            f.write(line)
-
-    log_message(f"Wrote 5-min averaged data at {timestamp_5min:%Y-%m-%d %H:%M:%S}")
+        writer.write(data_file, ''.join(lines))
+
+    if rollups:
+        rollups.add(timestamp_5min, avg_corr, n_valid)
+
+    if query:
+        query.publish_window(timestamp_5min, window, closed=True)
+
+    # CPU time for the whole window (scans + aggregation), so we know the Pi keeps up
+    cpu_now = time.process_time()
+    reduce_cpu = f", reduce {accum.reduce_cpu * 1000:.0f} ms" if AGGREGATE != 'mean' else ""
+    log_message(
+        f"Wrote 5-min averaged data at {timestamp_5min:%Y-%m-%d %H:%M:%S} "
+        f"(max scan {max_scan:.2f} s, max skew {max_skew:.2f} s, "
+        f"cpu {cpu_now - window_cpu:.2f} s{reduce_cpu})"
+    )
+    max_scan = max_skew = 0.0
+    window_cpu = cpu_now
+
+    # Summarize sensor errors / faults for this window
+    for message in health.end_window():
+        log_message(message)
+
+    # Effective sampling (N_Valid counts the 30-sec grid only)
+    if adaptive:
+        reads, active = adaptive.end_window()
+        heights = ', '.join(label for label, a in zip(sensor_table.labels(), active) if a)
+        log_message(
+            f"Adaptive sampling: {active.sum()} sensors active ({heights or 'none'}), "
+            f"{reads.sum()} reads vs {len(sensor_keys) * SAMPLES_PER_PERIOD} at the base rate"
+        )
+
+    # Report timing problems for this window
+    sched = scheduler.stats()
+    if sched['skipped'] or sched['overruns']:
+        log_message(
+            f"Scheduler: {sched['skipped']} skipped, {sched['caught_up']} caught up, "
+            f"max lateness {sched['max_lateness_s']:.2f} s"
+        )
+    scheduler.reset_stats()
+
+    # Window complete: journal it (flushes to the SD card when due)
+    if metrics:
+        io_before, t0 = writer.bytes_written, time.perf_counter()
+        writer.commit()
+        metrics.record_write(time.perf_counter() - t0, writer.bytes_written - io_before)
+        metrics.export()
+    else:
+        writer.commit()
 
     # Clear accumulators for next 5-min window
-    data_accum = {(hat, ch): [] for hat in range(4) for ch in range(1, 9)}
-
-    # --------------------------------------------------
-    # Schedule next 5-min timestamp
-    # --------------------------------------------------
-    aligned += timedelta(minutes=5)
-    log_message(f"Next 5-min average scheduled for {aligned:%Y-%m-%d %H:%M:%S}")
-
-    # Sleep until the next even 5-min boundary
-    now = datetime.utcnow()
-    sleep_time = (aligned - now).total_seconds()
-    if sleep_time > 0:
-        time.sleep(sleep_time)
-
+    accum.reset()
 
 
 
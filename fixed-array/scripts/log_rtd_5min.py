@@ -21,19 +21,26 @@ A temperature offset is applyed to the corrected temp field using a .json file t
 
 
 import datetime
+import sys
 import time
 from datetime import datetime, timedelta
 from pathlib import Path
-import librtd
-import json
 import os
 
+# Shared logger modules live in <repo>/shared
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'shared'))
+from rtd_backend import get_backend
+from sensor_table import load_fixed
+
+# Sensor backend (librtd on the Pi, RTD_BACKEND=sim elsewhere)
+rtd = get_backend()
+
 # Set period
 period = 300 # 5min=300sec
 
-# Load offsets from file
-with open('sensor_offsets.json') as f:
-    offsets_dict = json.load(f)
+# Load and validate heights, sensor numbers and offsets once (a bad
+# entry leaves that sensor without height / correction, see warnings)
+sensor_table = load_fixed('sensor_offsets.json', missing_ok=True)
 
 # Set up logger files (1: data, 2:log txt file)
 data_file = Path('/home/meganmason/Documents/projects/cold-content/snowtemps_raspi/fixed-array/logger_files/rtd_tower_data.csv')
@@ -47,6 +54,8 @@ def log_message(message):
 
 # Write a restart message
 log_message("Instrument restarted")
+for warning in sensor_table.warnings:
+    log_message(warning)
 
 # Add header to CSV data file
 if not data_file.is_file():
@@ -69,25 +78,26 @@ while True:
     timestamp_tz = datetime.utcnow()
 
     with data_file.open('a') as f:
-        # Loop through RTD hats (0-3) and channels (1-8)
-        for hat in range(4):
-            for ch in range(1, 9):
-                try:
-                    resi = librtd.getRes(hat, ch)
-                    temp = librtd.get(hat, ch)
-                except Exception as e:
-                    resi = float('nan')
-                    temp = float('nan')
-                    log_message(f"Error reading sensor h{hat}c{ch}: {e}")
-
-                # Look up offset, height, & sensor num.
-                key = f"h{hat}c{ch}"
-                height, sensor, offset = offsets_dict.get(key, [float('nan'), 0])
-                corr_temp = temp + offset
-
-                # Write data line to CSV
-                line = f"{timestamp_tz:%Y-%m-%d %H:%M:%S},{hat},{ch},{sensor},{height},{resi:.0f},{temp:.1f},{corr_temp:.1f}\n"
-                f.write(line)
+        # Loop through RTD hats (0-3) and channels (1-8), in table order
+        for i, key in enumerate(sensor_table.keys):
+            hat, ch = int(sensor_table.hat[i]), int(sensor_table.ch[i])
+            try:
+                resi = rtd.getRes(hat, ch)
+                temp = rtd.get(hat, ch)
+            except Exception as e:
+                resi = float('nan')
+                temp = float('nan')
+                log_message(f"Error reading sensor {key}: {e}")
+
+            # Height, sensor num. & offset from the table
+            height, sensor = sensor_table.height_cm[i], sensor_table.sensor_num[i]
+            height = height if height >= 0 else ''
+            sensor = sensor if sensor >= 0 else ''
+            corr_temp = temp + sensor_table.correction[i]
+
+            # Write data line to CSV
+            line = f"{timestamp_tz:%Y-%m-%d %H:%M:%S},{hat},{ch},{sensor},{height},{resi:.0f},{temp:.1f},{corr_temp:.1f}\n"
+            f.write(line)
 
     # Log successful data write
     log_message(f"Logged RTD sensor array at {timestamp_tz:%Y-%m-%d %H:%M:%S}")
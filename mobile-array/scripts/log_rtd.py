@@ -31,14 +31,28 @@
 # #     8: 1.3   # channel 8 offset
 # # }
 
+import asyncio
 import logging
 import datetime
-import pandas as pd
-import time
 import csv
-import librtd
 import json
 import os
+import sys
+from pathlib import Path
+
+# Shared logger modules live in <repo>/shared
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "shared"))
+from data_files import prepare_data_file
+from rtd_backend import get_backend
+from rtd_daemon import LoggerDaemon
+from scanner import Scanner
+from scheduler import SampleScheduler
+from sensor_health import SensorHealth
+from sensor_table import load_mobile
+from window_engine import WindowEngine
+
+# === Sensor backend (librtd on the Pi, RTD_BACKEND=sim elsewhere) ===
+rtd = get_backend()
 
 # === Get serial number ===
 def get_pi_serial():
@@ -69,97 +83,83 @@ logging.basicConfig(
 
 # === Constants ===
 SENSOR_SAMPLING_INTERVAL = 30  # Collect every 30 seconds
-ROLLING_WINDOW = "5min"
+WINDOW_SECONDS = 300           # 5-minute bins
 OUTPUT_CSV = f"{output_dir}/instrument_log.csv"
+OUTPUT_HEADER = "Timestamp,Channel,Temp,Resi,Corr_Temp,Temp_Std,N_Valid,Fault\r\n"
+CHANNELS = range(1, 9)
+QUERY_PORT = 8765              # localhost HTTP queries (None to disable)
+QUERY_SOCKET = "/tmp/rtd_mobile.sock"  # same queries on a Unix socket (None to disable)
 
 
-# Load offsets from JSON
-with open('sensor_offsets.json') as f:
-    offsets_all = json.load(f)
+# Offsets for this Pi, compiled and validated once (corrected = raw - offset).
+# A channel without a valid offset (or a Pi without any) is still logged,
+# with NaN Corr_Temp - see shared/sensor_table.py
+sensor_table = load_mobile(serial, channels=CHANNELS, missing_ok=True)
+for warning in sensor_table.warnings:
+    logging.warning(warning)
 
-# Get current Pi serial
-def get_pi_serial():
-    with open('/proc/cpuinfo', 'r') as f:
-        for line in f:
-            if line.startswith('Serial'):
-                return line.strip().split(':')[1].strip()
-    return "00000000"
+# Scanner for the single hat, and the incremental 5-minute binning
+scanner = Scanner(rtd, [(0, channel) for channel in CHANNELS])
+engine = WindowEngine(len(CHANNELS), fields=("temp", "resi", "corr"),
+                      window_seconds=WINDOW_SECONDS)
 
-pi_serial = get_pi_serial()
-offset_dict = offsets_all.get(pi_serial, {})
-
-# Data storage for rolling aggregation
-sensor_data = pd.DataFrame(columns=["Timestamp", "Channel", "Temp", "Resi", "Corr_Temp"])
+# Dead probes are skipped (re-probed with backoff) and their errors summarized per window
+health = SensorHealth([f"ch_{channel}" for channel in CHANNELS])
 
 def read_sensors():
     """Reads temperature, resistance, and calculates corrected temperature for all channels."""
-    readings = []
-    timestamp = datetime.datetime.now()
-    
-    for channel in range(1, 9):
-        temp = librtd.get(0, channel)  # Read temperature (C)
-        resi = librtd.getRes(0, channel)  # Read resistance (ohms)
-        key = f"ch_{channel}"
-        corr_temp = temp - offset_dict.get(key)  # Apply correction
-
-        readings.append([timestamp, channel, round(temp, 4), round(resi, 2), round(corr_temp, 4)])
-
-    return readings
-
-def log_data():
-    """Collects data every 30 seconds and logs rolling 5-minute averages to CSV."""
-    global sensor_data
-    
-    # Read sensor data and append to DataFrame
-    new_data = pd.DataFrame(read_sensors(), columns=["Timestamp", "Channel", "Temp", "Resi", "Corr_Temp"])
-    sensor_data = pd.concat([sensor_data, new_data]).tail(600)  # Keep only the last 10 minutes
-    
-    # Ensure timestamp is in datetime format
-    sensor_data["Timestamp"] = pd.to_datetime(sensor_data["Timestamp"])
-
-def log_rolling_averages():
-    """Calculates and logs rolling averages for every 5-minute window."""
-    global sensor_data
-
-    # Compute rolling averages every 5 minutes using Grouper
-    rolling_avg = (
-        sensor_data.groupby(["Channel", pd.Grouper(key="Timestamp", freq=ROLLING_WINDOW)])
-        .agg({"Temp": "mean", "Resi": "mean", "Corr_Temp": "mean"})
-        .reset_index()
-    )
-
-    # Save rolling averages to CSV
+    snap = scanner.scan(skip=health.skip())
+    for message in health.update(snap):
+        logging.warning(message)
+
+    return snap, (snap.temp, snap.resi, sensor_table.correct(snap.temp))
+
+def log_rolling_averages(closed_windows):
+    """Writes each newly completed 5-minute window exactly once."""
+    fault = health.window_fault
     with open(OUTPUT_CSV, mode="a", newline="") as file:
         writer = csv.writer(file)
-        if file.tell() == 0:  # Write header if file is new
-            writer.writerow(["Timestamp", "Channel", "Temp", "Resi", "Corr_Temp"])
-        
-        for _, row in rolling_avg.iterrows():
-            writer.writerow([row["Timestamp"], row["Channel"], round(row["Temp"], 1), round(row["Resi"], 0), round(row["Corr_Temp"], 1)])
+
+        for window in closed_windows:
+            timestamp = datetime.datetime.fromtimestamp(window.start)
+            stats = window.stats
+            temp, resi, corr = stats.mean
+            temp_std = stats.std[0]
+            n_valid = stats.count[0]
+
+            for i, channel in enumerate(CHANNELS):
+                writer.writerow([
+                    timestamp, channel,
+                    round(float(temp[i]), 1), round(float(resi[i]), 0), round(float(corr[i]), 1),
+                    round(float(temp_std[i]), 2), int(n_valid[i]), int(fault[i]),
+                ])
 
     # Log event
-    log_msg = f"Logged rolling averages: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-    logging.info(log_msg)
+    for window in closed_windows:
+        timestamp = datetime.datetime.fromtimestamp(window.start)
+        logging.info(f"Logged 5-min averages for {timestamp:%Y-%m-%d %H:%M:%S}")
+    for message in health.end_window():
+        logging.warning(message)
 
 def main():
     """Main loop to collect data every 30 seconds and log 5-minute averages."""
     logging.info("Starting instrument logger.")
-    last_logged_time = datetime.datetime.now()
 
+    archived = prepare_data_file(Path(OUTPUT_CSV), OUTPUT_HEADER)
+    if archived:
+        logging.warning(f"Data file columns changed, previous file archived as "
+                        f"{archived.name} (range_reader / rollups read it with the new one)")
+
+    # Exact 30-sec ticks from the next even 5-minute boundary
+    scheduler = SampleScheduler(SENSOR_SAMPLING_INTERVAL, WINDOW_SECONDS // SENSOR_SAMPLING_INTERVAL,
+                                local_time=True)
+
+    # Scan every 30 seconds and write bins as they complete, answering
+    # queries for latest values / recent windows from memory meanwhile
+    daemon = LoggerDaemon(scheduler, engine, read_sensors, log_rolling_averages,
+                          [f"ch_{channel}" for channel in CHANNELS], log=logging.warning)
     try:
-        while True:
-            current_time = datetime.datetime.now()
-            
-            # Collect data every 30 seconds
-            log_data()
-            
-            # Check if it's time to log the rolling average (5-minute interval)
-            if (current_time - last_logged_time).seconds >= 300:  # 5 minutes
-                last_logged_time = current_time
-                log_rolling_averages()  # Only log rolling averages once every 5 minutes
-                
-            # Sleep until the next data collection
-            time.sleep(SENSOR_SAMPLING_INTERVAL)
+        asyncio.run(daemon.main(port=QUERY_PORT, unix_path=QUERY_SOCKET))
     except KeyboardInterrupt:
         logging.info("Logging stopped by user.")
         # print("\nLogging stopped.")
@@ -167,6 +167,3 @@ def main():
 # Run the main function
 if __name__ == "__main__":
     main()
-
-
-
@@ -1,12 +1,35 @@
+import io
+import sys
+import atexit
+import signal
 import time
-import json
 import logging
-import datetime
-import pandas as pd
 import csv
-import librtd
 from pathlib import Path
 
+# Shared logger modules live in <repo>/shared
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "shared"))
+from adaptive import AdaptiveSampler, fast_ticks
+from buffered_writer import BufferedLogHandler, BufferedWriter
+from burst import BurstCapture, RateTrigger
+from data_files import prepare_data_file
+from live_snapshot import LivePublisher
+from metrics import LoggerMetrics, metrics_path
+from power import DutyCycle, ram_dir
+from range_reader import update_index
+from readiness import uptime, wait_ready
+from raw_store import RawStoreWriter
+from recovery import GapLog, resume_samples
+from rollups import Rollups
+from rtd_backend import get_backend
+from rtd_convert import CvdCoefficients
+from rtd_daemon import QueryServer
+from scanner import Scanner
+from scheduler import SampleScheduler
+from sensor_health import SensorHealth
+from sensor_table import load_mobile
+from window_stats import WindowAccumulator
+
 '''
 Note - this is name '_single' but still has some serial 
 fetching components. It also doesn't sort into OPIE I,II,III 
@@ -25,23 +48,99 @@ log_file = Path(
     "/home/meganmason/Documents/projects/cold-content/"
     "snowtemps_raspi/mobile-array/logger_files/instrument_log.txt"
 )
+raw_file = Path(
+    "/home/meganmason/Documents/projects/cold-content/"
+    "snowtemps_raspi/mobile-array/logger_files/instrument_raw.bin"
+)
+journal_file = Path(
+    "/home/meganmason/Documents/projects/cold-content/"
+    "snowtemps_raspi/mobile-array/logger_files/instrument.journal"
+)
+events_dir = Path(
+    "/home/meganmason/Documents/projects/cold-content/"
+    "snowtemps_raspi/mobile-array/logger_files/events"
+)
+
+# ------------------------------------------------------
+# Buffered, journaled writes to the SD card
+# ------------------------------------------------------
+FLUSH_INTERVAL = 3600       # seconds between SD card flushes (journaled meanwhile)
+FLUSH_BYTES = 64 * 1024     # ...or flush earlier once this much is buffered
+
+# Battery mode: windows stay in RAM (journal in /dev/shm, so a logger
+# restart still recovers them, a power cut loses at most one batch) and
+# the SD card is only written every POWER_FLUSH_HOURS
+POWER_SAVE = False
+POWER_FLUSH_HOURS = 6       # hours between SD card flushes...
+POWER_FLUSH_BYTES = 1024 * 1024   # ...or flush earlier once this much is buffered
+POWER_IDLE_W = 0.7          # measured draw idle / busy, for the duty-cycle estimate
+POWER_BUSY_W = 1.5
+BATTERY_WH = None           # usable battery capacity, e.g. 74 for a 20 Ah pack
+
+if POWER_SAVE:
+    FLUSH_INTERVAL = POWER_FLUSH_HOURS * 3600
+    FLUSH_BYTES = POWER_FLUSH_BYTES
+    if ram_dir():
+        journal_file = ram_dir() / "rtd_instrument.journal"
+
+# ------------------------------------------------------
+# Start as soon as the card and the RTD hat answer (probed with
+# backoff, up to WAIT_READY seconds) instead of a fixed boot delay
+# ------------------------------------------------------
+WAIT_READY = 120
+
+rtd, ready = wait_ready(
+    get_backend, [(0, ch) for ch in range(1, 9)],
+    dirs=[data_file.parent, journal_file.parent], timeout=WAIT_READY,
+)
+
+writer = BufferedWriter(journal_file, flush_interval=FLUSH_INTERVAL, flush_bytes=FLUSH_BYTES)
+atexit.register(writer.close)
+# SIGTERM (systemctl stop) ends the main loop at the next tick, rather
+# than raising out of whatever is running - possibly a flush
+stop_requested = []
+signal.signal(signal.SIGTERM, lambda signum, frame: stop_requested.append(signum))
 
 # ------------------------------------------------------
 # Logging
 # ------------------------------------------------------
 logging.basicConfig(
-    filename=log_file,
     level=logging.INFO,
     format="%(asctime)s - %(levelname)s - %(message)s",
+    handlers=[BufferedLogHandler(writer, log_file)],
 )
 logging.info("Instrument restarted")
+if writer.replayed:
+    logging.warning(f"Recovered {writer.replayed} journaled bytes after an unclean shutdown")
+if ready.ready:
+    logging.info(ready.message())
+else:
+    logging.warning(ready.message())
+
+duty = None   # DutyCycle, once the scheduler exists
+
+def report_flush():
+    io_stats = writer.stats()
+    logging.info(
+        f"Flushed to SD card: {io_stats['bytes_written']} bytes, {io_stats['syncs']} syncs, "
+        f"{io_stats['file_writes']} file writes since start"
+    )
+    figures = duty.report() if duty else None
+    if figures:
+        logging.info(f"Duty cycle since last flush: {DutyCycle.format(figures)}")
+
+writer.on_flush.append(report_flush)
 
 # ------------------------------------------------------
-# Offsets (Script A style)
+# Sensor backend (librtd on the Pi, RTD_BACKEND=sim elsewhere)
 # ------------------------------------------------------
-with open("sensor_offsets.json") as f:
-    offsets_all = json.load(f)
+if rtd is None:
+    rtd = get_backend()   # never came up while waiting: fail loudly here
 
+# ------------------------------------------------------
+# Offsets by Pi serial, compiled and validated once
+# (corrected = raw - offset)
+# ------------------------------------------------------
 def get_pi_serial():
     with open("/proc/cpuinfo") as f:
         for line in f:
@@ -50,95 +149,312 @@ def get_pi_serial():
     return "00000000"
 
 pi_serial = get_pi_serial()
-offset_dict = offsets_all.get(pi_serial, {})
+# A channel without a valid offset (or a Pi without any) is still logged,
+# with NaN Corr_Temp - see shared/sensor_table.py
+sensor_table = load_mobile(pi_serial, missing_ok=True)
+for warning in sensor_table.warnings:
+    logging.warning(warning)
 
 # ------------------------------------------------------
-# Write header once
+# Write header once (older files with other columns are archived)
 # ------------------------------------------------------
-if not data_file.exists():
-    with data_file.open("w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["Timestamp", "Channel", "Temp", "Resi", "Corr_Temp"])
+DATA_HEADER = "Timestamp,Channel,Temp,Resi,Corr_Temp,Temp_Std,N_Valid,Fault\r\n"
+
+archived = prepare_data_file(data_file, DATA_HEADER)
+if archived:
+    logging.warning(f"Data file columns changed, previous file archived as "
+                    f"{archived.name} (range_reader / rollups read it with the new one)")
+
+# Hourly time index (instrument_log.csv.idx) for shared/range_reader.py,
+# brought up to date after every flush
+update_index(data_file)
+writer.on_flush.append(lambda: update_index(data_file))
 
 # ------------------------------------------------------
 # Sampling settings
 # ------------------------------------------------------
 SAMPLE_INTERVAL = 30        # seconds
 SAMPLES_PER_PERIOD = 10     # 10 × 30 sec = 5 min
+SCHEDULE_POLICY = "catchup" # overrun handling: "catchup" or "skip"
+READ_MODE = "both"          # "both" (getRes + get) or "res" (getRes only, CVD computed here)
+KEEP_RAW = True             # keep every 30-sec scan in the binary raw store
+PUBLISH_LIVE = True         # share each scan with rtd_run.py via /dev/shm
+RESUME_PARTIAL = True       # after a restart, finish the window in progress (refilled from the raw store)
+METRICS = "prom"            # timing metrics each window: "prom" (Prometheus textfile), "json" or None
+QUERY_PORT = 8765           # latest scan / open window / recent windows on localhost HTTP (None = off)
+QUERY_SOCKET = "/tmp/rtd_mobile.sock"  # same queries on a Unix socket (None = off)
+FAULT_AFTER = 3             # consecutive failed reads before a channel is skipped (Fault = 1)
+REPROBE_AFTER = 60          # seconds before re-reading a faulted channel; doubles per failure...
+REPROBE_MAX = 3600          # ...up to this
+ADAPTIVE = None             # None (fixed rate), "sensor" (active probes read faster) or "array" (all of them)
+ACTIVE_INTERVAL = 5         # seconds between reads of active probes (must divide SAMPLE_INTERVAL)
+BURST_CAPTURE = False       # save every scan around sudden changes to logger_files/events/
+BURST_PRE = 1800            # seconds kept before a trigger...
+BURST_POST = 1800           # ...and recorded after it
+BURST_HOLDOFF = 6 * 3600    # triggers ignored this long after an event (at most ~3 event files a day)
+BURST_RATE = 0.5            # trigger: any probe changing faster than this (degC/min; 5 degC in 10 min,
+                            # well above diurnal and sun / wind swings, see the tower log_rtd.py)...
+BURST_RATE_SPAN = 600       # ...measured over this many seconds
 CHANNELS = range(1, 9)
 
+# Adaptive sampling ticks at ACTIVE_INTERVAL; every QUIET_EVERY-th tick is
+# on the 30-sec grid and reads every probe
+QUIET_EVERY = fast_ticks(SAMPLE_INTERVAL, ACTIVE_INTERVAL) if ADAPTIVE else 1
+
+# Per-probe Callendar-Van Dusen coefficients (used when READ_MODE = "res")
+cvd_coeffs = CvdCoefficients.load(
+    "sensor_coeffs.json", [f"ch_{ch}" for ch in CHANNELS], section=pi_serial
+)
+
+# Scan engine: one snapshot of the hat per tick
+scanner = Scanner(rtd, [(0, ch) for ch in CHANNELS], read_mode=READ_MODE, converter=cvd_coeffs)
+
+# Per-channel circuit breakers: a dead probe is skipped instead of timing
+# out every scan, and its errors are summarized once per window
+health = SensorHealth([f"ch_{ch}" for ch in CHANNELS], threshold=FAULT_AFTER,
+                      backoff=REPROBE_AFTER, max_backoff=REPROBE_MAX)
+
+# Burst capture: recent scans stay in RAM and are saved with what
+# follows when a probe changes suddenly (shared/burst.py)
+burst = None
+if BURST_CAPTURE:
+    burst = BurstCapture(
+        events_dir, "instrument", sensor_table.meta(), SAMPLE_INTERVAL / QUIET_EVERY,
+        [RateTrigger(BURST_RATE, span=BURST_RATE_SPAN)],
+        pre=BURST_PRE, post=BURST_POST, holdoff=BURST_HOLDOFF, meta={"pi_serial": pi_serial},
+    )
+
+    def save_open_event():
+        message = burst.close()
+        if message:
+            logging.info(message)
+
+    atexit.register(save_open_event)
+
+# Probes that are changing fast (or scattering) are also read between
+# the 30-sec ticks (shared/adaptive.py)
+adaptive = None
+if ADAPTIVE:
+    adaptive = AdaptiveSampler(len(CHANNELS), QUIET_EVERY, mode=ADAPTIVE)
+
 # ------------------------------------------------------
-# Align to next even 5-minute boundary (LOCAL TIME)
+# Exact 30-sec ticks from the next even 5-minute boundary
+# (monotonic deadlines, windows labelled in LOCAL TIME)
 # ------------------------------------------------------
-now = datetime.datetime.now()
-prev_minute = now.minute - (now.minute % 5)
-aligned = now.replace(minute=prev_minute, second=0, microsecond=0)
-aligned += datetime.timedelta(minutes=5)
+scheduler = SampleScheduler(
+    SAMPLE_INTERVAL / QUIET_EVERY, SAMPLES_PER_PERIOD * QUIET_EVERY, policy=SCHEDULE_POLICY,
+    local_time=True, join_current=RESUME_PARTIAL,
+)
+
+# logging.info(f"Next 5-min average scheduled for {scheduler.first_window:%Y-%m-%d %H:%M:%S}")
+
+# Query endpoint (shared/rtd_daemon.py): latest scan, open window and
+# recent windows from memory, served from a background thread
+query = None
+if QUERY_PORT or QUERY_SOCKET:
+    query = QueryServer([f"ch_{ch}" for ch in CHANNELS], ("temp", "resi", "corr"), scheduler)
+    try:
+        query.start(port=QUERY_PORT, unix_path=QUERY_SOCKET)
+    except OSError as e:
+        logging.warning(f"Query endpoint not started: {e}")
+        query = None
+
+# Awake / CPU fraction and estimated draw, reported with every SD card flush
+duty = DutyCycle(scheduler, idle_w=POWER_IDLE_W, busy_w=POWER_BUSY_W, battery_wh=BATTERY_WH)
+
+# Full-resolution raw samples (see shared/raw_store.py)
+raw_store = None
+if KEEP_RAW:
+    raw_store = RawStoreWriter(
+        raw_file,
+        sensor_table.meta(),
+        meta={"pi_serial": pi_serial, "interval_s": SAMPLE_INTERVAL},
+        buffer_size=FLUSH_BYTES,   # written out with the other files on flush
+        # Resuming needs the scans of the window in progress, so each
+        # one is handed to the OS as it is taken and fsynced once per
+        # window; battery mode keeps them for the batched flush instead
+        flush_each=RESUME_PARTIAL and not POWER_SAVE,
+    )
+    if raw_store.archived:
+        logging.warning(f"Raw store sensor layout changed, previous store archived as "
+                        f"{raw_store.archived.name}")
+    writer.on_flush.append(raw_store.flush)
+    if RESUME_PARTIAL and not POWER_SAVE:
+        writer.on_commit.append(lambda: raw_store.flush(sync=True))
+
+# Latest scan for rtd_run.py, so field checks stay off the bus
+live = None
+if PUBLISH_LIVE:
+    live = LivePublisher("mobile", [(0, ch) for ch in CHANNELS])
+    atexit.register(live.close)
+
+# Read latency, scan time, lateness and write cost, exported once per
+# window to /dev/shm/rtd_mobile.prom (RTD_METRICS_DIR to change)
+metrics = None
+if METRICS:
+    metrics = LoggerMetrics(metrics_path("mobile", METRICS), [f"ch_{ch}" for ch in CHANNELS])
+    atexit.register(metrics.export)
+
+# ------------------------------------------------------
+# Hourly / daily rollups (instrument_log_hourly.csv, _daily.csv),
+# resumed from the 5-min file after a restart
+# ------------------------------------------------------
+ROLLUPS = True
+
+rollups = None
+if ROLLUPS:
+    rollups = Rollups(data_file, [f"ch{ch}" for ch in CHANNELS], writer.write)
+    for archived in rollups.prepare():
+        logging.warning(f"Rollup columns changed, previous file archived as "
+                        f"{archived.name} (refilled from the data file and its archives)")
+    replayed = rollups.replay(
+        data_file, ("Channel",), [(str(ch),) for ch in CHANNELS], "Corr_Temp", "N_Valid"
+    )
+    logging.info(f"Rollups resumed from {replayed} logged windows")
+
+# Streaming 5-min statistics per channel (NaN reads are skipped)
+accum = WindowAccumulator(len(CHANNELS), fields=("temp", "resi", "corr"))
+
+# ------------------------------------------------------
+# Restart recovery: mark windows lost since the last written
+# one, and refill the joined window from the raw store
+# ------------------------------------------------------
+gap = GapLog(data_file, writer.write, window_seconds=scheduler.window_seconds).check(
+    scheduler.first_window
+)
+if gap:
+    logging.warning(
+        f"Data gap: {gap[2]} windows missing, "
+        f"{gap[0]:%Y-%m-%d %H:%M:%S} to {gap[1]:%Y-%m-%d %H:%M:%S}"
+    )
+
+if scheduler.joined_at:
+    resumed = resume_samples(raw_file, scheduler.anchor_wall, time.time())
+    for epoch, resi, temp in resumed:
+        accum.add(temp, resi, sensor_table.correct(temp))
+    logging.info(f"Joined window in progress with {len(resumed)} scans from the raw store")
 
-# logging.info(f"Next 5-min average scheduled for {aligned:%Y-%m-%d %H:%M:%S}")
+first_sample = True
 
 # ======================================================
 # MAIN LOOP — deterministic 5-min bins
 # ======================================================
-while True:
+for tick in scheduler:
+    if stop_requested:
+        break
+    if metrics:
+        metrics.record_tick(tick)
 
     # --------------------------------------------------
-    # Fresh accumulator for this 5-min window
+    # Sample all channels on this 30-sec tick
     # --------------------------------------------------
-    data_accum = {ch: [] for ch in CHANNELS}
+    if not tick.skipped:
+        skip = health.skip()
+        if adaptive:
+            skip = sorted(set(skip).union(adaptive.skip(tick)))
+        snap = scanner.scan(skip=skip)
+        if metrics:
+            metrics.record_scan(snap)
+        if first_sample:
+            first_sample = False
+            boot = uptime()
+            if boot is not None:
+                logging.info(f"First sample {boot:.1f} s after boot")
 
-    # --------------------------------------------------
-    # Collect 10 samples (30 sec apart)
-    # --------------------------------------------------
-    for _ in range(SAMPLES_PER_PERIOD):
-        for ch in CHANNELS:
-            try:
-                temp = librtd.get(0, ch)
-                resi = librtd.getRes(0, ch)
-            except Exception as e:
-                temp = float("nan")
-                resi = float("nan")
-                logging.error(f"Error reading channel {ch}: {e}")
+        for message in health.update(snap):
+            logging.warning(message)
+        if adaptive:
+            adaptive.update(snap)
+
+        # Window statistics, raw store and live segment stay on the 30-sec
+        # grid (full scans): extra adaptive reads would weight the mean
+        # toward whichever part of the window was active
+        on_grid = tick.sample_in_window % QUIET_EVERY == 0
+
+        corr = sensor_table.correct(snap.temp)
+        if on_grid:
+            accum.add(snap.temp, snap.resi, corr)
 
-            corr_temp = temp - offset_dict.get(f"ch_{ch}", 0)
-            data_accum[ch].append((temp, resi, corr_temp))
+        if burst:
+            message = burst.add(snap.started, snap.resi, snap.temp, bad=snap.bad)
+            if message:
+                logging.info(message)
 
-        time.sleep(SAMPLE_INTERVAL)
+        if raw_store and on_grid:
+            raw_store.append(snap.started, snap.resi, snap.temp, bad=snap.bad)
+
+        if live and on_grid:
+            live.publish(snap)
+
+        if query:
+            query.publish_scan(snap, (snap.temp, snap.resi, corr))
+            if on_grid and not tick.last_in_window:
+                query.publish_window(tick.window_start, accum.result())
+
+    if not tick.last_in_window:
+        continue
 
     # --------------------------------------------------
-    # Write 5-min averages
+    # Write 5-min averages (labelled with window start)
     # --------------------------------------------------
-    with data_file.open("a", newline="") as f:
-        writer = csv.writer(f)
-
-        for ch in CHANNELS:
-            samples = data_accum[ch]
-
-            if samples:
-                avg_temp = sum(s[0] for s in samples) / len(samples)
-                avg_resi = sum(s[1] for s in samples) / len(samples)
-                avg_corr = sum(s[2] for s in samples) / len(samples)
-            else:
-                avg_temp = avg_resi = avg_corr = float("nan")
-
-            writer.writerow([
-                aligned,
-                ch,
-                round(avg_temp, 1),
-                round(avg_resi, 0),
-                round(avg_corr, 1),
-            ])
+    aligned = tick.window_start
+    window = accum.result()
+    avg_temp, avg_resi, avg_corr = window.mean
+    std_temp = window.std[accum.field("temp")]
+    n_valid = window.count[accum.field("temp")]
+    fault = health.window_fault
+
+    rows = io.StringIO()
+    csv_rows = csv.writer(rows)
+
+    for i, ch in enumerate(CHANNELS):
+        csv_rows.writerow([
+            aligned,
+            ch,
+            round(float(avg_temp[i]), 1),
+            round(float(avg_resi[i]), 0),
+            round(float(avg_corr[i]), 1),
+            round(float(std_temp[i]), 2),
+            int(n_valid[i]),
+            int(fault[i]),
+        ])
+    writer.write(data_file, rows.getvalue())
+
+    if rollups:
+        rollups.add(aligned, avg_corr, n_valid)
+
+    if query:
+        query.publish_window(aligned, window, closed=True)
 
     logging.info(f"Wrote 5-min averaged data at {aligned:%Y-%m-%d %H:%M:%S}")
+    for message in health.end_window():
+        logging.warning(message)
 
-    # --------------------------------------------------
-    # Schedule next 5-min boundary
-    # --------------------------------------------------
-    aligned += datetime.timedelta(minutes=5)
-    # logging.info(f"Next 5-min average scheduled for {aligned:%Y-%m-%d %H:%M:%S}")
-
-    # Sleep until the next boundary
-    now = datetime.datetime.now()
-    sleep_time = (aligned - now).total_seconds()
-    if sleep_time > 0:
-        time.sleep(sleep_time)
\ No newline at end of file
+    # Effective sampling (N_Valid counts the 30-sec grid only)
+    if adaptive:
+        reads, active = adaptive.end_window()
+        logging.info(
+            f"Adaptive sampling: {active.sum()} channels active "
+            f"({', '.join(str(ch) for ch, a in zip(CHANNELS, active) if a) or 'none'}), "
+            f"{reads.sum()} reads vs {len(CHANNELS) * SAMPLES_PER_PERIOD} at the base rate"
+        )
+
+    sched = scheduler.stats()
+    if sched["skipped"] or sched["overruns"]:
+        logging.warning(
+            f"Scheduler: {sched['skipped']} skipped, {sched['caught_up']} caught up, "
+            f"max lateness {sched['max_lateness_s']:.2f} s"
+        )
+    scheduler.reset_stats()
+
+    # Window complete: journal it (flushes to the SD card when due)
+    if metrics:
+        io_before, t0 = writer.bytes_written, time.perf_counter()
+        writer.commit()
+        metrics.record_write(time.perf_counter() - t0, writer.bytes_written - io_before)
+        metrics.export()
+    else:
+        writer.commit()
+
+    # Fresh accumulator for the next 5-min window
+    accum.reset()
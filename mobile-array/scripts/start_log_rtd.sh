@@ -1,5 +1,12 @@
 #!/bin/bash
-sleep 60
+# No fixed boot delay: log_rtd_single.py probes the card and the RTD hat
+# itself (WAIT_READY) and starts the moment they answer. Only wait here
+# until the virtualenv is readable.
+PY=/home/meganmason/rpi/bin/python
+for delay in 0.1 0.2 0.4 0.8 1.6 3.2 5 5 5 5 5 5 5 5 5 5; do
+    [ -x "$PY" ] && break
+    sleep $delay
+done
 source /home/meganmason/rpi/bin/activate
 cd /home/meganmason/Documents/projects/cold-content/snowtemps_raspi/mobile-array/scripts
-/home/meganmason/rpi/bin/python log_rtd_single.py
+exec "$PY" log_rtd_single.py
@@ -0,0 +1,144 @@
+# Activity-driven sampling for the RTD loggers
+
+'''
+Reads sensors more often only while their temperature is moving.
+
+Most of the winter the deep snowpack changes by hundredths of a degree
+an hour, while melt / refreeze near the surface moves degrees. A fixed
+30-sec interval oversamples the first and undersamples the second.
+
+With adaptive sampling the scheduler ticks at the fast interval (e.g.
+5 s) and AdaptiveSampler decides, tick by tick, which sensors to read:
+
+    every quiet_every-th tick   all sensors (the 30-sec base grid, so
+                                the raw store and the minimum count per
+                                window are unchanged)
+    other ticks                 active sensors only   (mode 'sensor')
+                                everything if any sensor is active,
+                                nothing otherwise     (mode 'array')
+
+Skipped sensors are passed to Scanner.scan(skip=...) and come back as
+NaN. The loggers only put the base-grid scans into the window
+statistics, so mean, std and N_Valid are the same regular 30-sec
+samples whatever the activity: unweighted extra reads would pull the
+mean toward the active part of the window (a sensor turning active 3
+minutes in would get ~80% of the weight on its last 2 minutes). The
+extra reads drive the activity estimates below, burst capture and the
+live / query views; end_window() reports how many there were.
+
+A sensor's activity is tracked from its own reads with time-constant
+EWMAs (independent of how often it is read):
+
+    level   smoothed temperature
+    rate    |d level / dt|, degC per minute
+    scatter RMS of reads around the level, degC
+
+It turns active when rate > rate_threshold or scatter > std_threshold,
+and quiet again once both have stayed below half of that for `hold`
+seconds.
+'''
+
+import math
+
+import numpy as np
+
+MODES = ("sensor", "array")
+
+
+class AdaptiveSampler:
+    """
+    n_sensors      - sensors per scan
+    quiet_every    - ticks between reads of a quiet sensor
+    mode           - 'sensor' or 'array' (see module docstring)
+    rate_threshold - degC/min of smoothed change that marks a sensor active
+    std_threshold  - degC of scatter around the level that marks it active
+    hold           - seconds a sensor stays active after calming down
+    tau            - EWMA time constant (s)
+    """
+
+    def __init__(self, n_sensors, quiet_every, mode="sensor", rate_threshold=0.02,
+                 std_threshold=0.1, hold=600, tau=120):
+        if mode not in MODES:
+            raise ValueError(f"Unknown adaptive mode '{mode}', expected one of {MODES}")
+        self.n_sensors = n_sensors
+        self.quiet_every = quiet_every
+        self.mode = mode
+        self.rate_threshold = rate_threshold
+        self.std_threshold = std_threshold
+        self.hold = hold
+        self.tau = tau
+
+        self.level = np.full(n_sensors, np.nan)
+        self.rate = np.zeros(n_sensors)        # degC / min
+        self.var = np.zeros(n_sensors)         # degC^2
+        self.last_time = np.full(n_sensors, np.nan)
+        self.active = np.zeros(n_sensors, dtype=bool)
+        self.calm_since = np.full(n_sensors, np.nan)
+
+        self.window_reads = np.zeros(n_sensors, dtype=np.int64)
+        self.window_active = np.zeros(n_sensors, dtype=bool)
+        self._all = list(range(n_sensors))
+
+    def skip(self, tick):
+        """Sensors not due on this tick (pass to Scanner.scan)."""
+        if tick.sample_in_window % self.quiet_every == 0:
+            return []
+        if self.mode == "array":
+            return [] if self.active.any() else self._all
+        return np.flatnonzero(~self.active).tolist()
+
+    def update(self, snap):
+        """Fold one scan's reads into the activity estimates."""
+        t = np.asarray(snap.read_time, dtype=float)
+        x = np.asarray(snap.temp, dtype=float)
+        read = np.isfinite(t) & np.isfinite(x)
+        self.window_reads += read
+
+        first = read & np.isnan(self.level)
+        self.level[first] = x[first]
+        self.last_time[first] = t[first]
+
+        step = read & ~first
+        if step.any():
+            dt = np.maximum(t[step] - self.last_time[step], 1e-3)
+            a = 1.0 - np.exp(-dt / self.tau)
+            resid = x[step] - self.level[step]
+            new_level = self.level[step] + a * resid
+            slope = np.abs(new_level - self.level[step]) / dt * 60.0
+            self.rate[step] += a * (slope - self.rate[step])
+            self.var[step] += a * (resid * resid - self.var[step])
+            self.level[step] = new_level
+            self.last_time[step] = t[step]
+
+        self._classify(np.nanmax(t) if read.any() else snap.started)
+        self.window_active |= self.active
+
+    def _classify(self, now):
+        scatter = np.sqrt(self.var)
+        hot = (self.rate > self.rate_threshold) | (scatter > self.std_threshold)
+        calm = (self.rate < self.rate_threshold / 2) & (scatter < self.std_threshold / 2)
+
+        self.active |= hot
+        self.calm_since[~calm] = np.nan
+        starting = calm & np.isnan(self.calm_since)
+        self.calm_since[starting] = now
+        with np.errstate(invalid="ignore"):
+            done = self.active & calm & (now - self.calm_since >= self.hold)
+        self.active[done] = False
+
+    def end_window(self):
+        """(reads per sensor, sensors active at any point) for the window; resets both."""
+        reads, active = self.window_reads.copy(), self.window_active.copy()
+        self.window_reads.fill(0)
+        self.window_active[:] = self.active
+        return reads, active
+
+
+def fast_ticks(sample_interval, active_interval):
+    """quiet_every for a base and a fast interval that divides it."""
+    ratio = sample_interval / active_interval
+    if ratio < 1 or not math.isclose(ratio, round(ratio)):
+        raise ValueError(
+            f"Active interval {active_interval} s must divide the sample interval {sample_interval} s"
+        )
+    return round(ratio)
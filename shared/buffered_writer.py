@@ -0,0 +1,248 @@
+# SD-card-friendly buffered writer for the RTD loggers
+
+'''
+Batches appends to the logger files in RAM behind a write-ahead journal.
+
+Reopening the data CSV every window and the log file for every message
+is a stream of small random writes that wears out the SD card. Here all
+appends (data rows, log lines) go to per-file RAM buffers:
+
+    write(path, data)   buffer an append (str or bytes)
+    commit()            append everything buffered since the last commit
+                        to the journal and fsync it - one small sequential
+                        write; call it when a window is complete. Each of
+                        on_commit runs afterwards (e.g. to sync the raw
+                        store once per window)
+    flush()             append each buffer to its file, fsync, then empty
+                        the journal; runs automatically from commit() once
+                        flush_interval seconds or flush_bytes have built up,
+                        then calls each of on_flush (e.g. to flush the raw
+                        store on the same cadence)
+
+Each file's buffer is dropped as soon as it has been appended. A flush
+interrupted part-way (an exception, e.g. SystemExit from a signal
+handler) is remembered, and the next flush - close() at exit - only
+appends what the files don't already end with, the same check replay
+uses, so no row is written twice.
+
+After a power loss, replaying the journal on the next start restores
+everything that was committed. Replay is idempotent: if a file already
+ends with (part of) the journaled data, only the missing tail is added,
+and a torn last line is cut first, so a crash in the middle of flush()
+doesn't duplicate or garble rows.
+
+Journal record: <uint32 payload len><uint32 crc32><uint16 path len>
+<path utf-8><payload>. A torn or corrupt last record is dropped.
+'''
+
+import logging
+import os
+import struct
+import time
+import zlib
+from pathlib import Path
+
+_RECORD = struct.Struct("<IIH")
+
+
+class BufferedWriter:
+    """
+    journal_path   - write-ahead journal (keep it next to the data files)
+    flush_interval - seconds between flushes to the real files
+    flush_bytes    - flush early once this much is buffered
+    sync           - fsync journal and files (turn off only for tests)
+    """
+
+    def __init__(self, journal_path, flush_interval=3600, flush_bytes=64 * 1024,
+                 sync=True, clock=time.monotonic):
+        self.journal_path = Path(journal_path)
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.sync = sync
+        self.clock = clock
+
+        self._buffers = {}       # path -> list of bytes, not yet in the files
+        self._buffered = 0
+        self._uncommitted = []   # (path, bytes) not yet in the journal
+        self._last_flush = clock()
+        self._interrupted = False   # a flush stopped part-way through
+        self.on_flush = []       # callables run after every flush()
+        self.on_commit = []      # callables run after every commit()
+
+        # I/O accounting
+        self.bytes_written = 0
+        self.syncs = 0
+        self.file_writes = 0
+        self.flushes = 0
+
+        self.replayed = self._replay()
+        self._journal = self.journal_path.open("ab")
+
+    # --------------------------------------------------
+    # Public API
+    # --------------------------------------------------
+    def write(self, path, data):
+        if isinstance(data, str):
+            data = data.encode()
+        path = Path(path)
+        self._buffers.setdefault(path, []).append(data)
+        self._uncommitted.append((path, data))
+        self._buffered += len(data)
+
+    def commit(self):
+        """Make everything written so far crash-safe; flush if due."""
+        self._journal_pending()
+        if (self._buffered >= self.flush_bytes
+                or self.clock() - self._last_flush >= self.flush_interval):
+            self.flush()
+        for callback in self.on_commit:
+            callback()
+
+    def flush(self):
+        """Append every buffer to its file and clear the journal."""
+        self._write_buffers()
+        self._last_flush = self.clock()
+        self.flushes += 1
+        for callback in self.on_flush:
+            callback()
+
+    def close(self):
+        self.flush()
+        self._write_buffers()   # anything the on_flush callbacks logged
+        self._journal.close()
+
+    def stats(self):
+        return {
+            "bytes_written": self.bytes_written,
+            "syncs": self.syncs,
+            "file_writes": self.file_writes,
+            "flushes": self.flushes,
+            "buffered_bytes": self._buffered,
+        }
+
+    # --------------------------------------------------
+    # Journal
+    # --------------------------------------------------
+    def _write_buffers(self):
+        self._journal_pending()
+        recheck, self._interrupted = self._interrupted, True
+        for path in list(self._buffers):
+            data = b"".join(self._buffers[path])
+            done = _overlap(path, data) if recheck else 0
+            if done < len(data):
+                with path.open("ab") as f:
+                    f.write(data[done:])
+                    f.flush()
+                    self._fsync(f)
+                self.bytes_written += len(data) - done
+                self.file_writes += 1
+            del self._buffers[path]
+            self._buffered -= len(data)
+        self._journal.truncate(0)
+        self._journal.seek(0)
+        self._fsync(self._journal)
+        self._interrupted = False
+
+    def _journal_pending(self):
+        if not self._uncommitted:
+            return
+        records = b"".join(self._encode(p, d) for p, d in self._uncommitted)
+        self._journal.write(records)
+        self._journal.flush()
+        self._fsync(self._journal)
+        self.bytes_written += len(records)
+        self._uncommitted = []
+
+    def _fsync(self, f):
+        if self.sync:
+            os.fsync(f.fileno())
+            self.syncs += 1
+
+    @staticmethod
+    def _encode(path, data):
+        name = str(path).encode()
+        return _RECORD.pack(len(data), zlib.crc32(data), len(name)) + name + data
+
+    def _read_journal(self):
+        """Yield (path, payload) for every intact journal record."""
+        if not self.journal_path.is_file():
+            return
+        blob = self.journal_path.read_bytes()
+        pos = 0
+        while pos + _RECORD.size <= len(blob):
+            length, crc, name_len = _RECORD.unpack_from(blob, pos)
+            start = pos + _RECORD.size + name_len
+            data = blob[start:start + length]
+            if len(data) < length or zlib.crc32(data) != crc:
+                break   # torn or corrupt tail
+            yield Path(blob[pos + _RECORD.size:start].decode()), data
+            pos = start + length
+
+    def _replay(self):
+        """Re-apply committed writes left over from a crash."""
+        pending = {}
+        for path, data in self._read_journal():
+            pending.setdefault(path, []).append(data)
+
+        for path, chunks in pending.items():
+            data = b"".join(chunks)
+            if data.endswith(b"\n"):
+                _trim_torn_line(path)
+            done = _overlap(path, data)
+            if done < len(data):
+                with path.open("ab") as f:
+                    f.write(data[done:])
+                    f.flush()
+                    self._fsync(f)
+                self.bytes_written += len(data) - done
+                self.file_writes += 1
+
+        if self.journal_path.is_file():
+            with self.journal_path.open("r+b") as f:
+                f.truncate(0)
+                self._fsync(f)
+        return sum(len(d) for chunks in pending.values() for d in chunks)
+
+
+class BufferedLogHandler(logging.Handler):
+    """logging handler that appends formatted records through a BufferedWriter."""
+
+    def __init__(self, writer, path):
+        super().__init__()
+        self.writer = writer
+        self.path = Path(path)
+
+    def emit(self, record):
+        try:
+            self.writer.write(self.path, self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)
+
+
+def _trim_torn_line(path):
+    """Cut a partial last line (no trailing newline) off a text file."""
+    if not path.is_file() or path.stat().st_size == 0:
+        return
+    with path.open("r+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(0, size - 64 * 1024))
+        tail = f.read()
+        if tail.endswith(b"\n"):
+            return
+        f.truncate(size - len(tail) + tail.rfind(b"\n") + 1)
+
+
+def _overlap(path, data):
+    """Length of the longest line-aligned prefix of data that path ends with."""
+    if not path.is_file():
+        return 0
+    size = path.stat().st_size
+    with path.open("rb") as f:
+        f.seek(max(0, size - len(data)))
+        tail = f.read()
+    k = len(data)
+    while k > 0:
+        if tail.endswith(data[:k]):
+            return k
+        k = data.rfind(b"\n", 0, k - 1) + 1
+    return 0
@@ -0,0 +1,240 @@
+# Event-triggered burst capture for the RTD loggers
+
+'''
+Keeps the last few minutes of every scan in RAM and saves them, plus
+what follows, when something interesting happens.
+
+The data files hold 5-min means and the raw store one scan every 30 s,
+so the short events we care about (rain-on-snow, rapid surface
+cooling) are smoothed away. Writing every scan at the full tick rate
+all the time would cost SD-card I/O for nothing most of the winter.
+
+BurstCapture holds a ring of the most recent scans (at whatever rate
+the logger ticks - 30 s, or faster with oversampling / adaptive
+sampling) and checks triggers after each one:
+
+    RateTrigger       |temperature change| over `span` seconds above
+                      `threshold` degC/min on any watched sensor
+    GradientTrigger   |temperature difference| between adjacent
+                      heights above `threshold` degC/m
+
+When one fires, the ring's last `pre` seconds plus the next `post`
+seconds are written to one event file; a trigger that fires again
+during the post period extends it (up to `max_duration`). Event files
+use the raw store layout (shared/raw_store.py), with the trigger in
+the header, so RawStoreReader opens them:
+
+    <events dir>/<name>_<YYYYmmdd_HHMMSS>.bin
+
+Consecutive events never overlap: the next pre-trigger period starts
+no earlier than the end of the last saved event. Each event file is an
+fsynced write of up to max_duration of scans, so after an event the
+triggers are ignored for `holdoff` seconds (counted, and reported with
+the next event) - a trigger that is too sensitive then costs a few
+files a day, not one every hour.
+'''
+
+import math
+from datetime import datetime, timezone
+
+import numpy as np
+
+from raw_store import fill_record, record_dtype, write_store
+
+
+class RingBuffer:
+    """The last `capacity` scans as raw store records, oldest first on read."""
+
+    def __init__(self, n_sensors, capacity):
+        self.capacity = capacity
+        self.records = np.zeros(capacity, dtype=record_dtype(n_sensors))
+        self.records["epoch"] = np.nan
+        self.head = 0       # next slot to write
+        self.size = 0
+
+    def append(self, epoch, resi, temp, bad=()):
+        fill_record(self.records[self.head], epoch, resi, temp, bad)
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def ordered(self):
+        """Slot indices from oldest to newest."""
+        start = (self.head - self.size) % self.capacity
+        return (start + np.arange(self.size)) % self.capacity
+
+    def between(self, start, end):
+        """Records with start <= epoch <= end, oldest first (a copy)."""
+        slots = self.ordered()
+        epoch = self.records["epoch"][slots]
+        return self.records[slots[(epoch >= start) & (epoch <= end)]]
+
+    def before(self, epoch):
+        """Newest record at or before epoch, or None."""
+        slots = self.ordered()
+        times = self.records["epoch"][slots]
+        k = np.searchsorted(times, epoch, side="right") - 1
+        return None if k < 0 else self.records[slots[k]]
+
+
+# ------------------------------------------------------
+# Triggers: fire(ring, epoch, temp) -> (sensor index, value) or None
+# ------------------------------------------------------
+class RateTrigger:
+    """
+    threshold - degC per minute of change over `span` seconds
+    span      - seconds looked back (longer = less sensitive to read noise)
+    sensors   - indices to watch (None = all)
+    """
+
+    name = "rate"
+
+    def __init__(self, threshold, span=600, sensors=None):
+        self.threshold = threshold
+        self.span = span
+        self.sensors = None if sensors is None else np.asarray(sensors)
+
+    def fire(self, ring, epoch, temp):
+        then = ring.before(epoch - self.span)
+        if then is None:
+            return None
+        dt = epoch - then["epoch"]
+        if dt <= 0:
+            return None
+        with np.errstate(invalid="ignore"):
+            rate = np.abs(np.asarray(temp) - then["temp"]) / dt * 60.0
+        if self.sensors is not None:
+            watched = np.full(len(rate), np.nan)
+            watched[self.sensors] = rate[self.sensors]
+            rate = watched
+        if not np.isfinite(rate).any():
+            return None
+        i = int(np.nanargmax(rate))
+        return (i, float(rate[i])) if rate[i] > self.threshold else None
+
+
+class GradientTrigger:
+    """
+    threshold  - degC per metre between adjacent sensors
+    heights_cm - height of each sensor (profile arrays only)
+    """
+
+    name = "gradient"
+
+    def __init__(self, threshold, heights_cm):
+        self.threshold = threshold
+        self.order = np.argsort(heights_cm)
+        self.dz = np.diff(np.asarray(heights_cm, dtype=float)[self.order]) / 100.0
+
+    def fire(self, ring, epoch, temp):
+        t = np.asarray(temp, dtype=float)[self.order]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            grad = np.abs(np.diff(t)) / self.dz
+        if not np.isfinite(grad).any():
+            return None
+        k = int(np.nanargmax(grad))
+        # Report the upper sensor of the steepest pair
+        return (int(self.order[k + 1]), float(grad[k])) if grad[k] > self.threshold else None
+
+
+class BurstCapture:
+    """
+    events_dir   - where event files go (created on first event)
+    name         - file name prefix, e.g. 'rtd_tower'
+    sensors      - per-sensor dicts for the file header (as for the raw store)
+    interval     - seconds between scans (sizes the ring)
+    triggers     - list of RateTrigger / GradientTrigger
+    pre, post    - seconds kept before / after the trigger
+    max_duration - an event that keeps re-triggering is cut here
+    holdoff      - seconds after a saved event during which triggers
+                   are ignored (rate limit on event files)
+    meta         - extra header fields
+    """
+
+    def __init__(self, events_dir, name, sensors, interval, triggers, pre=1800, post=1800,
+                 max_duration=3 * 3600, holdoff=0, meta=None):
+        self.events_dir = events_dir
+        self.name = name
+        self.sensors = list(sensors)
+        self.triggers = list(triggers)
+        self.pre = pre
+        self.post = post
+        self.max_duration = max_duration
+        self.holdoff = holdoff
+        self.meta = dict(meta or {}, interval_s=interval)
+        spans = [t.span for t in self.triggers if hasattr(t, "span")]
+        keep = max([pre] + spans) + max_duration
+        self.ring = RingBuffer(len(self.sensors), math.ceil(keep / interval) + 2)
+        self.event = None          # open event: dict(start, end, trigger ...)
+        self.saved_until = -math.inf
+        self.events = 0
+        self.suppressed = 0        # triggers ignored in the hold-off since the last event
+
+    def add(self, epoch, resi, temp, bad=()):
+        """
+        Record one scan and check triggers. Returns a message when an event
+        starts or is saved, else None.
+        """
+        self.ring.append(epoch, resi, temp, bad)
+
+        hit = None
+        for trigger in self.triggers:
+            result = trigger.fire(self.ring, epoch, temp)
+            if result is not None:
+                hit = (trigger, *result)
+                break
+
+        event = self.event
+        if event is not None:
+            if hit and epoch - event["start"] < self.max_duration:
+                event["end"] = min(epoch + self.post, event["start"] + self.max_duration)
+                event["triggers"] += 1
+            if epoch >= event["end"]:
+                return self._save()
+            return None
+
+        if hit and epoch < self.saved_until + self.holdoff:
+            self.suppressed += 1
+            return None
+
+        if hit:
+            trigger, i, value = hit
+            self.event = {
+                "trigger": trigger.name,
+                "sensor": self.sensors[i].get("key", i),
+                "value": round(value, 4),
+                "threshold": trigger.threshold,
+                "triggered_at": epoch,
+                "start": max(epoch - self.pre, self.saved_until),
+                "end": epoch + self.post,
+                "triggers": 1,
+                "suppressed_before": self.suppressed,
+            }
+            self.suppressed = 0
+            return (
+                f"Burst capture: {trigger.name} trigger on {self.event['sensor']} "
+                f"({value:.3f} > {trigger.threshold}), recording until "
+                f"{_label(self.event['end']):%Y-%m-%d %H:%M:%S}"
+            )
+        return None
+
+    def close(self):
+        """Save an event still recording (e.g. on shutdown)."""
+        if self.event is not None:
+            return self._save()
+        return None
+
+    def _save(self):
+        event, self.event = self.event, None
+        records = self.ring.between(event["start"], event["end"])
+        if len(records) == 0:
+            return None
+        self.saved_until = float(records["epoch"][-1]) + 1e-6
+        self.events_dir.mkdir(parents=True, exist_ok=True)
+        path = self.events_dir / f"{self.name}_{_label(event['triggered_at']):%Y%m%d_%H%M%S}.bin"
+        write_store(path, self.sensors, records, dict(self.meta, event=event))
+        self.events += 1
+        return f"Burst capture saved {len(records)} scans to {path.name}"
+
+
+def _label(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None)
@@ -0,0 +1,84 @@
+# Data file helpers for the RTD loggers
+
+'''
+Small helpers shared by the loggers for the CSV data files.
+'''
+
+import json
+import os
+import re
+from datetime import datetime
+
+
+def prepare_data_file(path, header):
+    """
+    Make sure path exists and starts with header (a full line, with its
+    line terminator - csv.writer files end lines in \\r\\n).
+
+    A file written by an older logger version with a different header is
+    renamed to <stem>_<UTC time><suffix> first, so rows with different
+    column sets never end up in one file. Its .idx and .offsets.json
+    sidecars go with it. This can happen mid-season, so callers should
+    log it as a warning; range_reader.read_range (and with it the
+    rollups) reads the archived files ahead of the current one, so the
+    season still reads as one. Returns the archived path, or None if
+    nothing was moved.
+    """
+    archived = None
+    if path.is_file() and path.stat().st_size > 0:
+        with path.open(newline="") as f:
+            existing = f.readline()
+        if existing == header:
+            return None
+        archived = path.with_name(f"{path.stem}_{datetime.utcnow():%Y%m%d%H%M%S}{path.suffix}")
+        path.rename(archived)
+        for suffix in (".idx", ".offsets.json"):
+            sidecar = path.with_name(path.name + suffix)
+            if sidecar.is_file():
+                sidecar.rename(archived.with_name(archived.name + suffix))
+
+    if not path.is_file() or path.stat().st_size == 0:
+        with path.open("w", newline="") as f:
+            f.write(header)
+    return archived
+
+
+def archived_files(path):
+    """Files prepare_data_file archived path to, oldest first."""
+    pattern = re.compile(re.escape(path.stem) + r"_\d{14}" + re.escape(path.suffix) + "$")
+    if not path.parent.is_dir():
+        return []
+    return sorted(p for p in path.parent.iterdir() if pattern.match(p.name))
+
+
+def last_row_time(path):
+    """
+    Timestamp (first column, "YYYY-mm-dd HH:MM:SS") of the last complete
+    row, found by seeking to the end of the file; None if there is none.
+    """
+    if not path.is_file():
+        return None
+    with path.open("rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(0, size - 64 * 1024))
+        lines = f.read().split(b"\n")[:-1]   # drop a partial last line
+    for line in reversed(lines):
+        try:
+            return datetime.strptime(line[:19].decode(), "%Y-%m-%d %H:%M:%S")
+        except (ValueError, UnicodeDecodeError):
+            continue
+    return None
+
+
+def offsets_sidecar(path):
+    """<file>.offsets.json: the offset set last applied by shared/reprocess.py."""
+    return path.with_name(path.name + ".offsets.json")
+
+
+def applied_offsets(path):
+    """Contents of path's offsets sidecar, or None if it was never reprocessed."""
+    sidecar = offsets_sidecar(path)
+    if not sidecar.is_file():
+        return None
+    with sidecar.open() as f:
+        return json.load(f)
@@ -0,0 +1,506 @@
+# Fleet ingest: every unit's logger CSVs into one Parquet dataset
+
+'''
+Merges the tower and mobile-unit data files into a single columnar
+dataset, partitioned by unit and month, for season-wide analysis.
+
+The loggers write different files with different conventions:
+
+    tower   rtd_tower_data*.csv        Time(UTC), Hat, Channel, Height_cm,
+                                       Sensor_Number, Resistance_ohms,
+                                       RawTemp_degC, CorrectedTemp_degC, ...
+            (log_rtd_5min.py)          Time (UTC), Hat_no, ... - the rows
+                                       carry Sensor_Number the header lacks
+    mobile  OPIE_*/instrument_log.csv  Timestamp, Channel, Temp, Resi,
+                                       Corr_Temp, ...   in LOCAL time
+
+Every file is normalized to one schema (SCHEMA), with times in UTC and
+the offset sign folded out: `correction` is always corr_temp - raw_temp,
+whatever convention the logger used. Columns a file version lacks
+(std_temp, n_valid, fault on older files; height_cm on the mobile units)
+are null. Local times are converted with --local-tz; the repeated hour
+when DST ends is resolved from the row order (from a local time that
+goes backwards until the repeated hour is over, it is the second pass).
+
+Output (hive partitioning, readable by pyarrow / pandas / DuckDB):
+
+    <dataset>/unit=tower/month=2026-01/<file id>-<byte offset>.parquet
+    <dataset>/unit=OPIE_I/month=2026-01/...
+    <dataset>/_ingest_state.json
+
+Ingest is incremental. Each source file is identified by its header and
+first timestamp (so a file archived by prepare_data_file under a new name
+is recognised) and the state remembers how many bytes of it are in the
+dataset; a rerun parses only what was appended since. A file rewritten
+by shared/reprocess.py with another offset set (its .offsets.json
+changed) has its parts dropped and is ingested again. Files are parsed
+in parallel by a process pool, each in blocks of --block-mb, and every
+Parquet part is written to a temporary name and renamed into place. Part
+names are deterministic, so a run interrupted before the state was saved
+just rewrites the same parts.
+
+    python shared/fleet_ingest.py ~/fleet_parquet \\
+        fixed-array/logger_files mobile-array/logger_files \\
+        OPIE_III=/media/usb/instrument_log.csv
+
+Files whose unit can't be told from the path (mobile logger_files/
+without an OPIE_* directory) need the UNIT=path form. CSVs that aren't
+long-format data files (wide, rollups) are skipped.
+
+Reading back only the columns and months needed:
+
+    table = load("~/fleet_parquet", columns=["time", "sensor", "corr_temp"],
+                 units=["tower"], start="2026-01-01", end="2026-03-01")
+
+Needs pyarrow (not required by the loggers themselves).
+'''
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from data_files import applied_offsets
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:     # optional: only this tool needs it
+    pa = None
+
+LOCAL_TZ = "America/Los_Angeles"    # clock of the mobile units
+STATE_FILE = "_ingest_state.json"
+BLOCK_MB = 32
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+FINGERPRINT_BYTES = 64 * 1024       # header + first row must fit here
+
+# Normalized column <- names used by the logger versions
+ALIASES = {
+    "time": ("Time(UTC)", "Time (UTC)", "Timestamp"),
+    "hat": ("Hat", "Hat_no"),
+    "channel": ("Channel",),
+    "height_cm": ("Height_cm",),
+    "sensor_num": ("Sensor_Number",),
+    "resistance": ("Resistance_ohms", "Resi"),
+    "raw_temp": ("RawTemp_degC", "Raw_Temp_degC", "Temp"),
+    "corr_temp": ("CorrectedTemp_degC", "Corrected_Temp_degC", "Corr_Temp"),
+    "std_temp": ("StdTemp_degC", "Temp_Std"),
+    "n_valid": ("N_Valid",),
+    "fault": ("Fault",),
+}
+UTC_COLUMNS = ("Time(UTC)", "Time (UTC)")
+
+# Headers whose rows don't match them (column names as actually written)
+LEGACY_ROWS = {
+    "Time (UTC),Hat_no,Channel,Height_cm,Resistance_ohms,Raw_Temp_degC,Corrected_Temp_degC": (
+        "Time (UTC)", "Hat_no", "Channel", "Sensor_Number", "Height_cm",
+        "Resistance_ohms", "Raw_Temp_degC", "Corrected_Temp_degC",
+    ),
+}
+
+if pa is not None:
+    SCHEMA = pa.schema([
+        ("time", pa.timestamp("s", tz="UTC")),
+        ("sensor", pa.string()),
+        ("hat", pa.int8()),
+        ("channel", pa.int8()),
+        ("height_cm", pa.int32()),
+        ("sensor_num", pa.int32()),
+        ("resistance", pa.float64()),
+        ("raw_temp", pa.float64()),
+        ("corr_temp", pa.float64()),
+        ("correction", pa.float64()),
+        ("std_temp", pa.float64()),
+        ("n_valid", pa.int32()),
+        ("fault", pa.int8()),
+    ])
+    PARTITIONING = ds.partitioning(
+        pa.schema([("unit", pa.string()), ("month", pa.string())]), flavor="hive"
+    )
+
+
+def _require_arrow():
+    if pa is None:
+        raise ImportError("fleet_ingest needs pyarrow: pip install pyarrow")
+
+
+# ------------------------------------------------------
+# Source files
+# ------------------------------------------------------
+class Layout:
+    """How one header version maps onto SCHEMA."""
+
+    def __init__(self, header):
+        names = header.strip().split(",")
+        self.columns = list(LEGACY_ROWS.get(header.strip(), names))
+        self.source = {}
+        for field, aliases in ALIASES.items():
+            for name in aliases:
+                if name in self.columns:
+                    self.source[field] = name
+                    break
+        self.utc = self.source.get("time") in UTC_COLUMNS
+        self.is_data = all(f in self.source for f in ("time", "channel", "raw_temp"))
+
+
+def read_head(path):
+    """
+    (header, first data row, bytes up to the first row) - header and row
+    as text, None where not complete yet.
+    """
+    with open(path, "rb") as f:
+        lines = f.read(FINGERPRINT_BYTES).split(b"\n")[:-1]
+    if len(lines) < 2:
+        return None, None, 0
+    header, first = (line.decode(errors="replace").rstrip("\r") for line in lines[:2])
+    return header, first, len(lines[0]) + 1
+
+
+def fingerprint(unit, header, first_row):
+    """File id from what reprocessing never changes: unit, header, first timestamp."""
+    first_time = first_row.split(",", 1)[0]
+    return hashlib.sha1(f"{unit}\n{header}\n{first_time}".encode()).hexdigest()[:16]
+
+
+def unit_for(path):
+    """Unit name from a data file's path, or None if it can't be told."""
+    if path.name.startswith("rtd_tower_data"):
+        return "tower"
+    if path.parent.name != "logger_files":
+        return path.parent.name
+    return None
+
+
+def find_sources(specs):
+    """
+    [(unit, path, header, first row, data start), ...] for the long-format
+    data files named by 'PATH' / 'UNIT=PATH' arguments (directories are
+    walked). Files with no data row yet are left out.
+    """
+    sources, unknown = [], []
+    for spec in specs:
+        unit, sep, path = spec.partition("=")
+        if not sep or os.sep in unit:
+            unit, path = "", spec
+        path = Path(path).expanduser()
+        if not path.exists():
+            raise ValueError(f"No such file or directory: {path}")
+        files = sorted(path.rglob("*.csv")) if path.is_dir() else [path]
+        for file in files:
+            header, first, data_start = read_head(file)
+            if header is None or not Layout(header).is_data:
+                continue
+            name = unit or unit_for(file)
+            if name is None:
+                unknown.append(str(file))
+            else:
+                sources.append((name, file, header, first, data_start))
+    if unknown:
+        raise ValueError(
+            "Can't tell the unit of these files, pass them as UNIT=path: " + ", ".join(unknown)
+        )
+    return sources
+
+
+# ------------------------------------------------------
+# Parsing (runs in the worker processes)
+# ------------------------------------------------------
+def _blocks(path, start, block_bytes):
+    """(offset, bytes) blocks of complete lines from start to the last newline."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        offset, carry = start, b""
+        while True:
+            chunk = f.read(block_bytes)
+            if not chunk:
+                return
+            data = carry + chunk
+            end = data.rfind(b"\n") + 1
+            if end:
+                yield offset, data[:end]
+                offset += end
+            carry = data[end:]
+
+
+def _to_utc(times, layout, local_tz, prev_local):
+    """
+    Naive timestamps -> UTC; returns (utc array, state for the next
+    block: [last local time seen, inside the repeated hour's second pass]).
+    """
+    if layout.utc:
+        return pc.assume_timezone(times, "UTC"), None
+    if prev_local is None:
+        prev_local = [np.iinfo(np.int64).min, False]
+    elif not isinstance(prev_local, list):
+        prev_local = [prev_local, False]     # manifests from before the flag
+    local = times.cast(pa.int64()).to_numpy(zero_copy_only=False)
+    earliest = pc.assume_timezone(times, local_tz, ambiguous="earliest", nonexistent="earliest")
+    latest = pc.assume_timezone(times, local_tz, ambiguous="latest", nonexistent="earliest")
+    ambiguous = (pc.cast(earliest, pa.int64()).to_numpy(zero_copy_only=False)
+                 != pc.cast(latest, pa.int64()).to_numpy(zero_copy_only=False))
+    # A local time below one already seen -> the clock fell back. Every
+    # ambiguous time from there until the repeated hour is over (the
+    # first unambiguous row) is on the second pass, including the ones
+    # that climb back up to the running maximum.
+    seen = np.maximum.accumulate(np.concatenate([[prev_local[0]], local]))
+    back = ambiguous & (local < seen[:-1])
+    index = np.arange(1, len(local) + 1)
+    last_back = np.maximum.accumulate(np.concatenate([[0 if prev_local[1] else -1],
+                                                      np.where(back, index, -1)]))[1:]
+    last_break = np.maximum.accumulate(np.where(ambiguous, -1, index))
+    repeat = ambiguous & (last_back > last_break)
+    second_pass = bool(repeat[-1]) if len(repeat) else prev_local[1]
+    return pc.if_else(pa.array(repeat), latest, earliest), [int(seen[-1]), second_pass]
+
+
+def _column(table, layout, field, n):
+    name = layout.source.get(field)
+    target = SCHEMA.field(field).type
+    if name is None:
+        return pa.nulls(n, target)
+    return pc.cast(table[name], target, safe=False)
+
+
+def normalize(table, layout, local_tz, prev_local=None):
+    """Parsed CSV block -> (SCHEMA table, last local time)."""
+    stamps = table[layout.source["time"]]
+    if pa.types.is_string(stamps.type):
+        # Block with torn rows (power loss mid-write): drop unreadable times
+        stamps = pc.strptime(stamps, format=TIME_FORMAT, unit="s", error_is_null=True)
+    valid = pc.is_valid(stamps)
+    table, stamps = table.filter(valid), stamps.filter(valid)
+    n = table.num_rows
+    time, prev_local = _to_utc(stamps, layout, local_tz, prev_local)
+
+    hat = _column(table, layout, "hat", n)
+    channel = _column(table, layout, "channel", n)
+    ch_text = pc.cast(channel, pa.string())
+    if "hat" in layout.source:
+        sensor = pc.binary_join_element_wise("h", pc.cast(hat, pa.string()), "c", ch_text, "")
+    else:
+        hat = pc.fill_null(hat, 0)
+        sensor = pc.binary_join_element_wise("ch_", ch_text, "")
+    raw = _column(table, layout, "raw_temp", n)
+    corr = _column(table, layout, "corr_temp", n)
+
+    columns = {
+        "time": time, "sensor": sensor, "hat": hat, "channel": channel,
+        "raw_temp": raw, "corr_temp": corr, "correction": pc.subtract(corr, raw),
+    }
+    arrays = [columns[f] if f in columns else _column(table, layout, f, n) for f in SCHEMA.names]
+    return pa.Table.from_arrays(arrays, schema=SCHEMA), prev_local
+
+
+def _write_part(table, directory, name):
+    directory.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    os.close(fd)
+    try:
+        pq.write_table(table, tmp, compression="zstd")
+        os.replace(tmp, directory / name)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def ingest_file(root, unit, path, file_id, header, start, prev_local, local_tz, block_bytes):
+    """
+    Parse path from byte `start` and write its Parquet parts. Returns the
+    new state for the file (offset, rows, skipped, last_local, parts).
+    """
+    layout = Layout(header)
+    skipped = 0
+
+    def bad_row(row):
+        nonlocal skipped
+        skipped += 1
+        return "skip"
+
+    read = pacsv.ReadOptions(column_names=layout.columns)
+    parse = pacsv.ParseOptions(invalid_row_handler=bad_row)
+    # Times parse natively (ISO 8601); a block with a torn time is re-read as text
+    fast = pacsv.ConvertOptions(column_types={layout.source["time"]: pa.timestamp("s")})
+    lenient = pacsv.ConvertOptions(column_types={layout.source["time"]: pa.string()})
+
+    rows = parts = 0
+    offset = start
+    for offset, data in _blocks(path, start, block_bytes):
+        try:
+            parsed = pacsv.read_csv(pa.BufferReader(data), read, parse, fast)
+        except pa.ArrowInvalid:
+            parsed = pacsv.read_csv(pa.BufferReader(data), read, parse, lenient)
+        table, prev_local = normalize(parsed, layout, local_tz, prev_local)
+        skipped += parsed.num_rows - table.num_rows
+        months = table["time"].to_numpy().astype("datetime64[M]")
+        for month in np.unique(months):
+            part = table.filter(pa.array(months == month))
+            directory = Path(root) / f"unit={unit}" / f"month={month.astype(str)}"
+            _write_part(part, directory, f"{file_id}-{offset:012d}.parquet")
+            parts += 1
+        rows += table.num_rows
+        offset += len(data)
+    return {"offset": offset, "rows": rows, "skipped": skipped, "last_local": prev_local,
+            "parts": parts}
+
+
+# ------------------------------------------------------
+# Incremental runs
+# ------------------------------------------------------
+def load_state(root):
+    path = Path(root) / STATE_FILE
+    if not path.is_file():
+        return {"files": {}}
+    return json.loads(path.read_text())
+
+
+def save_state(root, state):
+    path = Path(root) / STATE_FILE
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(state, indent=1, sort_keys=True))
+    os.replace(tmp, path)
+
+
+def ingest(root, specs, local_tz=LOCAL_TZ, workers=None, block_mb=BLOCK_MB, log=print):
+    """Bring the dataset at root up to date with the sources; returns rows added."""
+    _require_arrow()
+    root = Path(root).expanduser()
+    root.mkdir(parents=True, exist_ok=True)
+    state = load_state(root)
+    known = state["files"]
+
+    jobs, versions = {}, {}
+    for unit, path, header, first, data_start in find_sources(specs):
+        file_id = fingerprint(unit, header, first)
+        applied = applied_offsets(path)
+        offsets = applied["sha1"] if applied else None
+        entry = known.get(file_id)
+        if entry is not None and entry.get("offsets") != offsets:
+            for part in root.glob(f"unit=*/month=*/{file_id}-*.parquet"):
+                part.unlink()
+            del known[file_id]
+            entry = None
+            log(f"{path.name}: offsets changed, ingesting it again")
+        start = entry["offset"] if entry else data_start
+        size = path.stat().st_size
+        if size < start:
+            log(f"Skipping {path}: shorter than the {start} bytes already ingested")
+            continue
+        if size == start:
+            continue
+        prev_local = entry.get("last_local") if entry else None
+        # The same file found twice (or a copy of it): ingest the longest once
+        if file_id not in jobs or size > jobs[file_id][1].stat().st_size:
+            jobs[file_id] = (unit, path, file_id, header, start, prev_local)
+            versions[file_id] = offsets
+
+    if not jobs:
+        log("Dataset is up to date")
+        return 0
+
+    block_bytes = int(block_mb * 1024 * 1024)
+    added = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            (job, pool.submit(ingest_file, str(root), *job, local_tz, block_bytes))
+            for job in jobs.values()
+        ]
+        for (unit, path, file_id, header, start, _), future in futures:
+            result = future.result()
+            entry = known.setdefault(file_id, {"unit": unit, "rows": 0, "skipped": 0})
+            entry.update(
+                path=str(path), offset=result["offset"], last_local=result["last_local"],
+                offsets=versions[file_id],
+                rows=entry["rows"] + result["rows"], skipped=entry["skipped"] + result["skipped"],
+                ingested=f"{datetime.utcnow():{TIME_FORMAT}}",
+            )
+            added += result["rows"]
+            note = f", {result['skipped']} malformed rows skipped" if result["skipped"] else ""
+            log(f"{unit}: {result['rows']} rows from {path.name} in {result['parts']} parts{note}")
+            save_state(root, state)
+    return added
+
+
+# ------------------------------------------------------
+# Reading back
+# ------------------------------------------------------
+def dataset(root):
+    """The Parquet dataset, with unit and month as partition columns."""
+    _require_arrow()
+    return ds.dataset(
+        Path(root).expanduser(), format="parquet", partitioning=PARTITIONING,
+        exclude_invalid_files=True,
+    )
+
+
+def load(root, columns=None, units=None, start=None, end=None):
+    """
+    Table of `columns` for `units` with start <= time < end (UTC, text
+    like '2026-01-10' or datetimes). Only matching months' files are read.
+    """
+    data = dataset(root)
+    expr = None
+
+    def both(a, b):
+        return b if a is None else a & b
+
+    if units:
+        expr = both(expr, ds.field("unit").isin(list(units)))
+    if start is not None:
+        start = _utc(start)
+        expr = both(expr, (ds.field("month") >= f"{start:%Y-%m}") & (ds.field("time") >= _ts(start)))
+    if end is not None:
+        end = _utc(end)
+        expr = both(expr, (ds.field("month") <= f"{end:%Y-%m}") & (ds.field("time") < _ts(end)))
+    return data.to_table(columns=columns, filter=expr)
+
+
+def _utc(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _ts(value):
+    return pa.scalar(value, type=pa.timestamp("s", tz="UTC"))
+
+
+# ------------------------------------------------------
+# Command line
+# ------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Merge tower and mobile-unit logger CSVs into a partitioned Parquet dataset."
+    )
+    parser.add_argument("dataset", type=Path, help="dataset directory (created if missing)")
+    parser.add_argument("sources", nargs="+",
+                        help="data files or directories, optionally as UNIT=path")
+    parser.add_argument("--local-tz", default=LOCAL_TZ,
+                        help=f"time zone of the mobile units' clocks (default {LOCAL_TZ})")
+    parser.add_argument("--workers", type=int, help="parallel processes (default: one per CPU)")
+    parser.add_argument("--block-mb", type=float, default=BLOCK_MB,
+                        help=f"MB of CSV parsed at a time per process (default {BLOCK_MB})")
+    args = parser.parse_args(argv)
+
+    try:
+        added = ingest(args.dataset, args.sources, args.local_tz, args.workers, args.block_mb)
+    except (ImportError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"{added} rows added to {args.dataset}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+# Shared-memory live snapshot of the latest logger scan
+
+'''
+Lets field checks see what the logger sees without touching the bus.
+
+rtd_run.py used to read the hats directly, so running it while the
+logger was active interleaved its I2C traffic with the logger's scan.
+Now the logger publishes every complete scan to a small mmap'd file in
+/dev/shm (RAM, never the SD card), and rtd_run.py copies it out in
+microseconds. Only when no live logger is publishing does it fall back
+to reading the hardware.
+
+There's one writer and any number of readers, and no locks. The
+segment is a seqlock:
+
+    writer  seq += 1 (odd)  ->  copy values  ->  seq += 1 (even)
+    reader  read seq, copy values, read seq again; retry if the two
+            differ or are odd (a write was in progress)
+
+Segment layout (one NumPy record, native byte order):
+
+    magic     8 bytes   b"RTDLIVE1"
+    seq       uint64    even = stable, odd = being written
+    pid       uint32    publishing process
+    n         uint32    number of sensors
+    started   float64   scan start (epoch s)
+    duration  float64   scan duration (s)
+    hat, ch   uint8[n]  sensor order
+    resi      float64[n]
+    temp      float64[n]
+    read_time float64[n]  epoch s of each read
+    bad       uint8[n]    1 = read failed or skipped (circuit breaker open)
+
+The segment lives in $RTD_LIVE_DIR if set, else /dev/shm, else the
+system temp dir.
+'''
+
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from scanner import Snapshot
+
+MAGIC = b"RTDLIVE1"
+
+
+def live_path(name):
+    base = os.environ.get("RTD_LIVE_DIR")
+    if base is None:
+        base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return Path(base) / f"rtd_live_{name}"
+
+
+def segment_dtype(n_sensors):
+    return np.dtype([
+        ("magic", "S8"),
+        ("seq", "u8"),
+        ("pid", "u4"),
+        ("n", "u4"),
+        ("started", "f8"),
+        ("duration", "f8"),
+        ("hat", "u1", (n_sensors,)),
+        ("ch", "u1", (n_sensors,)),
+        ("resi", "f8", (n_sensors,)),
+        ("temp", "f8", (n_sensors,)),
+        ("read_time", "f8", (n_sensors,)),
+        ("bad", "u1", (n_sensors,)),
+    ], align=True)
+
+
+class LivePublisher:
+    """
+    Writer side, one per logger.
+
+    name    - segment name, e.g. 'tower' or 'mobile'
+    sensors - list of (hat, ch) in snapshot order
+    """
+
+    def __init__(self, name, sensors):
+        self.path = live_path(name)
+        self.sensors = list(sensors)
+        dtype = segment_dtype(len(self.sensors))
+
+        # Build the segment under a temp name, then rename it into place,
+        # so a reader never maps a half-initialized file
+        tmp = self.path.with_name(self.path.name + f".{os.getpid()}")
+        with tmp.open("wb") as f:
+            f.truncate(dtype.itemsize)
+        self._seg = np.memmap(tmp, dtype=dtype, mode="r+", shape=(1,))
+        seg = self._seg[0]
+        seg["n"] = len(self.sensors)
+        seg["pid"] = os.getpid()
+        seg["hat"] = [hat for hat, ch in self.sensors]
+        seg["ch"] = [ch for hat, ch in self.sensors]
+        seg["magic"] = MAGIC
+        os.replace(tmp, self.path)
+
+    def publish(self, snap):
+        """Copy a scanner.Snapshot into the segment."""
+        seg = self._seg[0]
+        seq = int(seg["seq"])
+        seg["seq"] = seq + 1
+        seg["started"] = snap.started
+        seg["duration"] = snap.duration
+        seg["resi"] = snap.resi
+        seg["temp"] = snap.temp
+        seg["read_time"] = snap.read_time
+        bad = np.zeros(len(self.sensors), dtype=np.uint8)
+        bad[snap.bad] = 1
+        seg["bad"] = bad
+        seg["seq"] = seq + 2
+
+    def close(self):
+        """Remove the segment so readers fall back to the hardware."""
+        del self._seg
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class LiveReader:
+    """
+    Reader side.
+
+    read() returns (seq, Snapshot) for the latest published scan, or
+    None when no live logger is publishing one: no segment, publisher
+    gone, nothing published yet, or the scan is older than max_age s.
+    """
+
+    def __init__(self, name, max_age=90.0, retries=100):
+        self.path = live_path(name)
+        self.max_age = max_age
+        self.retries = retries
+        self._seg = None
+        self.sensors = []
+
+    def _open(self):
+        if self._seg is not None:
+            return True
+        try:
+            with self.path.open("rb") as f:
+                head = np.fromfile(f, dtype=segment_dtype(0), count=1)
+        except FileNotFoundError:
+            return False
+        if len(head) == 0 or head[0]["magic"] != MAGIC:
+            return False
+        dtype = segment_dtype(int(head[0]["n"]))
+        self._seg = np.memmap(self.path, dtype=dtype, mode="r", shape=(1,))
+        seg = self._seg[0]
+        self.sensors = list(zip(seg["hat"].tolist(), seg["ch"].tolist()))
+        return True
+
+    def _publisher_alive(self):
+        pid = int(self._seg[0]["pid"])
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass    # exists, owned by another user
+        return True
+
+    def read(self):
+        if not self._open():
+            return None
+        seg = self._seg[0]
+        for _ in range(self.retries):
+            seq = int(seg["seq"])
+            if seq % 2:
+                time.sleep(0.0001)
+                continue
+            copy = seg.copy()
+            if int(seg["seq"]) == seq:
+                break
+        else:
+            return None
+
+        if seq == 0 or not self._publisher_alive():
+            return None
+        if self.max_age is not None and time.time() - copy["started"] > self.max_age:
+            return None
+
+        snap = Snapshot(len(self.sensors))
+        snap.started = float(copy["started"])
+        snap.duration = float(copy["duration"])
+        snap.resi = copy["resi"].tolist()
+        snap.temp = copy["temp"].tolist()
+        snap.read_time = copy["read_time"].tolist()
+        snap.errors = {int(i): "read failed in logger" for i in np.flatnonzero(copy["bad"])}
+        return seq, snap
+
+    def close(self):
+        self._seg = None
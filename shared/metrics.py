@@ -0,0 +1,284 @@
+# Hot-path metrics for the RTD loggers
+
+'''
+Counters, gauges and fixed-bucket histograms, exported to a small file
+that a local scraper can pick up.
+
+Until now the only window into the loggers was free-text lines in the
+log file. Metrics keeps numbers instead: how long each sensor's librtd
+calls take, how long a scan takes, how late the scheduler woke up, and
+how long and how much the file writes cost.
+
+Recording is cheap enough to leave on: a histogram is a preallocated
+count array per series, observe() is one bisect, and observe_scan()
+bins a whole scan (one value per sensor) in a single np.searchsorted.
+Nothing touches the disk until export(), which the loggers call once
+per window.
+
+export() writes the file atomically (temp file + rename), in
+
+    Prometheus text format   path ends in .prom - drop it in node
+                             exporter's textfile collector directory
+    compact JSON             path ends in .json
+
+Metric names get the rtd_ prefix; histogram series carry labels, e.g.
+
+    rtd_read_seconds_bucket{sensor="h0c1",le="0.005"} 118
+'''
+
+import json
+import math
+import os
+import tempfile
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+import numpy as np
+
+# Bus calls are ~1-20 ms, scans up to seconds; wake-ups and fsyncs
+# are usually quick but can stall for seconds on a busy SD card
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+STALL_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+
+def metrics_path(name, fmt="prom"):
+    """
+    Default export file: $RTD_METRICS_DIR (e.g. node exporter's textfile
+    directory), else /dev/shm, so exports never touch the SD card.
+    """
+    base = os.environ.get("RTD_METRICS_DIR")
+    if base is None:
+        base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return Path(base) / f"rtd_{name}.{fmt}"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+def _number(value):
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """
+    Monotonic total (events, bytes, seconds).
+
+    series - list of label dicts, one per series (None -> one unlabelled series)
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, help, series=None):
+        self.name = name
+        self.help = help
+        self.series = list(series) if series else [{}]
+        self.values = np.zeros(len(self.series))
+
+    def inc(self, amount=1, series=0):
+        self.values[series] += amount
+
+    def inc_many(self, series):
+        """Add 1 to each listed series (e.g. the sensors that failed a scan)."""
+        self.values[list(series)] += 1
+
+    def prom_lines(self):
+        return [
+            f"{self.name}{_labels(labels)} {_number(value)}"
+            for labels, value in zip(self.series, self.values)
+        ]
+
+    def as_json(self):
+        if self.series == [{}]:
+            return float(self.values[0])
+        return [{"labels": labels, "value": float(value)}
+                for labels, value in zip(self.series, self.values)]
+
+
+class Gauge(Counter):
+    """Value that goes up and down (last seen)."""
+
+    kind = "gauge"
+
+    def set(self, value, series=0):
+        self.values[series] = value
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with one or more labelled series.
+
+    buckets - upper bounds in increasing order (+Inf is implicit)
+    series  - list of label dicts, one per series (None -> one unlabelled series)
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets, series=None):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.series = list(series) if series else [{}]
+        self._bounds = np.array(self.buckets)
+        # Per-bucket (not cumulative) counts; last column is > buckets[-1]
+        self.counts = np.zeros((len(self.series), len(self.buckets) + 1), dtype=np.int64)
+        self.sum = np.zeros(len(self.series))
+
+    def observe(self, value, series=0):
+        """Record one value (NaN is ignored)."""
+        if value != value:
+            return
+        self.counts[series, bisect_left(self.buckets, value)] += 1
+        self.sum[series] += value
+
+    def observe_scan(self, values):
+        """Record one value per series in one vector op (NaN is ignored)."""
+        values = np.asarray(values, dtype=float)
+        valid = np.flatnonzero(np.isfinite(values))
+        if len(valid) == 0:
+            return
+        slot = np.searchsorted(self._bounds, values[valid], side="left")
+        self.counts[valid, slot] += 1
+        self.sum[valid] += values[valid]
+
+    def prom_lines(self):
+        lines = []
+        bounds = [_number(b) for b in self.buckets] + ["+Inf"]
+        for labels, counts, total in zip(self.series, self.counts, self.sum):
+            cumulative = np.cumsum(counts)
+            for le, count in zip(bounds, cumulative):
+                lines.append(f"{self.name}_bucket{_labels(dict(labels, le=le))} {int(count)}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(labels)} {int(cumulative[-1])}")
+        return lines
+
+    def as_json(self):
+        return {
+            "le": list(self.buckets),
+            "series": [
+                {"labels": labels, "counts": np.cumsum(counts).tolist(), "sum": float(total)}
+                for labels, counts, total in zip(self.series, self.counts, self.sum)
+            ],
+        }
+
+
+class Metrics:
+    """
+    Registry for one logger, written to one file.
+
+    path   - export file; the suffix picks the format (.prom or .json)
+    prefix - prepended to every metric name
+    """
+
+    def __init__(self, path, prefix="rtd_"):
+        self.path = Path(path)
+        self.format = "json" if self.path.suffix == ".json" else "prom"
+        self.prefix = prefix
+        self._metrics = {}
+        self.export_seconds = self.gauge("metrics_export_seconds", "Time spent in the last export.")
+
+    def _add(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, series=None):
+        return self._add(Counter(self.prefix + name, help, series))
+
+    def gauge(self, name, help, series=None):
+        return self._add(Gauge(self.prefix + name, help, series))
+
+    def histogram(self, name, help, buckets, series=None):
+        return self._add(Histogram(self.prefix + name, help, buckets, series))
+
+    # --------------------------------------------------
+    # Export
+    # --------------------------------------------------
+    def render(self):
+        if self.format == "json":
+            payload = {"updated": round(time.time(), 3)}
+            payload.update((m.name, m.as_json()) for m in self._metrics.values())
+            return json.dumps(payload, separators=(",", ":")) + "\n"
+        lines = []
+        for m in self._metrics.values():
+            lines.append(f"# HELP {m.name} {m.help}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            lines.extend(m.prom_lines())
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        """Atomically replace the metrics file with the current values."""
+        t0 = time.perf_counter()
+        tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        tmp.write_text(self.render())
+        os.replace(tmp, self.path)
+        self.export_seconds.set(time.perf_counter() - t0)
+
+
+class LoggerMetrics:
+    """
+    The standard set for a scan-per-tick logger.
+
+    path    - export file (.prom or .json)
+    sensors - one label per sensor, in scan order (e.g. 'h0c1', 'ch_1')
+
+        metrics.record_tick(tick)             scheduler lateness / skips
+        metrics.record_scan(snap)             per-sensor latency, scan time, errors
+        metrics.record_write(seconds, bytes)  one commit to the journal / files
+        metrics.export()
+    """
+
+    def __init__(self, path, sensors):
+        self.registry = Metrics(path)
+        r = self.registry
+        self.read_seconds = r.histogram(
+            "read_seconds", "librtd getRes()/get() time per sensor read.",
+            LATENCY_BUCKETS, [{"sensor": s} for s in sensors])
+        self.read_errors = r.counter(
+            "read_errors_total", "Failed sensor reads.", [{"sensor": s} for s in sensors])
+        self.scan_seconds = r.histogram(
+            "scan_seconds", "Duration of one full scan.", DURATION_BUCKETS)
+        self.scan_skew = r.gauge(
+            "scan_skew_seconds", "First-to-last read spread of the latest scan.")
+        self.faulted = r.gauge(
+            "sensors_skipped", "Sensors not read in the latest scan (breaker open or not due).")
+        self.lateness = r.histogram(
+            "tick_lateness_seconds", "How late the scheduler woke for a tick.", STALL_BUCKETS)
+        self.skipped = r.counter("ticks_skipped_total", "Ticks skipped after an overrun.")
+        self.write_seconds = r.histogram(
+            "write_seconds", "Time to commit one window (journal, and files when due).",
+            STALL_BUCKETS)
+        self.bytes_written = r.counter(
+            "write_bytes_total", "Bytes written to the journal and data files.")
+        self.started = r.gauge("start_time_seconds", "Epoch time the logger started.")
+        self.started.set(round(time.time(), 3))
+
+    def record_tick(self, tick):
+        if tick.skipped:
+            self.skipped.inc()
+        else:
+            self.lateness.observe(tick.lateness)
+
+    def record_scan(self, snap):
+        self.read_seconds.observe_scan(snap.latency)
+        if snap.errors:
+            self.read_errors.inc_many(snap.errors)
+        self.scan_seconds.observe(snap.duration)
+        self.scan_skew.set(snap.skew)
+        self.faulted.set(len(snap.skipped))
+
+    def record_write(self, seconds, nbytes):
+        self.write_seconds.observe(seconds)
+        self.bytes_written.inc(nbytes)
+
+    def export(self):
+        self.registry.export()
@@ -0,0 +1,180 @@
+# Live sensor monitor for rtd_run.py
+
+'''
+watch-style hat/channel table for field checks.
+
+The old fixed rtd_run.py imported pandas to print 32 numbers, which took
+most of its runtime on a Pi. This module prints the table with plain
+f-strings, and pulls in only what the chosen source needs:
+
+    live - the latest scan a running logger published to /dev/shm
+           (shared/live_snapshot.py); no bus traffic at all
+    hw   - scan the hats directly (shared/scanner.py), used when no
+           logger is publishing, or when asked for with --source hw
+
+Each refresh shows the source, scan latency and age. Sensors are
+highlighted when they are
+
+    FAIL  - the last read raised, or returned NaN        (red)
+    STALE - the value is older than --stale seconds      (yellow)
+
+Usage (through the rtd_run.py scripts):
+
+    python rtd_run.py                  one table, then exit
+    python rtd_run.py --watch 2        refresh every 2 s until Ctrl-C
+    python rtd_run.py --source hw      ignore the logger, read the hats
+'''
+
+import argparse
+import sys
+import time
+
+RED = "\033[31m"
+YELLOW = "\033[33m"
+DIM = "\033[2m"
+RESET = "\033[0m"
+CLEAR = "\033[H\033[2J"
+
+
+class Monitor:
+    """
+    name     - live segment name ('tower' or 'mobile')
+    sensors  - list of dicts, in display order, with
+                 hat, ch     - librtd address
+                 offset      - added to the raw temperature
+                 height_cm   - optional, shown when present
+    source   - 'auto', 'live' or 'hw'
+    stale_after - seconds after which a reading is flagged STALE
+    """
+
+    def __init__(self, name, sensors, source="auto", stale_after=90.0, color=True):
+        self.name = name
+        self.sensors = list(sensors)
+        self.source = source
+        self.stale_after = stale_after
+        self.color = color
+        self._live = None
+        self._scanner = None
+
+    # --------------------------------------------------
+    # Sources
+    # --------------------------------------------------
+    def _read_live(self):
+        if self._live is None:
+            from live_snapshot import LiveReader
+            self._live = LiveReader(self.name, max_age=self.stale_after)
+        latest = self._live.read()
+        if latest is None:
+            return None
+        seq, snap = latest
+        index = {sensor: k for k, sensor in enumerate(self._live.sensors)}
+        return f"live scan #{seq // 2}", snap, index
+
+    def _read_hw(self):
+        if self._scanner is None:
+            from rtd_backend import get_backend
+            from scanner import Scanner
+            self._scanner = Scanner(get_backend(), [(s["hat"], s["ch"]) for s in self.sensors])
+        snap = self._scanner.scan()
+        index = {(s["hat"], s["ch"]): k for k, s in enumerate(self.sensors)}
+        return f"hardware ({self._scanner.backend.name})", snap, index
+
+    def sample(self):
+        """(source label, Snapshot, {(hat, ch): index in snapshot})."""
+        if self.source in ("auto", "live"):
+            result = self._read_live()
+            if result is not None:
+                return result
+            if self.source == "live":
+                raise RuntimeError(f"No live '{self.name}' logger is publishing")
+        return self._read_hw()
+
+    # --------------------------------------------------
+    # Rendering
+    # --------------------------------------------------
+    def _paint(self, text, code):
+        return f"{code}{text}{RESET}" if self.color and code else text
+
+    def render(self, source, snap, index, now=None):
+        now = time.time() if now is None else now
+        show_height = any("height_cm" in s for s in self.sensors)
+        lines = [
+            f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now))}  {source}: "
+            f"scan {snap.duration * 1000:.0f} ms, skew {snap.skew * 1000:.0f} ms, "
+            f"{now - snap.started:.0f} s old"
+        ]
+        failing = stale = 0
+        hat = None
+        for s in self.sensors:
+            if s["hat"] != hat:
+                hat = s["hat"]
+                lines.append(f"\nHat_{hat + 1}:")
+                head = f"{'Ch.':<6}" + (f"{'Height':<8}" if show_height else "")
+                head += f"{'Resi':<12}{'Raw_Temp':<12}{'Corr_Temp':<12}{'Age':<8}"
+                lines.append(head)
+                lines.append("-" * len(head))
+
+            k = index.get((s["hat"], s["ch"]))
+            resi = snap.resi[k] if k is not None else float("nan")
+            temp = snap.temp[k] if k is not None else float("nan")
+            read_time = snap.read_time[k] if k is not None else float("nan")
+            age = now - read_time
+
+            status, code = "", None
+            if k is None or k in snap.errors or temp != temp:
+                status, code = "FAIL", RED
+                failing += 1
+            elif age > self.stale_after:
+                status, code = "STALE", YELLOW
+                stale += 1
+
+            row = f"{s['ch']:<6}" + (f"{s.get('height_cm', ''):<8}" if show_height else "")
+            row += (f"{resi:<12.0f}{temp:<12.1f}{temp + s['offset']:<12.1f}"
+                    f"{age:<8.0f}{status}")
+            lines.append(self._paint(row, code))
+
+        summary = f"\n{len(self.sensors)} sensors, {failing} failing, {stale} stale"
+        lines.append(self._paint(summary, RED if failing else (YELLOW if stale else DIM)))
+        return "\n".join(lines)
+
+    # --------------------------------------------------
+    # Loop
+    # --------------------------------------------------
+    def run(self, interval=None, out=sys.stdout):
+        """Print once, or every interval seconds until interrupted."""
+        try:
+            while True:
+                t0 = time.monotonic()
+                table = self.render(*self.sample())
+                out.write((CLEAR if interval and self.color else "") + table + "\n")
+                out.flush()
+                if not interval:
+                    return
+                time.sleep(max(0.0, interval - (time.monotonic() - t0)))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if self._scanner is not None:
+                self._scanner.close()
+
+
+def run_cli(name, sensors, argv=None, description=None):
+    """Shared argument handling for the rtd_run.py scripts."""
+    parser = argparse.ArgumentParser(description=description or "Show live RTD readings.")
+    parser.add_argument("--watch", type=float, metavar="SECONDS",
+                        help="refresh every SECONDS until Ctrl-C")
+    parser.add_argument("--source", choices=("auto", "live", "hw"), default="auto",
+                        help="live logger snapshot, hardware, or live if available (default)")
+    parser.add_argument("--stale", type=float, default=90.0, metavar="SECONDS",
+                        help="flag readings older than this (default 90)")
+    parser.add_argument("--no-color", action="store_true", help="plain output")
+    args = parser.parse_args(argv)
+
+    monitor = Monitor(name, sensors, source=args.source, stale_after=args.stale,
+                      color=not args.no_color and sys.stdout.isatty())
+    try:
+        monitor.run(args.watch)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
@@ -0,0 +1,83 @@
+# Power accounting for battery-run RTD loggers
+
+'''
+Duty-cycle and battery estimates for the mobile units.
+
+On battery, what matters is how much of the time the Pi does work and
+how often it wakes the SD card. The scheduler already sleeps straight
+to each deadline on the monotonic clock (and counts the time slept in
+scheduler.slept); the batched-write side is BufferedWriter with its
+journal in RAM (see log_rtd_single.py, POWER_SAVE).
+
+DutyCycle turns those counters into a report between two points in
+time:
+
+    awake    fraction of wall time not spent waiting for a deadline
+    cpu      process CPU time / wall time
+    power    idle_w + (busy_w - idle_w) * cpu  - a rough model; measure
+             idle_w and busy_w for the unit once with a USB power meter
+    battery  battery_wh / power, in hours (if battery_wh is given)
+'''
+
+import os
+import time
+from pathlib import Path
+
+
+def ram_dir():
+    """/dev/shm when the system has it (RAM-backed), else None."""
+    return Path("/dev/shm") if os.path.isdir("/dev/shm") else None
+
+
+class DutyCycle:
+    """
+    scheduler  - SampleScheduler whose `slept` counter is read
+    idle_w     - watts drawn while idle
+    busy_w     - watts drawn with the CPU busy
+    battery_wh - usable battery capacity (None -> no runtime estimate)
+    """
+
+    def __init__(self, scheduler, idle_w=0.7, busy_w=1.5, battery_wh=None,
+                 clock=time.monotonic, cpu=time.process_time):
+        self.scheduler = scheduler
+        self.idle_w = idle_w
+        self.busy_w = busy_w
+        self.battery_wh = battery_wh
+        self.clock = clock
+        self.cpu = cpu
+        self._mark()
+
+    def _mark(self):
+        self._wall = self.clock()
+        self._cpu = self.cpu()
+        self._slept = self.scheduler.slept
+
+    def report(self):
+        """Figures since the last report() (or construction); starts a new period."""
+        wall = self.clock() - self._wall
+        if wall <= 0:
+            return None
+        slept = self.scheduler.slept - self._slept
+        cpu = self.cpu() - self._cpu
+        self._mark()
+
+        awake = min(max(1.0 - slept / wall, 0.0), 1.0)
+        cpu_frac = min(cpu / wall, 1.0)
+        watts = self.idle_w + (self.busy_w - self.idle_w) * cpu_frac
+        return {
+            "period_s": wall,
+            "awake": awake,
+            "cpu": cpu_frac,
+            "watts": watts,
+            "battery_h": self.battery_wh / watts if self.battery_wh else None,
+        }
+
+    @staticmethod
+    def format(figures):
+        text = (
+            f"awake {figures['awake']:.2%}, CPU {figures['cpu']:.2%} over "
+            f"{figures['period_s'] / 3600:.1f} h, est. {figures['watts']:.2f} W"
+        )
+        if figures["battery_h"] is not None:
+            text += f" (battery ~{figures['battery_h']:.0f} h)"
+        return text
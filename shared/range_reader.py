@@ -0,0 +1,298 @@
+# Time-indexed range reader for the RTD logger files
+
+'''
+Pull a time range out of a multi-month logger CSV without parsing it
+from the top.
+
+Each data file gets a sidecar index, <file>.idx, with one line per hour
+of data: the hour and the byte offset of its first row.
+
+    2026-01-10 13,1234567
+
+update_index() only scans the bytes appended since the last indexed
+hour, so the loggers call it after every flush to keep it current. A
+query bisects the index, seeks straight to the first hour it needs and
+streams rows until it passes the end of the range.
+
+Works for every logger CSV whose first column is a
+"YYYY-mm-dd HH:MM:SS" timestamp, in increasing order. Files archived by
+data_files.prepare_data_file after a header change (<stem>_<time>.csv)
+are read first, with their columns matched to the current header by
+name (blank where a column is new), so a season split by an upgrade
+still reads as one:
+
+    fixed  rtd_tower_data.csv       long, filter by Height_cm / Channel
+    fixed  rtd_tower_data_wide.csv  wide, keeps the <h>cm columns in range
+    mobile instrument_log.csv       long, filter by Channel
+
+Command line:
+
+    python shared/range_reader.py rtd_tower_data.csv \\
+        --start 2026-01-10 --end 2026-01-14 --heights 0-120
+
+The range is half-open: --start is included, --end is not. A date
+alone means its midnight, so the example above returns 10-13 January
+and none of the 14th.
+'''
+
+import argparse
+import bisect
+import re
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from data_files import archived_files, last_row_time
+
+HOUR_KEY = 13           # len("YYYY-mm-dd HH")
+TIMESTAMP = 19          # len("YYYY-mm-dd HH:MM:SS")
+INDEX_BLOCK = 4 * 1024 * 1024
+WIDE_COLUMN = re.compile(r"_(\d+)cm$")
+
+
+# ------------------------------------------------------
+# Index
+# ------------------------------------------------------
+def index_path(data_path):
+    data_path = Path(data_path)
+    return data_path.with_name(data_path.name + ".idx")
+
+
+def load_index(data_path):
+    """[(hour key, byte offset), ...] from the sidecar, oldest first."""
+    idx = index_path(data_path)
+    if not idx.is_file():
+        return []
+    entries = []
+    for line in idx.read_text().splitlines():
+        key, offset = line.rsplit(",", 1)
+        entries.append((key, int(offset)))
+    return entries
+
+
+def update_index(data_path):
+    """Index hours appended since the last update; returns entries added."""
+    data_path = Path(data_path)
+    idx = index_path(data_path)
+    entries = load_index(data_path)
+    size = data_path.stat().st_size
+
+    # File was replaced or rotated under us: start over
+    if entries and entries[-1][1] > size:
+        idx.unlink()
+        entries = []
+
+    start, last_key = (entries[-1][1], entries[-1][0]) if entries else (0, None)
+    new = []
+    with data_path.open("rb") as f:
+        f.seek(start)
+        if start == 0:
+            f.readline()    # header
+        pos, carry = f.tell(), b""
+        while True:
+            chunk = f.read(INDEX_BLOCK)
+            if not chunk:
+                break
+            data = carry + chunk
+            cut = data.rfind(b"\n") + 1     # a partial row is still being written
+            for key, offset in _hour_starts(data[:cut], last_key):
+                new.append((key, pos + offset))
+                last_key = key
+            pos += cut
+            carry = data[cut:]
+
+    if new:
+        with idx.open("a") as f:
+            f.writelines(f"{key},{offset}\n" for key, offset in new)
+    return len(new)
+
+
+def _hour_starts(data, last_key):
+    """(hour key, offset in data) of each row starting a new hour after last_key."""
+    if not data:
+        return []
+    buf = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(buf == 10)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    index = starts[:, None] + np.arange(HOUR_KEY)
+    keys = buf[np.minimum(index, len(buf) - 1)]
+    keys[index > ends[:, None]] = 0
+    # Data rows only (a timestamp starts with the year)
+    rows = np.flatnonzero(((keys[:, :4] >= 48) & (keys[:, :4] <= 57)).all(axis=1))
+    keys = keys[rows].view(f"S{HOUR_KEY}").ravel()
+    changed = np.ones(len(keys), dtype=bool)
+    changed[1:] = keys[1:] != keys[:-1]
+    if len(keys) and last_key is not None:
+        changed[0] = keys[0] != last_key.encode()
+    return [
+        (keys[i].decode(errors="replace"), int(starts[rows[i]]))
+        for i in np.flatnonzero(changed)
+    ]
+
+
+# ------------------------------------------------------
+# Column / row selection
+# ------------------------------------------------------
+class RowFilter:
+    """Keeps rows (long files) or columns (wide files) for heights / channels."""
+
+    def __init__(self, header, heights=None, channels=None):
+        self.columns = header.rstrip("\r\n").split(",")
+        self.heights = heights
+        self.channels = channels
+        self.row_tests = []
+        self.keep = None
+
+        if heights is not None and "Height_cm" in self.columns:
+            self.row_tests.append((self.columns.index("Height_cm"), heights))
+        if channels is not None and "Channel" in self.columns:
+            self.row_tests.append((self.columns.index("Channel"), channels))
+
+        wide = [i for i, name in enumerate(self.columns) if WIDE_COLUMN.search(name)]
+        if heights is not None and wide:
+            self.keep = [0] + [
+                i for i in wide
+                if _in_range(float(WIDE_COLUMN.search(self.columns[i]).group(1)), heights)
+            ]
+
+    def header(self):
+        return self._select(self.columns)
+
+    def apply(self, line):
+        """Filtered line, or None to drop the row."""
+        fields = line.rstrip("\r\n").split(",")
+        for col, bounds in self.row_tests:
+            try:
+                if not _in_range(float(fields[col]), bounds):
+                    return None
+            except (ValueError, IndexError):
+                return None
+        return self._select(fields)
+
+    def _select(self, fields):
+        if self.keep is not None:
+            fields = [fields[i] for i in self.keep if i < len(fields)]
+        return ",".join(fields) + "\n"
+
+
+def _in_range(value, bounds):
+    lo, hi = bounds
+    return lo <= value <= hi
+
+
+# ------------------------------------------------------
+# Queries
+# ------------------------------------------------------
+def normalize_time(text):
+    """'2026-01-10' or '2026-01-10 06:30' -> 'YYYY-mm-dd HH:MM:SS'."""
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S",
+                "%Y-%m-%dT%H:%M", "%Y-%m-%d %H", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(text, fmt).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized time '{text}'")
+
+
+def read_range(data_path, start=None, end=None, heights=None, channels=None, update=True):
+    """
+    Yield the (filtered) header, then every row with start <= time < end,
+    from data_path's archived files (see module docstring) and data_path.
+
+    start / end - anything normalize_time() accepts, or None for open ends;
+                  end is exclusive, and a date alone is its midnight, so
+                  end='2026-01-14' stops before any row of the 14th
+    heights     - (lo, hi) cm, inclusive
+    channels    - (lo, hi), inclusive
+    """
+    data_path = Path(data_path)
+    start = normalize_time(start) if start else None
+    end = normalize_time(end) if end else None
+
+    with data_path.open("rb") as f:
+        header = f.readline().decode()
+    row_filter = RowFilter(header, heights, channels)
+    yield row_filter.header()
+
+    columns = header.rstrip("\r\n").split(",")
+    for path in archived_files(data_path) + [data_path]:
+        if path != data_path and start:
+            last = last_row_time(path)
+            if last is None or f"{last:%Y-%m-%d %H:%M:%S}" < start:
+                continue
+        for line in _segment(path, columns, start, end, update):
+            if line is None:
+                return      # past the end of the range
+            out = row_filter.apply(line)
+            if out is not None:
+                yield out
+
+
+def _segment(path, columns, start, end, update):
+    """
+    Lines of one file from start, with its columns mapped onto columns;
+    a final None once a row at or after end is reached.
+    """
+    if update:
+        update_index(path)
+    with path.open("rb") as f:
+        own = f.readline().decode().rstrip("\r\n").split(",")
+        mapping = None
+        if own != columns:
+            mapping = [own.index(c) if c in own else None for c in columns]
+
+        if start:
+            entries = load_index(path)
+            keys = [key for key, _ in entries]
+            i = bisect.bisect_right(keys, start[:HOUR_KEY]) - 1
+            if i >= 0:
+                f.seek(entries[i][1])
+
+        for raw in f:
+            line = raw.decode()
+            stamp = line[:TIMESTAMP]
+            if start and stamp < start:
+                continue
+            if end and stamp >= end:
+                yield None
+                return
+            if mapping is not None:
+                fields = line.rstrip("\r\n").split(",")
+                line = ",".join(
+                    fields[i] if i is not None and i < len(fields) else "" for i in mapping
+                ) + "\n"
+            yield line
+
+
+# ------------------------------------------------------
+# Command line
+# ------------------------------------------------------
+def _parse_bounds(text):
+    lo, _, hi = text.partition("-")
+    return float(lo), float(hi or lo)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read a time range from an RTD logger CSV.")
+    parser.add_argument("data_file", type=Path)
+    parser.add_argument("--start", help="first time to include (inclusive), e.g. 2026-01-10")
+    parser.add_argument("--end", help="first time to exclude (exclusive: a date alone is its "
+                                      "midnight, so 2026-01-14 returns nothing from the 14th)")
+    parser.add_argument("--heights", type=_parse_bounds, help="height range in cm, e.g. 0-120")
+    parser.add_argument("--channels", type=_parse_bounds, help="channel range, e.g. 1-4")
+    parser.add_argument("--reindex", action="store_true", help="rebuild the index from scratch")
+    args = parser.parse_args(argv)
+
+    if args.reindex and index_path(args.data_file).is_file():
+        index_path(args.data_file).unlink()
+
+    out = sys.stdout
+    for line in read_range(args.data_file, args.start, args.end, args.heights, args.channels):
+        out.write(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
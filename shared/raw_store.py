@@ -0,0 +1,237 @@
+# Binary raw-sample store for the RTD loggers
+
+'''
+Append-only, fixed-record file holding every 30-sec scan.
+
+The CSVs only keep 5-min averages, with hat/channel/height/sensor
+number repeated as text on every row. The raw store keeps every scan
+at full resolution in fixed-size binary records, and reads back as a
+NumPy memmap, so slicing a season needs no parsing at all.
+
+File layout (little-endian):
+
+    b"RTDRAW01"                  8-byte magic
+    uint32 header_len            length of the JSON header in bytes
+    JSON header                  sensor layout + metadata, space padded
+                                 so records start on an 8-byte boundary
+    records...                   one per scan
+
+Each record is
+
+    epoch    float64             scan time (s, UTC epoch)
+    resi     float32[n]          resistance per sensor (ohms)
+    temp     float32[n]          temperature per sensor (degC)
+    quality  uint8[ceil(n/8)]    bitmask, bit i set = sensor i bad
+
+For the 32-sensor tower that is 268 bytes per scan (~0.77 MB/day,
+~140 MB for a 6-month season); for an 8-channel mobile unit 77 bytes
+(~0.22 MB/day, ~40 MB a season). The tower store is well over the "few
+tens of MB" a season was meant to take. Getting there would mean one
+2-byte value per sensor, and neither half of the record can go:
+resistance is what a recalibration starts from and needs float32 to
+keep the hat's resolution, and temperature is the hat's own conversion
+(READ_MODE 'both'), which the local CVD conversion (rtd_convert.py)
+only approximates with the per-sensor coefficients. Keep the store on
+the card's data partition, or set KEEP_RAW = False on the tower.
+
+A crash can leave a torn last record; the reader ignores it and the
+writer trims it before appending.
+
+Reopening a store only needs the same record layout - the sensors'
+hat / ch / key, in order. Other sensor metadata (height_cm,
+sensor_num, ...) follows sensor_offsets.json, so when only that changed
+the header is refreshed in place if the new one fits (new stores leave
+HEADER_SLACK spare bytes for that), and otherwise kept as it was. A store with a different layout is renamed to
+<stem>_<UTC time><suffix>, the way data_files.prepare_data_file
+archives CSVs, and a new one is started.
+
+Records are buffered in RAM and written out on flush() by default.
+With flush_each=True every record is handed to the OS as it is appended
+(no fsync), so a logger that crashes or is restarted still finds the
+scans of the window in progress for restart recovery
+(shared/recovery.py); the loggers fsync once per window on top of that.
+
+write_store() writes a whole file of already packed records at once
+(atomically) - burst-capture event files use the same layout.
+'''
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+MAGIC = b"RTDRAW01"
+HEADER_SLACK = 512      # spare header bytes, so edited sensor metadata still fits
+
+
+def record_dtype(n_sensors):
+    return np.dtype([
+        ("epoch", "<f8"),
+        ("resi", "<f4", (n_sensors,)),
+        ("temp", "<f4", (n_sensors,)),
+        ("quality", "u1", ((n_sensors + 7) // 8,)),
+    ])
+
+
+def _encode_header(header, length=None, slack=0):
+    """Encoded header; padded to exactly length bytes of JSON if given (None if it won't fit)."""
+    body = json.dumps(header, sort_keys=True).encode()
+    if length is None:
+        length = len(body) + slack
+        length += -(len(MAGIC) + 4 + length) % 8
+    elif len(body) > length:
+        return None
+    body += b" " * (length - len(body))
+    return MAGIC + len(body).to_bytes(4, "little") + body
+
+
+def record_layout(sensors):
+    """What shapes a record: (hat, ch, key) per sensor, in order."""
+    return [(s.get("hat"), s.get("ch"), s.get("key")) for s in sensors]
+
+
+def read_header(path):
+    """Return (header dict, byte offset of the first record)."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an RTD raw store")
+        length = int.from_bytes(f.read(4), "little")
+        header = json.loads(f.read(length))
+    return header, len(MAGIC) + 4 + length
+
+
+def fill_record(rec, epoch, resi, temp, bad=()):
+    """Pack one scan into a record; bad is an iterable of sensor indices to flag."""
+    rec["epoch"] = epoch
+    rec["resi"] = resi
+    rec["temp"] = temp
+    flags = np.zeros(len(rec["temp"]), dtype=bool)
+    flags[list(bad)] = True
+    flags |= ~np.isfinite(rec["temp"])
+    rec["quality"] = np.packbits(flags, bitorder="little")
+
+
+def write_store(path, sensors, records, meta=None):
+    """Write a complete store (header + records) to path via a temp file and rename."""
+    path = Path(path)
+    header = {"version": 1, "sensors": list(sensors), **(meta or {})}
+    tmp = path.with_name(f".{path.name}.tmp")
+    with tmp.open("wb") as f:
+        f.write(_encode_header(header))
+        f.write(np.ascontiguousarray(records).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class RawStoreWriter:
+    """
+    Appends one record per scan.
+
+    sensors - list of dicts describing each sensor (hat, ch, key, ...),
+              stored in the header; an existing file with another
+              record layout is archived (see self.archived)
+    meta    - extra header fields (site, interval_s, ...)
+    buffer_size - bytes held in RAM between flush() calls
+    flush_each  - hand every record to the OS as it is appended
+                  (a write, not an fsync)
+    """
+
+    def __init__(self, path, sensors, meta=None, buffer_size=64 * 1024, flush_each=False):
+        self.path = Path(path)
+        self.flush_each = flush_each
+        self.sensors = list(sensors)
+        self.n = len(self.sensors)
+        self.dtype = record_dtype(self.n)
+        self._record = np.zeros(1, dtype=self.dtype)
+        self.archived = None
+
+        header = None
+        if self.path.is_file() and self.path.stat().st_size > 0:
+            try:
+                header, self.data_offset = read_header(self.path)
+            except (ValueError, UnicodeDecodeError):
+                header = None
+            if header is None or record_layout(header["sensors"]) != record_layout(self.sensors):
+                self.archived = self.path.with_name(
+                    f"{self.path.stem}_{datetime.utcnow():%Y%m%d%H%M%S}{self.path.suffix}"
+                )
+                self.path.rename(self.archived)
+                header = None
+        if header is not None:
+            if header["sensors"] != self.sensors:
+                self._refresh_header(header)
+            self._trim_torn_record()
+        else:
+            header = {"version": 1, "sensors": self.sensors, **(meta or {})}
+            encoded = _encode_header(header, slack=HEADER_SLACK)
+            self.data_offset = len(encoded)
+            with self.path.open("wb") as f:
+                f.write(encoded)
+        self.header = header
+        self._f = self.path.open("ab", buffering=buffer_size)
+
+    def _refresh_header(self, header):
+        """Take the current sensor metadata, in place, if it fits the old header."""
+        updated = dict(header, sensors=self.sensors)
+        encoded = _encode_header(updated, self.data_offset - len(MAGIC) - 4)
+        if encoded is None:
+            return
+        with self.path.open("r+b") as f:
+            f.write(encoded)
+        header.update(updated)
+
+    def _trim_torn_record(self):
+        extra = (self.path.stat().st_size - self.data_offset) % self.dtype.itemsize
+        if extra:
+            with self.path.open("r+b") as f:
+                f.truncate(self.path.stat().st_size - extra)
+
+    def append(self, epoch, resi, temp, bad=()):
+        """Write one scan; bad is an iterable of sensor indices to flag."""
+        fill_record(self._record[0], epoch, resi, temp, bad)
+        self._f.write(self._record.tobytes())
+        if self.flush_each:
+            self._f.flush()
+
+    def flush(self, sync=False):
+        self._f.flush()
+        if sync:
+            os.fsync(self._f.fileno())
+
+    def close(self):
+        self._f.close()
+
+
+class RawStoreReader:
+    """Memory-mapped, read-only view of a raw store."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.header, offset = read_header(self.path)
+        self.sensors = self.header["sensors"]
+        self.dtype = record_dtype(len(self.sensors))
+        n_records = (self.path.stat().st_size - offset) // self.dtype.itemsize
+        if n_records:
+            self.records = np.memmap(self.path, dtype=self.dtype, mode="r",
+                                     offset=offset, shape=(n_records,))
+        else:
+            self.records = np.zeros(0, dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.records)
+
+    def slice(self, start=None, end=None):
+        """Records with start <= epoch < end (epochs must be increasing)."""
+        epoch = self.records["epoch"]
+        lo = 0 if start is None else np.searchsorted(epoch, start, side="left")
+        hi = len(epoch) if end is None else np.searchsorted(epoch, end, side="left")
+        return self.records[lo:hi]
+
+    def bad(self, records=None):
+        """Boolean (n_records, n_sensors) array of flagged samples."""
+        records = self.records if records is None else records
+        bits = np.unpackbits(records["quality"], axis=1, bitorder="little")
+        return bits[:, :len(self.sensors)].astype(bool)
@@ -0,0 +1,116 @@
+# Startup readiness probe for the RTD loggers
+
+'''
+Starts logging as soon as the hardware and the card are usable, instead
+of after a fixed delay.
+
+start_log_rtd.sh used to "sleep 60" before launching the logger, so
+every reboot lost at least a minute on top of the wait for the next
+window. wait_ready() instead polls, with a short exponential backoff:
+
+    filesystem  every directory the logger writes to exists and is
+                writable (the SD card / USB stick is mounted)
+    RTD bus     on every hat, at least one channel answers getRes()
+
+and returns the moment both pass, or after `timeout` seconds anyway
+(the circuit breakers in shared/sensor_health.py deal with sensors
+that are still missing then).
+
+uptime() gives seconds since boot, so the loggers can report boot-to-
+ready and boot-to-first-sample times.
+'''
+
+import os
+import time
+
+
+def uptime():
+    """Seconds since the system booted (None where /proc/uptime is missing)."""
+    try:
+        with open("/proc/uptime") as f:
+            return float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ReadyReport:
+    """What wait_ready() found."""
+
+    def __init__(self, ready, waited, attempts, problems, boot_s):
+        self.ready = ready          # False -> timed out, starting anyway
+        self.waited = waited        # seconds spent probing
+        self.attempts = attempts
+        self.problems = problems    # last failed checks, if any
+        self.boot_s = boot_s        # uptime when probing finished
+
+    def message(self):
+        boot = f", {self.boot_s:.1f} s after boot" if self.boot_s is not None else ""
+        if self.ready:
+            return f"Hardware ready after {self.waited:.1f} s ({self.attempts} probes){boot}"
+        return (
+            f"Starting without full readiness after {self.waited:.1f} s "
+            f"({self.attempts} probes){boot}: {'; '.join(self.problems)}"
+        )
+
+
+def _check_dirs(dirs):
+    problems = []
+    for d in dirs:
+        if not os.path.isdir(d):
+            problems.append(f"{d} is missing")
+        elif not os.access(d, os.W_OK):
+            problems.append(f"{d} is not writable")
+    return problems
+
+
+def _check_bus(backend, sensors):
+    """One answering channel per hat is enough; dead probes are not a bus problem."""
+    problems = []
+    hats = {}
+    for hat, ch in sensors:
+        hats.setdefault(hat, []).append(ch)
+    for hat, channels in hats.items():
+        error = None
+        for ch in channels:
+            try:
+                backend.getRes(hat, ch)
+                break
+            except Exception as e:
+                error = e
+        else:
+            problems.append(f"hat {hat} not answering ({error})")
+    return problems
+
+
+def wait_ready(make_backend, sensors, dirs=(), timeout=120, first_delay=0.1, max_delay=5.0,
+               clock=time.monotonic, sleep=time.sleep):
+    """
+    Probe until the backend answers and dirs are writable.
+
+    make_backend - callable returning the backend (retried if it raises,
+                   e.g. while the I2C driver is still loading)
+    sensors      - (hat, ch) pairs to probe
+    dirs         - directories the logger writes to
+
+    Returns (backend or None, ReadyReport).
+    """
+    start = clock()
+    delay = first_delay
+    backend = None
+    attempts = 0
+    while True:
+        attempts += 1
+        problems = _check_dirs(dirs)
+        if backend is None:
+            try:
+                backend = make_backend()
+            except Exception as e:
+                problems.append(f"RTD backend unavailable ({e})")
+        if backend is not None:
+            problems += _check_bus(backend, sensors)
+
+        waited = clock() - start
+        if not problems or waited >= timeout:
+            return backend, ReadyReport(not problems, waited, attempts, problems, uptime())
+        sleep(min(delay, timeout - waited))
+        delay = min(delay * 2, max_delay)
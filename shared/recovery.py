@@ -0,0 +1,93 @@
+# Restart recovery for the RTD loggers
+
+'''
+Works out what a restart cost and resumes where it can.
+
+After a power cycle the loggers used to log "Instrument restarted" and
+wait for the next 5-min boundary. Which windows were lost was only
+visible by scanning the whole CSV afterwards. On start we now
+
+  1. tail-seek the data file for its last completed window
+     (data_files.last_row_time - constant time, however long the file)
+  2. record the windows between that one and the first window this run
+     will write in <data>_gaps.csv:
+
+         Gap_Start,Gap_End,Missing_Windows,Detected_At(UTC)
+
+     (Gap_Start / Gap_End are the first and last missing window labels)
+  3. join the window already in progress (SampleScheduler(join_current=
+     True)) and refill it with the scans the previous run put in the raw
+     store before it stopped - resume_samples() below - so the window is
+     written, just with fewer samples.
+
+Step 3 needs the scans of the open window in the raw store. While
+RESUME_PARTIAL is on the loggers open it with flush_each=True, so each
+scan reaches the OS as it is taken and survives a crash or restart of
+the logger itself. The store is fsynced once per window, with the
+journal commit, not once per scan (that would be ~2880 fsyncs a day and
+undo the batching in buffered_writer.py), so a power cut can still lose
+the scans of the window in progress - at most one partial window.
+'''
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from data_files import last_row_time, prepare_data_file
+from raw_store import RawStoreReader
+
+GAP_HEADER = "Gap_Start,Gap_End,Missing_Windows,Detected_At(UTC)\n"
+
+
+class GapLog:
+    """
+    Gap markers for one data file.
+
+    data_path - the logger's window CSV; gaps go to <stem>_gaps.csv
+    write     - callable(path, text) that appends, e.g. BufferedWriter.write
+    """
+
+    def __init__(self, data_path, write, window_seconds=300):
+        self.data_path = data_path
+        stem = data_path.with_suffix("")
+        self.path = stem.with_name(stem.name + "_gaps.csv")
+        self.write = write
+        self.window = timedelta(seconds=window_seconds)
+
+    def check(self, first_window):
+        """
+        Compare the data file's last window with the first one this run
+        will write; record and return (gap_start, gap_end, missing) or
+        None if nothing was lost.
+        """
+        last = last_row_time(self.data_path)
+        if last is None:
+            return None
+        missing = round((first_window - last) / self.window) - 1
+        if missing <= 0:
+            return None
+        gap = (last + self.window, first_window - self.window, missing)
+        prepare_data_file(self.path, GAP_HEADER)
+        self.write(self.path, (
+            f"{gap[0]:%Y-%m-%d %H:%M:%S},{gap[1]:%Y-%m-%d %H:%M:%S},{missing},"
+            f"{datetime.utcnow():%Y-%m-%d %H:%M:%S}\n"
+        ))
+        return gap
+
+
+def resume_samples(raw_path, start, end):
+    """
+    Scans from the raw store with start <= epoch < end, as
+    (epoch, resi, temp) with flagged sensors set to NaN.
+    """
+    if not raw_path.is_file():
+        return []
+    try:
+        reader = RawStoreReader(raw_path)
+    except ValueError:
+        return []
+    records = reader.slice(start, end)
+    bad = reader.bad(records)
+    resi = np.where(bad, np.nan, records["resi"].astype(float))
+    temp = np.where(bad, np.nan, records["temp"].astype(float))
+    return list(zip(records["epoch"].tolist(), resi, temp))
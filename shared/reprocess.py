@@ -0,0 +1,591 @@
+# Re-apply a calibration offset set to logged data
+
+'''
+Rewrites the corrected-temperature column of existing logger files
+from their raw temperatures and a chosen offset set.
+
+When sensor_offsets.json is re-calibrated, every CorrectedTemp_degC /
+Corr_Temp value already logged is stale. Offset sets are versioned by
+keeping each calibration as its own file in the sensor_offsets.json
+format (e.g. sensor_offsets_2026-02-14.json); reprocessing with one:
+
+    python shared/reprocess.py --offsets fixed-array/scripts/sensor_offsets_2026-02-14.json \\
+        fixed-array/logger_files/rtd_tower_data.csv
+
+    python shared/reprocess.py --offsets mobile-array/scripts/sensor_offsets.json \\
+        mobile-array/logger_files          # every OPIE_*/ unit below it
+
+The tower table is compiled with load_fixed, a mobile unit's with
+load_mobile for the serial its OPIE_* directory belongs to in
+raspi_serials.json (--serial for files outside one), so each array's
+sign convention applies. Only the corrected column changes; it is
+re-derived from the logged (rounded) raw column and written with the
+decimals the file already uses.
+
+Files are streamed in blocks and split into newline-aligned byte ranges
+rewritten in parallel by a process pool, so memory stays at a few
+blocks per process whatever the file size. The ranges are joined into
+a staged sibling, .<file>.reprocess, and the live file is left alone:
+a logger still running would append (BufferedWriter flush) between the
+last read and a swap, and those rows would be lost without an error.
+Swapping is a separate, explicit step, run once the logger is stopped:
+
+    sudo systemctl stop <logger>        # or however it is run
+    python shared/reprocess.py --swap --offsets <same set> <same files>
+
+--swap rewrites the rows appended since staging, replaces the file with
+os.replace, and refuses to install a staged file made with another
+offset set or from a file that has since shrunk. Afterwards:
+
+    <file>.offsets.json   which offset set (name + SHA-1) the file now
+                          carries - the same set again is a no-op, and
+                          shared/fleet_ingest.py re-ingests the file
+    <file>.idx            rebuilt (row offsets may have moved)
+    <stem>_hourly.csv,    rebuilt from the new values when present (the
+    <stem>_daily.csv      open hour / day comes from the running logger)
+
+Wide files (rtd_tower_data_wide.csv) carry no raw column and are left
+alone. Rows whose sensor is not in the offset set, or whose raw value
+is unreadable, are kept unchanged and counted.
+'''
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from operator import itemgetter
+from pathlib import Path
+
+import numpy as np
+
+from data_files import applied_offsets, offsets_sidecar
+from fleet_ingest import Layout, read_head
+from range_reader import index_path, update_index
+from rollups import Rollups
+from sensor_table import load_fixed, load_mobile
+
+BLOCK_BYTES = 4 * 1024 * 1024
+MIN_RANGE = 16 * 1024 * 1024     # smaller files go to one process
+KEY_LIMIT = 64                   # hat / channel numbers looked up by array
+
+
+# ------------------------------------------------------
+# Offset sets
+# ------------------------------------------------------
+class OffsetSet:
+    """One versioned offsets file; compiles a SensorTable per array / unit."""
+
+    def __init__(self, path, version=None, serials_path=None):
+        self.path = Path(path)
+        self.version = version or self.path.stem
+        self.sha1 = hashlib.sha1(self.path.read_bytes()).hexdigest()
+        self.serials_path = Path(serials_path or self.path.with_name("raspi_serials.json"))
+        self._tables = {}
+
+    def serial_for(self, unit):
+        """Pi serial of a mobile unit name (OPIE_I ...), or None."""
+        if not self.serials_path.is_file():
+            return None
+        with self.serials_path.open() as f:
+            units = json.load(f)
+        return next((serial for serial, name in units.items() if name == unit), None)
+
+    def table(self, serial=None):
+        """Tower table (serial None) or a mobile unit's table."""
+        if serial not in self._tables:
+            if serial is None:
+                table = load_fixed(self.path)
+            else:
+                table = load_mobile(serial, self.path, self.serials_path)
+            self._tables[serial] = table
+        return self._tables[serial]
+
+    def record(self, rows, unmatched):
+        return {
+            "version": self.version,
+            "sha1": self.sha1,
+            "offsets": str(self.path.resolve()),
+            "applied": f"{datetime.utcnow():%Y-%m-%d %H:%M:%S}",
+            "rows": rows,
+            "unmatched": unmatched,
+        }
+
+
+# ------------------------------------------------------
+# Row rewriting (runs in the worker processes)
+# ------------------------------------------------------
+class RowPlan:
+    """Where the key, raw and corrected fields are, and the new corrections."""
+
+    def __init__(self, layout, table, decimals):
+        columns = layout.columns
+        self.raw = columns.index(layout.source["raw_temp"])
+        self.corr = columns.index(layout.source["corr_temp"])
+        self.last = self.corr == len(columns) - 1
+        self.split = max(self.raw, self.corr) + 1
+        self.decimals = decimals
+        self.commas = len(columns) - 1
+        self.channel = columns.index(layout.source["channel"])
+        self.hat = columns.index(layout.source["hat"]) if "hat" in layout.source else None
+
+        hats, chs, corrs = table.hat.tolist(), table.ch.tolist(), table.correction.tolist()
+        # Per-line path: dict on the key fields' bytes
+        if self.hat is not None:
+            self.key = (self.hat, self.channel)
+            self.corrections = {
+                (str(h).encode(), str(c).encode()): corr for h, c, corr in zip(hats, chs, corrs)
+            }
+        else:
+            self.key = (self.channel,)
+            self.corrections = {str(c).encode(): corr for c, corr in zip(chs, corrs)}
+        # Column path: correction by [hat, ch], NaN where there is no sensor
+        self.lookup = np.full((KEY_LIMIT, KEY_LIMIT), np.nan)
+        self.lookup[hats, chs] = corrs
+
+
+def rewrite(data, plan):
+    """One block of complete lines -> (rewritten bytes, rows, unmatched)."""
+    result = _rewrite_columns(data, plan)
+    return result if result is not None else _rewrite_lines(data, plan)
+
+
+def _rewrite_lines(data, plan):
+    """Line by line; handles anything (torn rows, odd field counts)."""
+    lines = data.split(b"\n")
+    lines.pop()     # after the last newline
+    key_of = itemgetter(*plan.key)
+    corrections = plan.corrections
+    raw_i, corr_i, split = plan.raw, plan.corr, plan.split
+    fmt = b"%%.%df" % plan.decimals
+    unmatched = 0
+    for n, line in enumerate(lines):
+        fields = line.split(b",", split)
+        try:
+            correction = corrections[key_of(fields)]
+            value = fmt % (float(fields[raw_i]) + correction)
+        except (KeyError, IndexError, ValueError):
+            unmatched += 1
+            continue
+        if plan.last and fields[corr_i].endswith(b"\r"):
+            value += b"\r"
+        fields[corr_i] = value
+        lines[n] = b",".join(fields)
+    lines.append(b"")
+    return b"\n".join(lines), len(lines) - 1, unmatched
+
+
+def _fields(buf, start, end):
+    """Byte fields buf[start:end] per row as a fixed-width bytes array."""
+    width = max(int((end - start).max()), 1)
+    index = start[:, None] + np.arange(width)
+    chars = buf[np.minimum(index, len(buf) - 1)]
+    chars[index >= end[:, None]] = 0
+    return chars.view(f"S{width}").ravel()
+
+
+def _format(values, decimals):
+    """
+    "%.<decimals>f" of every value, vectorized: (chars matrix, lengths).
+    Exact halves after scaling, where rint and printf may round apart,
+    are left to Python's formatting.
+    """
+    n = len(values)
+    fmt = b"%%.%df" % decimals
+    finite = np.isfinite(values)
+    scaled = np.where(finite, np.abs(values) * 10.0 ** decimals, 0.0)
+    digits_int = np.rint(scaled).astype(np.int64)
+    exact = finite & (np.abs(scaled - np.floor(scaled) - 0.5) > 1e-6)
+
+    negative = np.signbit(values).astype(np.int64)
+    ndigits = np.maximum(
+        decimals + 1, 1 + np.searchsorted(10 ** np.arange(1, 19), digits_int, side="right")
+    )
+    dot = 1 if decimals else 0
+    width = 1 + int(ndigits.max(initial=1)) + dot
+    chars = np.zeros((n, max(width, 4)), dtype=np.uint8)
+    lengths = negative + ndigits + dot
+
+    j = np.arange(ndigits.max(initial=1))
+    used = j < ndigits[:, None]
+    power = np.clip(ndigits[:, None] - 1 - j, 0, None)
+    digit = (digits_int[:, None] // 10 ** power) % 10
+    column = negative[:, None] + j + dot * (j >= (ndigits - decimals)[:, None])
+    rows = np.broadcast_to(np.arange(n)[:, None], used.shape)
+    chars[rows[used], column[used]] = 48 + digit[used]
+    if dot:
+        chars[np.arange(n), negative + ndigits - decimals] = ord(".")
+    chars[negative.astype(bool), 0] = ord("-")
+
+    for i in np.flatnonzero(~exact):
+        text = fmt % values[i]
+        chars[i] = 0
+        chars[i, :len(text)] = np.frombuffer(text, np.uint8)
+        lengths[i] = len(text)
+    return chars, lengths
+
+
+def _rewrite_columns(data, plan):
+    """
+    Whole block at once with NumPy; None if any row has an unexpected
+    number of fields or an unreadable number (-> _rewrite_lines).
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(buf == 10)
+    commas = np.flatnonzero(buf == 44)
+    n = len(ends)
+    if n == 0 or len(commas) != n * plan.commas:
+        return None
+    commas = commas.reshape(n, plan.commas)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    if (commas[:, 0] < starts).any() or (commas[:, -1] > ends).any():
+        return None
+
+    def field(i):
+        start = starts if i == 0 else commas[:, i - 1] + 1
+        end = ends if i == plan.commas else commas[:, i]
+        return start, end
+
+    try:
+        channel = _fields(buf, *field(plan.channel)).astype(np.int64)
+        hat = _fields(buf, *field(plan.hat)).astype(np.int64) if plan.hat is not None else 0
+        raw = _fields(buf, *field(plan.raw)).astype(np.float64)
+    except ValueError:
+        return None
+
+    hat = np.broadcast_to(hat, channel.shape)
+    known = (channel >= 0) & (channel < KEY_LIMIT) & (hat >= 0) & (hat < KEY_LIMIT)
+    correction = np.full(n, np.nan)
+    correction[known] = plan.lookup[hat[known], channel[known]]
+    matched = ~np.isnan(correction)
+    chars, lengths = _format(raw + np.where(matched, correction, 0.0), plan.decimals)
+
+    # Output: row start..corr field | new text | corr field end..newline
+    corr_start, corr_end = field(plan.corr)
+    if plan.last:
+        corr_end = corr_end - (buf[corr_end - 1] == 13)      # keep a trailing \r
+    mid_start = np.where(matched, len(buf) + np.arange(n) * chars.shape[1], corr_start)
+    mid_length = np.where(matched, lengths, corr_end - corr_start)
+    seg_start = np.column_stack([starts, mid_start, corr_end]).ravel()
+    seg_length = np.column_stack([corr_start - starts, mid_length, ends + 1 - corr_end]).ravel()
+
+    source = np.concatenate([buf, chars.ravel()])
+    out_start = np.cumsum(seg_length) - seg_length
+    # int32 halves the index traffic; blocks are far below 2 GB
+    index = np.repeat((seg_start - out_start).astype(np.int32), seg_length)
+    index += np.arange(seg_length.sum(), dtype=np.int32)
+    return source[index].tobytes(), n, int(n - matched.sum())
+
+
+def _blocks(f, start, end, block_bytes):
+    """Blocks of complete lines between byte offsets start and end."""
+    f.seek(start)
+    left, carry = end - start, b""
+    while left > 0:
+        chunk = f.read(min(block_bytes, left))
+        if not chunk:
+            break
+        left -= len(chunk)
+        data = carry + chunk
+        cut = data.rfind(b"\n") + 1
+        if cut:
+            yield data[:cut]
+        carry = data[cut:]
+
+
+def rewrite_range(path, start, end, part_path, plan, block_bytes=BLOCK_BYTES):
+    """Rewrite bytes [start, end) of path into part_path; returns (rows, unmatched)."""
+    rows = unmatched = 0
+    with open(path, "rb") as src, open(part_path, "wb") as dst:
+        for data in _blocks(src, start, end, block_bytes):
+            out, n, bad = rewrite(data, plan)
+            dst.write(out)
+            rows += n
+            unmatched += bad
+    return rows, unmatched
+
+
+# ------------------------------------------------------
+# Files
+# ------------------------------------------------------
+def _line_end(f, offset):
+    """Offset just after the first newline at or after offset (EOF if none)."""
+    f.seek(offset)
+    f.readline()
+    return f.tell()
+
+
+def split_ranges(path, start, workers, min_range=MIN_RANGE):
+    """Newline-aligned (start, end) ranges covering the complete lines after start."""
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        f.seek(max(start, size - 64 * 1024))
+        tail = f.read()
+        end = size - len(tail) + tail.rfind(b"\n") + 1 if b"\n" in tail else start
+        n = max(1, min(workers, (end - start) // min_range))
+        cuts = [start] + [_line_end(f, start + (end - start) * k // n) for k in range(1, n)] + [end]
+    return [(a, b) for a, b in zip(cuts, cuts[1:]) if b > a]
+
+
+class Job:
+    """One data file to reprocess."""
+
+    def __init__(self, path, header, data_start, plan, table, serial):
+        self.path = path
+        self.header = header
+        self.data_start = data_start
+        self.plan = plan
+        self.table = table
+        self.serial = serial
+        self.layout = Layout(header)
+
+    def temp(self, tag):
+        return self.path.with_name(f".{self.path.name}.{tag}")
+
+
+def plan_jobs(specs, offsets, serial=None, force=False, log=print):
+    """Jobs for the long-format data files named by specs (directories are walked)."""
+    jobs = []
+    for spec in specs:
+        path = Path(spec).expanduser()
+        if not path.exists():
+            raise ValueError(f"No such file or directory: {path}")
+        for file in sorted(path.rglob("*.csv")) if path.is_dir() else [path]:
+            header, first, data_start = read_head(file)
+            if header is None:
+                continue
+            layout = Layout(header)
+            if not (layout.is_data and "corr_temp" in layout.source):
+                continue
+            applied = applied_offsets(file)
+            if applied and applied["sha1"] == offsets.sha1 and not force:
+                log(f"{file}: already at offsets {applied['version']}")
+                continue
+
+            unit_serial = None
+            if "hat" not in layout.source:
+                unit_serial = serial or offsets.serial_for(file.parent.name)
+                if unit_serial is None:
+                    raise ValueError(f"{file}: can't tell the unit's Pi serial, pass --serial")
+            table = offsets.table(unit_serial)
+
+            corr_field = first.split(",")[layout.columns.index(layout.source["corr_temp"])]
+            decimals = len(corr_field.strip().partition(".")[2])
+            plan = RowPlan(layout, table, decimals)
+            jobs.append(Job(file, header, data_start, plan, table, unit_serial))
+    return jobs
+
+
+def staged(job):
+    """(staged file, its pending record) for job.path."""
+    return job.temp("reprocess"), job.temp("reprocess.json")
+
+
+def stage(job, parts, scanned_to):
+    """
+    Join the parts (plus rows appended since) into the staged file,
+    leaving the live file untouched; returns (rows, unmatched, source
+    bytes covered).
+    """
+    rows = unmatched = 0
+    new, _ = staged(job)
+    with open(new, "wb") as out:
+        with open(job.path, "rb") as src:
+            out.write(src.read(job.data_start))
+        for part in parts:
+            with open(part, "rb") as f:
+                shutil.copyfileobj(f, out, BLOCK_BYTES)
+            part.unlink()
+        # Rows the logger flushed while the parts were written (complete
+        # rows only; the rest is picked up by install())
+        with open(job.path, "rb") as src:
+            src.seek(scanned_to)
+            tail = src.read()
+        cut = tail.rfind(b"\n") + 1
+        if cut:
+            text, rows, unmatched = rewrite(tail[:cut], job.plan)
+            out.write(text)
+        out.flush()
+        os.fsync(out.fileno())
+    return rows, unmatched, scanned_to + cut
+
+
+def install(job, offsets):
+    """
+    Swap the staged file in for job.path - the logger must be stopped.
+    Returns (rows, unmatched) for the whole file.
+    """
+    new, pending_path = staged(job)
+    with pending_path.open() as f:
+        pending = json.load(f)
+    if pending["sha1"] != offsets.sha1:
+        raise ValueError(f"{job.path}: staged with offsets {pending['version']}, "
+                         f"not {offsets.version}; stage it again")
+    source_end = pending["source_end"]
+    if job.path.stat().st_size < source_end:
+        raise ValueError(f"{job.path}: shorter than when it was staged; stage it again")
+
+    with open(new, "ab") as out:
+        # Rows appended since staging, and a partial last row (kept as it is)
+        with open(job.path, "rb") as src:
+            src.seek(source_end)
+            tail = src.read()
+        rows, unmatched = pending["rows"], pending["unmatched"]
+        cut = tail.rfind(b"\n") + 1
+        if cut:
+            text, n, bad = rewrite(tail[:cut], job.plan)
+            out.write(text)
+            rows += n
+            unmatched += bad
+        out.write(tail[cut:])
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(new, job.path)
+    pending_path.unlink()
+
+    index = index_path(job.path)
+    if index.is_file():
+        index.unlink()
+    update_index(job.path)
+    return rows, unmatched
+
+
+def rebuild_rollups(job):
+    """Rewrite <stem>_hourly/_daily.csv from the reprocessed file, if it has them."""
+    rollups = Rollups(job.path, [], None)
+    if not any(level.path.is_file() for level in rollups.levels):
+        return False
+    if "n_valid" not in job.layout.source:
+        return False
+
+    table = job.table
+    if "hat" in job.layout.source:
+        labels = [f"{h}cm" for h in table.height_cm.tolist()]
+        key_columns = (job.layout.source["hat"], job.layout.source["channel"])
+        keys = [(str(h), str(c)) for h, c in zip(table.hat.tolist(), table.ch.tolist())]
+    else:
+        labels = [f"ch{c}" for c in table.ch.tolist()]
+        key_columns = (job.layout.source["channel"],)
+        keys = [(str(c),) for c in table.ch.tolist()]
+
+    buffers = {}
+    staged = Rollups(job.temp("rollup.csv"), labels,
+                     lambda path, text: buffers.setdefault(path, []).append(text))
+    for level in staged.levels:
+        if level.path.exists():
+            level.path.unlink()     # left over from an interrupted run
+        level.last_written = None
+    staged.prepare()
+    staged.replay(job.path, key_columns, keys, job.layout.source["corr_temp"],
+                  job.layout.source["n_valid"])
+    for level, final in zip(staged.levels, rollups.levels):
+        with level.path.open("a") as f:
+            f.writelines(buffers.get(level.path, []))
+        os.replace(level.path, final.path)
+    return True
+
+
+def _write_json(path, record):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(record, indent=1))
+    os.replace(tmp, path)
+
+
+def reprocess(specs, offsets, serial=None, workers=None, force=False, log=print):
+    """
+    Stage every data file in specs with offsets re-applied (see stage());
+    returns rows rewritten. Nothing live changes until swap().
+    """
+    workers = workers or os.cpu_count() or 1
+    jobs = plan_jobs(specs, offsets, serial, force, log)
+    if not jobs:
+        return 0
+
+    total = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for job in jobs:
+            ranges = split_ranges(job.path, job.data_start, workers)
+            parts = [job.temp(f"part{k:03d}") for k in range(len(ranges))]
+            futures = [
+                pool.submit(rewrite_range, str(job.path), a, b, str(part), job.plan)
+                for (a, b), part in zip(ranges, parts)
+            ]
+            scanned_to = ranges[-1][1] if ranges else job.data_start
+            pending.append((job, parts, futures, scanned_to))
+
+        for job, parts, futures, scanned_to in pending:
+            try:
+                counts = [future.result() for future in futures]
+            except BaseException:
+                for part in parts:
+                    if part.exists():
+                        part.unlink()
+                raise
+            rows, unmatched, source_end = stage(job, parts, scanned_to)
+            rows += sum(n for n, _ in counts)
+            unmatched += sum(bad for _, bad in counts)
+            _write_json(staged(job)[1],
+                        dict(offsets.record(rows, unmatched), source_end=source_end))
+            note = f", {unmatched} rows left unchanged" if unmatched else ""
+            log(f"{job.path}: {rows} rows staged at offsets {offsets.version}{note}")
+            total += rows
+    log("Stop the logger(s) writing these files, then run again with --swap to install")
+    return total
+
+
+def swap(specs, offsets, serial=None, log=print):
+    """Install the files staged by reprocess() - loggers stopped; returns files swapped."""
+    done = 0
+    for job in plan_jobs(specs, offsets, serial, force=True, log=log):
+        if not staged(job)[1].is_file():
+            continue
+        rows, unmatched = install(job, offsets)
+        _write_json(offsets_sidecar(job.path), offsets.record(rows, unmatched))
+        note = f", {unmatched} rows left unchanged" if unmatched else ""
+        rolled = ", rollups rebuilt" if rebuild_rollups(job) else ""
+        log(f"{job.path}: {rows} rows at offsets {offsets.version}{note}{rolled}")
+        done += 1
+    return done
+
+
+# ------------------------------------------------------
+# Command line
+# ------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Re-derive corrected temperatures in logger CSVs from a chosen offset set."
+    )
+    parser.add_argument("files", nargs="+", help="data files or directories of them")
+    parser.add_argument("--offsets", type=Path, required=True,
+                        help="offset set, in the sensor_offsets.json format of the array")
+    parser.add_argument("--version", help="label recorded for this offset set (default: file name)")
+    parser.add_argument("--serials", type=Path,
+                        help="raspi_serials.json for mobile units (default: next to --offsets)")
+    parser.add_argument("--serial", help="Pi serial for mobile files outside an OPIE_* directory")
+    parser.add_argument("--workers", type=int, help="parallel processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true",
+                        help="rewrite files already carrying this offset set")
+    parser.add_argument("--swap", action="store_true",
+                        help="install files staged earlier with the same offsets "
+                             "(stop the logger first)")
+    args = parser.parse_args(argv)
+
+    try:
+        offsets = OffsetSet(args.offsets, args.version, args.serials)
+        if args.swap:
+            print(f"{swap(args.files, offsets, args.serial)} files swapped in")
+        else:
+            total = reprocess(args.files, offsets, args.serial, args.workers, args.force)
+            print(f"{total} rows staged")
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+# Robust window statistics for oversampled RTD data
+
+'''
+Buffers every scan of a window and reduces it with a robust estimator.
+
+At one sample every 30 s a single noisy read moves the 5-min mean by a
+tenth of its error. Oversampling (1-5 Hz) gives each window hundreds of
+samples; a robust reduction then shrugs off the occasional spike
+instead of averaging it in.
+
+RobustWindow has the same interface as WindowAccumulator (field, add,
+result, reset), so a logger can swap one for the other. Scans go into
+one preallocated (samples, fields, sensors) array, and result() reduces
+the whole block - every field of every sensor - in one vectorized pass:
+
+    'median'      median of the valid samples
+    'trimmed'     mean after dropping the lowest and highest `trim`
+                  fraction of each sensor's valid samples
+    'sigma_clip'  mean after repeatedly dropping samples more than
+                  `sigma` std-devs from the median (up to `iterations`)
+    'mean'        plain mean, for comparison
+
+In the returned WindowStats, mean holds the robust estimate; count, std,
+min and max describe the samples the estimate kept (for 'median', all
+valid samples). NaN reads are always ignored.
+
+CPU seconds spent in the last result() are kept in reduce_cpu.
+'''
+
+import time
+import warnings
+
+import numpy as np
+
+from window_stats import WindowStats
+
+METHODS = ("median", "trimmed", "sigma_clip", "mean")
+
+
+class RobustWindow:
+    """
+    n_sensors  - values per field in every scan
+    capacity   - most scans one window can hold (extra scans are
+                 dropped and counted in overflow)
+    fields     - field names, in the order add() receives them
+    method     - one of METHODS
+    trim       - fraction cut from each end for 'trimmed'
+    sigma, iterations - clipping threshold and passes for 'sigma_clip'
+    """
+
+    def __init__(self, n_sensors, capacity, fields=("resi", "temp", "corr"),
+                 method="median", trim=0.1, sigma=3.0, iterations=5):
+        if method not in METHODS:
+            raise ValueError(f"Unknown method '{method}', expected one of {METHODS}")
+        if not 0 <= trim < 0.5:
+            raise ValueError("trim must be in [0, 0.5)")
+        self.fields = tuple(fields)
+        self.n_sensors = n_sensors
+        self.capacity = capacity
+        self.method = method
+        self.trim = trim
+        self.sigma = sigma
+        self.iterations = iterations
+        self._buf = np.empty((capacity, len(self.fields), n_sensors))
+        self.reduce_cpu = 0.0
+        self.reset()
+
+    def field(self, name):
+        """Row index of a field in the result arrays."""
+        return self.fields.index(name)
+
+    def reset(self):
+        self.n = 0
+        self.overflow = 0
+
+    def add(self, *values):
+        """Store one scan: one sequence of n_sensors values per field."""
+        if self.n == self.capacity:
+            self.overflow += 1
+            return
+        row = self._buf[self.n]
+        for i, v in enumerate(values):
+            row[i] = v
+        self.n += 1
+
+    # --------------------------------------------------
+    # Reduction
+    # --------------------------------------------------
+    def result(self):
+        """Robust statistics of the scans so far (safe to keep after reset())."""
+        t0 = time.process_time()
+        x = self._buf[:self.n]
+        valid = np.isfinite(x)
+
+        if self.method == "trimmed":
+            # NaNs sort last, so each column's valid samples are ranks 0..count-1
+            x = np.sort(x, axis=0)
+            count = valid.sum(axis=0)
+            cut = np.floor(count * self.trim).astype(int)
+            rank = np.arange(len(x))[:, None, None]
+            kept = (rank >= cut) & (rank < count - cut)
+        elif self.method == "sigma_clip":
+            kept = valid
+            for _ in range(self.iterations):
+                center = _nanmedian(np.where(kept, x, np.nan))
+                spread = _masked_std(x, kept)
+                with np.errstate(invalid="ignore"):
+                    # NaN spread (< 2 samples) clips nothing
+                    clipped = valid & ~(np.abs(x - center) > self.sigma * spread)
+                if np.array_equal(clipped, kept):
+                    break
+                kept = clipped
+        else:
+            kept = valid
+
+        n_kept = kept.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(kept, x, 0.0).sum(axis=0) / n_kept
+        std = _masked_std(x, kept, mean)
+        minimum = np.where(kept, x, np.inf).min(axis=0, initial=np.inf)
+        maximum = np.where(kept, x, -np.inf).max(axis=0, initial=-np.inf)
+
+        empty = n_kept == 0
+        mean[empty] = np.nan
+        minimum[empty] = np.nan
+        maximum[empty] = np.nan
+        if self.method == "median":
+            mean = _nanmedian(x)
+
+        self.reduce_cpu = time.process_time() - t0
+        return WindowStats(self.fields, n_kept, mean, std, minimum, maximum)
+
+
+def _nanmedian(x):
+    """np.nanmedian over samples, NaN (no warning) for all-NaN columns."""
+    if len(x) == 0:
+        return np.full(x.shape[1:], np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.nanmedian(x, axis=0)
+
+
+def _masked_std(x, kept, mean=None):
+    """Sample std-dev (ddof=1) of the kept samples; NaN below 2 samples."""
+    n = kept.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if mean is None:
+            mean = np.where(kept, x, 0.0).sum(axis=0) / n
+        dev = np.where(kept, x - mean, 0.0)
+        var = (dev * dev).sum(axis=0) / (n - 1)
+    var[n < 2] = np.nan
+    return np.sqrt(var)
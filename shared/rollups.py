@@ -0,0 +1,217 @@
+# Incremental hourly / daily rollups for the RTD loggers
+
+'''
+Cascaded 5-min -> hourly -> daily summaries, kept up to date as each
+window closes.
+
+Dashboards and the weekly report used to re-aggregate the whole 5-min
+CSV every time they wanted hourly or daily numbers. Rollups instead
+folds each closed window into the open hour, each closed hour into the
+open day, and appends one row per finished hour / day to its own small
+CSV:
+
+    Time,mean_<s>...,min_<s>...,max_<s>...,n_<s>...
+
+with one column group per sensor label <s> (e.g. 120cm or ch3):
+
+    mean  sample-weighted mean (= mean of every valid sample)
+    min   lowest 5-min mean in the hour / day
+    max   highest 5-min mean in the hour / day
+    n     valid samples behind the mean
+
+Only counts, sums and extremes are kept per level, so a window costs a
+few vector ops and nothing is ever re-read.
+
+Open buckets live in memory. On start, replay() feeds the tail of the
+5-min long-format CSV back through the cascade, so an hour or day that
+spans a restart still comes out whole, and rows already written are not
+written again. Against an existing data file with no rollups yet, the
+same call backfills its whole history. The replay goes through
+range_reader.read_range, so files archived after a header change are
+included and a season split by an upgrade still rolls up whole; rows
+logged before N_Valid existed count NOMINAL_COUNT samples each.
+'''
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from data_files import last_row_time, prepare_data_file
+from range_reader import read_range
+
+# Rows from before N_Valid was logged carry a mean but no sample count;
+# each counts as this many samples, so the window is kept (as one
+# sample, it weighs less than a full new-format window in a mixed hour)
+NOMINAL_COUNT = 1
+
+
+class _Level:
+    """One resolution: accumulates child buckets, emits its own rows."""
+
+    def __init__(self, path, labels, floor, write):
+        self.path = path
+        self.labels = list(labels)
+        self.floor = floor
+        self.write = write
+        self.parent = None
+        n = len(self.labels)
+        self.total = np.zeros(n)
+        self.count = np.zeros(n, dtype=np.int64)
+        self.min = np.full(n, np.inf)
+        self.max = np.full(n, -np.inf)
+        self.open = None
+        self.last_written = last_row_time(path)
+
+    @property
+    def header(self):
+        return "Time," + ",".join(
+            f"{stat}_{label}" for stat in ("mean", "min", "max", "n") for label in self.labels
+        ) + "\n"
+
+    def add(self, when, total, count, vmin, vmax):
+        bucket = self.floor(when)
+        if self.open is not None and bucket != self.open:
+            self.close(upcoming=when)
+        self.open = bucket
+        self.total += total
+        self.count += count
+        np.fmin(self.min, vmin, out=self.min)
+        np.fmax(self.max, vmax, out=self.max)
+
+    def close(self, upcoming):
+        """Emit the open bucket; upcoming is the time that ended it."""
+        if self.last_written is None or self.open > self.last_written:
+            self.write(self.path, self.format_row())
+            self.last_written = self.open
+        parent = self.parent
+        if parent is not None:
+            parent.add(self.open, self.total, self.count, self.min, self.max)
+            # Close the day with its last hour, not an hour later
+            if parent.floor(upcoming) != parent.open:
+                parent.close(upcoming)
+        self.total.fill(0.0)
+        self.count.fill(0)
+        self.min.fill(np.inf)
+        self.max.fill(-np.inf)
+        self.open = None
+
+    def format_row(self):
+        empty = self.count == 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(empty, np.nan, self.total / self.count)
+        vmin = np.where(empty | np.isinf(self.min), np.nan, self.min)
+        vmax = np.where(empty | np.isinf(self.max), np.nan, self.max)
+        parts = [f"{self.open:%Y-%m-%d %H:%M:%S}"]
+        parts += [f"{v:.2f}" for v in mean]
+        parts += [f"{v:.2f}" for v in vmin]
+        parts += [f"{v:.2f}" for v in vmax]
+        parts += [str(int(v)) for v in self.count]
+        return ",".join(parts) + "\n"
+
+
+class Rollups:
+    """
+    Hourly and daily rollups of one logger's 5-min windows.
+
+    base_path - data file the rollups belong to; writes
+                <stem>_hourly.csv and <stem>_daily.csv next to it
+    labels    - one column label per sensor, in window order
+    write     - callable(path, text) that appends, e.g. BufferedWriter.write
+    """
+
+    def __init__(self, base_path, labels, write):
+        stem = base_path.with_suffix("")
+        self.hourly = _Level(stem.with_name(stem.name + "_hourly.csv"), labels,
+                             lambda t: t.replace(minute=0, second=0, microsecond=0), write)
+        self.daily = _Level(stem.with_name(stem.name + "_daily.csv"), labels,
+                            lambda t: t.replace(hour=0, minute=0, second=0, microsecond=0), write)
+        self.hourly.parent = self.daily
+        self.levels = (self.hourly, self.daily)
+
+    def prepare(self):
+        """Write headers; returns archived files whose columns changed."""
+        archived = []
+        for level in self.levels:
+            old = prepare_data_file(level.path, level.header)
+            if old:
+                archived.append(old)
+                level.last_written = None
+        return archived
+
+    def add(self, window_start, means, counts):
+        """Fold in one closed 5-min window (datetime label, per-sensor values)."""
+        means = np.asarray(means, dtype=float)
+        counts = np.asarray(counts, dtype=np.int64)
+        valid = (counts > 0) & np.isfinite(means)
+        counts = np.where(valid, counts, 0)
+        self.hourly.add(
+            window_start,
+            np.where(valid, means * counts, 0.0),
+            counts,
+            np.where(valid, means, np.inf),
+            np.where(valid, means, -np.inf),
+        )
+
+    def replay(self, data_path, key_columns, keys, value_column, count_column,
+               nominal_count=NOMINAL_COUNT):
+        """
+        Rebuild the open buckets from the long-format 5-min CSV.
+
+        key_columns   - columns identifying the sensor, e.g. ('Hat', 'Channel')
+        keys          - tuple of key strings per sensor, in label order
+        value_column  - value to roll up, e.g. 'CorrectedTemp_degC'
+        count_column  - valid samples per row, e.g. 'N_Valid'
+        nominal_count - samples credited to a row with a value but no
+                        count (files logged before N_Valid existed)
+
+        Returns the number of windows replayed.
+        """
+        if not data_path.is_file():
+            return 0
+        # Everything from the first day without a daily row onwards;
+        # hourly rows that already exist are folded in but not rewritten
+        start = None
+        if self.daily.last_written is not None:
+            start = f"{self.daily.last_written + timedelta(days=1):%Y-%m-%d}"
+        lines = read_range(data_path, start=start)
+        columns = next(lines).rstrip("\r\n").split(",")
+        key_index = [columns.index(c) for c in key_columns]
+        value_index = columns.index(value_column)
+        count_index = columns.index(count_column) if count_column in columns else None
+        position = {tuple(k): i for i, k in enumerate(keys)}
+
+        n = len(keys)
+        stamp, replayed = None, 0
+        means, counts = np.full(n, np.nan), np.zeros(n, dtype=np.int64)
+        for line in lines:
+            fields = line.rstrip("\r\n").split(",")
+            if fields[0] != stamp:
+                if stamp is not None:
+                    self.add(_parse_time(stamp), means, counts)
+                    replayed += 1
+                stamp = fields[0]
+                means.fill(np.nan)
+                counts.fill(0)
+            i = position.get(tuple(fields[k] for k in key_index))
+            if i is None:
+                continue
+            try:
+                value = float(fields[value_index])
+            except (ValueError, IndexError):
+                continue
+            count = ""
+            if count_index is not None and count_index < len(fields):
+                count = fields[count_index].strip()
+            try:
+                counts[i] = int(count) if count else (nominal_count if np.isfinite(value) else 0)
+            except ValueError:
+                continue
+            means[i] = value
+        if stamp is not None:
+            self.add(_parse_time(stamp), means, counts)
+            replayed += 1
+        return replayed
+
+
+def _parse_time(stamp):
+    return datetime.strptime(stamp[:19], "%Y-%m-%d %H:%M:%S")
@@ -0,0 +1,186 @@
+# Sensor backends for the RTD loggers
+
+'''
+Pluggable source of RTD readings for the fixed and mobile loggers.
+
+Every backend exposes the same two calls as librtd so the loggers
+don't care where readings come from:
+
+    get(hat, ch)     -> temperature (degC)
+    getRes(hat, ch)  -> resistance (ohms)
+
+    LibrtdBackend    - the real Sequent RTD hats (default on the Pi)
+    SimulatedBackend - deterministic fake hats for laptops / benchmarks
+
+Pick one with get_backend(), or set RTD_BACKEND=sim in the environment
+to run any logger off the Pi. Simulator knobs (all optional):
+
+    RTD_SIM_PROFILE     constant | diurnal | snowpack   (default snowpack)
+    RTD_SIM_LATENCY     seconds per librtd call         (default 0)
+    RTD_SIM_JITTER      +/- seconds added to latency    (default 0)
+    RTD_SIM_FAULT_RATE  probability a read raises       (default 0)
+    RTD_SIM_DEAD        dead sensors, e.g. "h0c3,h2c8"
+    RTD_SIM_SEED        random seed                     (default 0)
+'''
+
+import math
+import os
+import random
+import time
+
+# PT100 Callendar-Van Dusen coefficients (IEC 60751)
+R0 = 100.0
+CVD_A = 3.9083e-3
+CVD_B = -5.775e-7
+CVD_C = -4.183e-12
+
+PROFILES = ("constant", "diurnal", "snowpack")
+
+
+class SensorReadError(RuntimeError):
+    """Raised by a backend when a channel cannot be read."""
+
+
+# ------------------------------------------------------
+# Real hardware
+# ------------------------------------------------------
+class LibrtdBackend:
+    """Thin pass-through to the librtd module on the Pi."""
+
+    name = "librtd"
+
+    def __init__(self):
+        import librtd
+        self._lib = librtd
+
+    def get(self, hat, ch):
+        return self._lib.get(hat, ch)
+
+    def getRes(self, hat, ch):
+        return self._lib.getRes(hat, ch)
+
+
+# ------------------------------------------------------
+# Simulator
+# ------------------------------------------------------
+class SimulatedBackend:
+    """
+    Deterministic stand-in for the RTD hats.
+
+    Each channel has its own seeded random stream, so the values a
+    sensor returns depend only on the seed and how many times that
+    sensor was read - not on scan order or threading.
+
+    profile  - temperature shape over time and height (see PROFILES)
+    latency  - seconds slept per call, like a slow I2C transaction
+    jitter   - uniform +/- seconds added to each call's latency
+    fault_rate - probability that any single read raises
+    dead     - iterable of (hat, ch) that always raise
+    noise    - std-dev of gaussian read noise (degC)
+    clock    - callable returning epoch seconds (default time.time)
+    """
+
+    name = "sim"
+
+    def __init__(self, profile="snowpack", latency=0.0, jitter=0.0,
+                 fault_rate=0.0, dead=(), noise=0.02, seed=0,
+                 clock=time.time):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown sim profile '{profile}', expected one of {PROFILES}")
+        self.profile = profile
+        self.latency = latency
+        self.jitter = jitter
+        self.fault_rate = fault_rate
+        self.dead = {tuple(d) for d in dead}
+        self.noise = noise
+        self.seed = seed
+        self.clock = clock
+        self.calls = 0
+        self._rngs = {}
+
+    def _rng(self, hat, ch):
+        rng = self._rngs.get((hat, ch))
+        if rng is None:
+            rng = random.Random(self.seed * 1000 + hat * 16 + ch)
+            self._rngs[(hat, ch)] = rng
+        return rng
+
+    def _true_temp(self, hat, ch, t):
+        """Noise-free temperature for a sensor at epoch time t."""
+        height_cm = (hat * 8 + ch - 1) * 15
+        if self.profile == "constant":
+            return -2.0
+        day_phase = math.sin(2 * math.pi * (t % 86400) / 86400)
+        if self.profile == "diurnal":
+            return -5.0 + 5.0 * day_phase
+        # snowpack: near 0 C at the ground, following air temp near the top
+        depth_weight = min(height_cm / 465.0, 1.0)
+        return -0.5 + depth_weight * (-6.0 + 6.0 * day_phase)
+
+    def _read(self, hat, ch):
+        self.calls += 1
+        rng = self._rng(hat, ch)
+        delay = self.latency
+        if self.jitter:
+            delay += rng.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if (hat, ch) in self.dead:
+            raise SensorReadError(f"h{hat}c{ch} not responding")
+        if self.fault_rate and rng.random() < self.fault_rate:
+            raise SensorReadError(f"h{hat}c{ch} read timeout")
+        temp = self._true_temp(hat, ch, self.clock())
+        if self.noise:
+            temp += rng.gauss(0.0, self.noise)
+        return temp
+
+    def get(self, hat, ch):
+        return self._read(hat, ch)
+
+    def getRes(self, hat, ch):
+        return pt100_resistance(self._read(hat, ch))
+
+
+def pt100_resistance(temp):
+    """PT100 resistance (ohms) at temp (degC), Callendar-Van Dusen."""
+    r = R0 * (1 + CVD_A * temp + CVD_B * temp ** 2)
+    if temp < 0:
+        r += R0 * CVD_C * (temp - 100) * temp ** 3
+    return r
+
+
+# ------------------------------------------------------
+# Backend selection
+# ------------------------------------------------------
+def _parse_dead(text):
+    dead = []
+    for key in filter(None, (k.strip() for k in text.split(","))):
+        hat, ch = key.lstrip("h").split("c")
+        dead.append((int(hat), int(ch)))
+    return dead
+
+
+def get_backend(name=None, **sim_options):
+    """
+    Return a backend by name ('librtd' or 'sim').
+
+    With no name, RTD_BACKEND from the environment is used, falling
+    back to librtd. Keyword options override the RTD_SIM_* variables.
+    """
+    name = name or os.environ.get("RTD_BACKEND", "librtd")
+    if name == "librtd":
+        return LibrtdBackend()
+    if name != "sim":
+        raise ValueError(f"Unknown RTD backend '{name}'")
+
+    env = os.environ
+    options = {
+        "profile": env.get("RTD_SIM_PROFILE", "snowpack"),
+        "latency": float(env.get("RTD_SIM_LATENCY", 0)),
+        "jitter": float(env.get("RTD_SIM_JITTER", 0)),
+        "fault_rate": float(env.get("RTD_SIM_FAULT_RATE", 0)),
+        "dead": _parse_dead(env.get("RTD_SIM_DEAD", "")),
+        "seed": int(env.get("RTD_SIM_SEED", 0)),
+    }
+    options.update(sim_options)
+    return SimulatedBackend(**options)
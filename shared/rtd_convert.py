@@ -0,0 +1,108 @@
+# Resistance -> temperature conversion for the RTD loggers
+
+'''
+Callendar-Van Dusen (IEC 60751) conversion for PT100 / PT1000 probes.
+
+Reading only getRes() and converting in-process halves the I2C traffic
+per scan, and lets each probe carry its own calibration curve instead
+of a single flat offset. Conversion is vectorized over the whole scan.
+
+    R(T) = R0 * (1 + A*T + B*T^2)                    T >= 0 C
+    R(T) = R0 * (1 + A*T + B*T^2 + C*(T-100)*T^3)    T <  0 C
+
+Per-sensor coefficients live in sensor_coeffs.json next to
+sensor_offsets.json. Anything not listed falls back to "default", and
+any of type / r0 / a / b / c can be overridden per sensor:
+
+    {
+        "default": {"type": "PT100"},
+        "h2c5": {"r0": 100.04},
+        "h3c1": {"type": "PT1000"}
+    }
+
+Mobile units key the file by Pi serial like their offsets, e.g.
+{"default": {...}, "100000001e99c757": {"ch_3": {"r0": 99.98}}}.
+'''
+
+import json
+from pathlib import Path
+
+import numpy as np
+
+# IEC 60751 platinum coefficients
+CVD_A = 3.9083e-3
+CVD_B = -5.775e-7
+CVD_C = -4.183e-12
+
+RTD_TYPES = {"PT100": 100.0, "PT1000": 1000.0}
+
+
+def cvd_resistance(temp, r0=100.0, a=CVD_A, b=CVD_B, c=CVD_C):
+    """Resistance (ohms) at temp (degC); works on scalars or arrays."""
+    t = np.asarray(temp, dtype=float)
+    r = 1 + a * t + b * t ** 2
+    r = r + np.where(t < 0, c * (t - 100) * t ** 3, 0.0)
+    return r0 * r
+
+
+def cvd_temperature(resistance, r0=100.0, a=CVD_A, b=CVD_B, c=CVD_C, iterations=3):
+    """
+    Temperature (degC) from resistance (ohms); works on scalars or arrays.
+
+    Above 0 C the quadratic has a closed form. Below 0 C that solution
+    is refined with a few Newton steps on the full quartic, which is
+    well under 1e-6 C from -200 C to 0 C. NaN in gives NaN out.
+    """
+    ratio = np.asarray(resistance, dtype=float) / r0
+    with np.errstate(invalid="ignore"):
+        t = (-a + np.sqrt(a * a - 4 * b * (1 - ratio))) / (2 * b)
+        below = t < 0
+        if np.any(below):
+            for _ in range(iterations):
+                f = 1 + a * t + b * t ** 2 + c * (t - 100) * t ** 3 - ratio
+                df = a + 2 * b * t + c * (4 * t ** 3 - 300 * t ** 2)
+                t = np.where(below, t - f / df, t)
+    return t + 0.0   # turn -0.0 at exactly R0 into 0.0
+
+
+class CvdCoefficients:
+    """Per-sensor CVD coefficients as arrays aligned with a sensor list."""
+
+    def __init__(self, r0, a, b, c):
+        self.r0 = np.asarray(r0, dtype=float)
+        self.a = np.asarray(a, dtype=float)
+        self.b = np.asarray(b, dtype=float)
+        self.c = np.asarray(c, dtype=float)
+
+    @classmethod
+    def load(cls, path, keys, section=None):
+        """
+        Build coefficients for keys (e.g. ["h0c1", ...] or ["ch_1", ...]).
+
+        section picks a sub-dict (the Pi serial on mobile units). A
+        missing file means every sensor is a standard PT100.
+        """
+        path = Path(path)
+        table = json.loads(path.read_text()) if path.is_file() else {}
+        default = _resolve({"type": "PT100"}, table.get("default", {}))
+        per_sensor = table.get(section, {}) if section is not None else table
+
+        rows = [_resolve(default, per_sensor.get(key, {})) for key in keys]
+        return cls(*zip(*[(r["r0"], r["a"], r["b"], r["c"]) for r in rows]))
+
+    def temperature(self, resistance):
+        return cvd_temperature(resistance, self.r0, self.a, self.b, self.c)
+
+
+def _resolve(base, override):
+    """Merge one coefficients entry over base, expanding 'type' to r0."""
+    entry = {"a": CVD_A, "b": CVD_B, "c": CVD_C}
+    entry.update(base)
+    if "type" in override and "r0" not in override:
+        entry.pop("r0", None)
+    entry.update(override)
+    rtd_type = entry.get("type", "PT100")
+    if rtd_type not in RTD_TYPES:
+        raise ValueError(f"Unknown RTD type '{rtd_type}', expected one of {list(RTD_TYPES)}")
+    entry.setdefault("r0", RTD_TYPES[rtd_type])
+    return entry
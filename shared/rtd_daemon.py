@@ -0,0 +1,275 @@
+# asyncio logger daemon with a local query endpoint
+
+'''
+Runs the scan / aggregate / write cycle on an asyncio event loop, and
+answers queries from memory while it does.
+
+Before this, the only way to get data out of a running logger was to
+read its CSV. LoggerDaemon keeps the latest scan, the open (partial)
+window and the last few closed windows in memory, and serves them as
+JSON over HTTP on localhost and/or a Unix socket:
+
+    GET /latest         latest scan: every field per sensor, errors, skipped
+    GET /window         statistics of the open window so far
+    GET /windows?n=6    the last n closed windows (default: all kept)
+    GET /status         uptime, scan counts, scheduler jitter
+
+    curl -s localhost:8765/latest
+    curl -s --unix-socket /tmp/rtd_mobile.sock http://rtd/window
+
+Scans and file writes run in a worker thread (run_in_executor), so the
+event loop keeps answering in well under a millisecond even while a
+slow scan is on the bus. Tools on the box then never have to touch the
+hardware or re-parse the files. A scan that raises is logged and its
+tick counted as missed; the loop carries on with the next one.
+
+The daemon owns only the timing and the state. The logger supplies:
+
+    sample()         -> (Snapshot, values)  one scan; values are the
+                        per-field sequences for the WindowEngine
+    write(windows)   persist newly closed ClosedWindows
+
+Loggers that keep their own blocking loop (the tower log_rtd.py and
+mobile log_rtd_single.py) use QueryServer instead: the same endpoint,
+served from a background thread, answering from what the loop
+publishes after each scan and window:
+
+    query = QueryServer(labels, ('resi', 'temp', 'corr'), scheduler)
+    query.start(port=8765, unix_path='/tmp/rtd_tower.sock')
+    ...
+    query.publish_scan(snap, (snap.resi, snap.temp, corr))
+    query.publish_window(tick.window_start, accum.result())              # open
+    query.publish_window(tick.window_start, accum.result(), closed=True)  # done
+'''
+
+import asyncio
+import json
+import math
+import threading
+import time
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+from window_engine import ClosedWindow
+
+MAX_REQUEST = 8 * 1024
+
+
+def _clean(values):
+    """JSON-safe list: NaN / inf become null."""
+    return [None if not math.isfinite(v) else round(v, 4) for v in map(float, values)]
+
+
+def window_json(window, partial=False):
+    stats = window.stats
+    start = window.start
+    return {
+        "start": start.isoformat(sep=" ") if hasattr(start, "isoformat") else start,
+        "partial": partial,
+        "fields": list(stats.fields),
+        "count": {f: [int(c) for c in stats.count[i]] for i, f in enumerate(stats.fields)},
+        "mean": {f: _clean(stats.mean[i]) for i, f in enumerate(stats.fields)},
+        "std": {f: _clean(stats.std[i]) for i, f in enumerate(stats.fields)},
+        "min": {f: _clean(stats.min[i]) for i, f in enumerate(stats.fields)},
+        "max": {f: _clean(stats.max[i]) for i, f in enumerate(stats.fields)},
+    }
+
+
+class QueryServer:
+    """
+    The query endpoint, answering from state the logger publishes.
+
+    sensors   - labels, in snapshot order, echoed in every response
+    fields    - field names of the published values, in order
+    scheduler - SampleScheduler, for /status (optional)
+    history   - closed windows kept for /windows
+    """
+
+    def __init__(self, sensors, fields, scheduler=None, history=12):
+        self.sensors = list(sensors)
+        self.fields = tuple(fields)
+        self.scheduler = scheduler
+        self.started = time.time()
+        self.scans = 0
+        self.scan_errors = 0
+        self.last_error = None
+        self.latest = None          # response body for /latest
+        self.open = None            # ClosedWindow with the partial statistics
+        self.recent = deque(maxlen=history)
+        self._servers = []
+        self._thread = None
+
+    # --------------------------------------------------
+    # Publishing (logger side; each call swaps in a new
+    # object, so the query thread never sees half an update)
+    # --------------------------------------------------
+    def publish_scan(self, snap, values):
+        self.scans += 1
+        self.latest = {
+            "epoch": snap.started,
+            "scan_duration_s": round(snap.duration, 4),
+            "sensors": self.sensors,
+            "values": {f: _clean(v) for f, v in zip(self.fields, values)},
+            "errors": {self.sensors[i]: msg for i, msg in snap.errors.items()},
+            "skipped": [self.sensors[i] for i in sorted(snap.skipped)],
+        }
+
+    def publish_window(self, start, stats, closed=False):
+        window = ClosedWindow(start, stats)
+        if closed:
+            self.recent.append(window)
+            self.open = None
+        else:
+            self.open = window
+
+    def scan_failed(self, error):
+        self.scan_errors += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+
+    def current_window(self):
+        return self.open
+
+    def recent_windows(self):
+        return list(self.recent)
+
+    def late_scans(self):
+        return 0
+
+    # --------------------------------------------------
+    # Queries
+    # --------------------------------------------------
+    def query(self, path):
+        """(status, body) for one request path."""
+        url = urlsplit(path)
+        params = parse_qs(url.query)
+        if url.path == "/latest":
+            if self.latest is None:
+                return 503, {"error": "no scan yet"}
+            return 200, self.latest
+        if url.path == "/window":
+            window = self.current_window()
+            if window is None:
+                return 503, {"error": "no open window"}
+            return 200, dict(window_json(window, partial=True), sensors=self.sensors)
+        if url.path == "/windows":
+            recent = self.recent_windows()
+            n = int(params.get("n", [len(recent)])[0])
+            windows = recent[-n:] if n > 0 else []
+            return 200, {"sensors": self.sensors, "windows": [window_json(w) for w in windows]}
+        if url.path == "/status":
+            return 200, {
+                "uptime_s": round(time.time() - self.started, 1),
+                "scans": self.scans,
+                "scan_errors": self.scan_errors,     # ticks missed to failed scans
+                "last_error": self.last_error,
+                "late_scans": self.late_scans(),
+                "scheduler": self.scheduler.stats() if self.scheduler else None,
+            }
+        return 404, {"error": f"unknown path {url.path}",
+                     "paths": ["/latest", "/window", "/windows?n=", "/status"]}
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5)
+            method, path, _ = request[:MAX_REQUEST].decode("latin-1").split(" ", 2)
+            if method != "GET":
+                status, body = 405, {"error": "only GET is supported"}
+            else:
+                try:
+                    status, body = self.query(path)
+                except ValueError as e:
+                    status, body = 400, {"error": str(e)}
+            payload = json.dumps(body).encode()
+            writer.write(
+                f"HTTP/1.0 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                asyncio.TimeoutError, ValueError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=None, unix_path=None):
+        """Start the query endpoint(s); localhost only by default."""
+        if port is not None:
+            self._servers.append(await asyncio.start_server(self._handle, host, port))
+        if unix_path is not None:
+            self._servers.append(await asyncio.start_unix_server(self._handle, unix_path))
+
+    def start(self, host="127.0.0.1", port=None, unix_path=None):
+        """
+        serve() from a background thread, for loggers with a blocking
+        loop. Raises OSError here if the port / socket can't be bound.
+        """
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self.serve(host, port, unix_path))
+        except Exception:
+            loop.close()
+            raise
+        self._thread = threading.Thread(target=loop.run_forever, name="rtd-query", daemon=True)
+        self._thread.start()
+
+
+class LoggerDaemon(QueryServer):
+    """
+    scheduler - SampleScheduler driving the ticks
+    engine    - WindowEngine the scans are folded into
+    sample    - callable, one scan (runs in a worker thread)
+    write     - callable, persists closed windows (worker thread)
+    sensors   - labels, in snapshot order, echoed in every response
+    log       - callable(message) for failed scans (optional)
+    """
+
+    def __init__(self, scheduler, engine, sample, write, sensors, log=None):
+        super().__init__(sensors, engine.accum.fields, scheduler, history=engine.recent.maxlen)
+        self.engine = engine
+        self.sample = sample
+        self.write = write
+        self.log = log
+
+    def current_window(self):
+        return self.engine.current()
+
+    def recent_windows(self):
+        return list(self.engine.recent)
+
+    def late_scans(self):
+        return self.engine.late
+
+    # --------------------------------------------------
+    # Logging cycle
+    # --------------------------------------------------
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            tick = await self.scheduler.next_tick_async()
+            closed = []
+            if not tick.skipped:
+                try:
+                    snap, values = await loop.run_in_executor(None, self.sample)
+                except Exception as e:
+                    # One bad scan costs its tick, not the logger
+                    self.scan_failed(e)
+                    if self.log:
+                        self.log(f"Scan failed, tick {tick.index} missed: {self.last_error}")
+                else:
+                    self.publish_scan(snap, values)
+                    closed = self.engine.add(tick.epoch, *values)
+            if tick.last_in_window:
+                # Close on schedule even if the last tick was skipped
+                closed += self.engine.flush()
+            if closed:
+                await loop.run_in_executor(None, self.write, closed)
+
+    async def main(self, host="127.0.0.1", port=None, unix_path=None):
+        """Serve queries and log until cancelled."""
+        await self.serve(host, port, unix_path)
+        try:
+            await self.run()
+        finally:
+            for server in self._servers:
+                server.close()
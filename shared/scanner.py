@@ -0,0 +1,165 @@
+# Sensor scan engine for the RTD loggers
+
+'''
+Reads every sensor once per tick and returns one Snapshot.
+
+Walking 4 hats x 8 channels one call at a time puts the bottom and top
+of the profile many seconds apart, and the skew grows with every hat we
+add. Scanner runs one worker per hat instead, so a scan takes about as
+long as the slowest single hat.
+
+How calls are allowed to overlap is set by bus_lock:
+
+    'hat'  - one lock per hat; different hats read concurrently (default)
+    'bus'  - one lock for everything; workers interleave call by call,
+             which still evens out skew but not total scan time
+    'none' - no locking at all (only for backends known to be safe)
+
+Each Snapshot holds resistance and temperature per sensor, the epoch
+time of every read, how long each sensor's bus calls took (latency, for
+shared/metrics.py), per-sensor error messages and the measured skew
+(last read - first read).
+
+scan(skip=...) leaves the listed sensors unread (NaN, recorded in
+snap.skipped), so a sensor whose circuit breaker is open (see
+shared/sensor_health.py) doesn't hold up the rest of its hat.
+
+read_mode picks how many bus transactions each sensor costs:
+
+    'both' - getRes() and get(), temperature from the hat (default)
+    'res'  - getRes() only; temperature is computed for the whole scan
+             by the converter (see rtd_convert.CvdCoefficients)
+'''
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BUS_LOCKS = ("hat", "bus", "none")
+READ_MODES = ("both", "res")
+
+
+class Snapshot:
+    """One complete scan, ordered like Scanner.sensors."""
+
+    def __init__(self, n):
+        self.resi = [float("nan")] * n
+        self.temp = [float("nan")] * n
+        self.read_time = [float("nan")] * n   # epoch seconds per sensor
+        self.latency = [float("nan")] * n     # seconds in getRes()/get() per sensor
+        self.errors = {}                       # sensor index -> message
+        self.skipped = set()                   # sensor indices not read this scan
+        self.started = 0.0
+        self.duration = 0.0
+
+    @property
+    def bad(self):
+        """Indices with no reading: failed or skipped."""
+        return sorted(self.skipped.union(self.errors))
+
+    @property
+    def skew(self):
+        """Seconds between the first and last successful read."""
+        times = [t for t in self.read_time if t == t]
+        return max(times) - min(times) if times else 0.0
+
+
+class _NullLock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class Scanner:
+    """
+    Concurrent per-hat scanner.
+
+    backend  - anything with get(hat, ch) / getRes(hat, ch)
+    sensors  - list of (hat, ch) in output order
+    parallel - False reads everything on the calling thread, in order
+    bus_lock - 'hat', 'bus' or 'none' (see module docstring)
+    read_mode - 'both' or 'res' (see module docstring)
+    converter - object with temperature(resistances), required for 'res'
+    """
+
+    def __init__(self, backend, sensors, parallel=True, bus_lock="hat",
+                 read_mode="both", converter=None):
+        if bus_lock not in BUS_LOCKS:
+            raise ValueError(f"Unknown bus_lock '{bus_lock}', expected one of {BUS_LOCKS}")
+        if read_mode not in READ_MODES:
+            raise ValueError(f"Unknown read_mode '{read_mode}', expected one of {READ_MODES}")
+        if read_mode == "res" and converter is None:
+            raise ValueError("read_mode 'res' needs a converter")
+        self.backend = backend
+        self.sensors = list(sensors)
+        self.parallel = parallel
+        self.bus_lock = bus_lock
+        self.read_mode = read_mode
+        self.converter = converter
+
+        # Group sensor indices by hat, keeping channel order
+        self.hats = {}
+        for i, (hat, ch) in enumerate(self.sensors):
+            self.hats.setdefault(hat, []).append(i)
+
+        if bus_lock == "bus":
+            shared = threading.Lock()
+            self._locks = {hat: shared for hat in self.hats}
+        elif bus_lock == "hat":
+            self._locks = {hat: threading.Lock() for hat in self.hats}
+        else:
+            self._locks = {hat: _NullLock() for hat in self.hats}
+
+        self._pool = None
+        if parallel and len(self.hats) > 1:
+            self._pool = ThreadPoolExecutor(
+                max_workers=len(self.hats), thread_name_prefix="rtd-hat"
+            )
+
+    def _read_one(self, snap, i):
+        """Read one sensor into snap; both values land in one lock hold."""
+        hat, ch = self.sensors[i]
+        try:
+            with self._locks[hat]:
+                t0 = time.perf_counter()
+                try:
+                    resi = self.backend.getRes(hat, ch)
+                    if self.read_mode == "both":
+                        snap.temp[i] = self.backend.get(hat, ch)
+                finally:
+                    snap.latency[i] = time.perf_counter() - t0
+                snap.read_time[i] = time.time()
+        except Exception as e:
+            snap.errors[i] = str(e)
+            return
+        snap.resi[i] = resi
+
+    def _read_hat(self, snap, hat):
+        for i in self.hats[hat]:
+            if i not in snap.skipped:
+                self._read_one(snap, i)
+
+    def scan(self, skip=()):
+        """Read every sensor (except the indices in skip) once and return the Snapshot."""
+        snap = Snapshot(len(self.sensors))
+        snap.skipped = set(skip)
+        snap.started = time.time()
+        t0 = time.perf_counter()
+        if self._pool is None:
+            for hat in self.hats:
+                self._read_hat(snap, hat)
+        else:
+            futures = [self._pool.submit(self._read_hat, snap, hat) for hat in self.hats]
+            for future in futures:
+                future.result()
+        if self.read_mode == "res":
+            snap.temp = self.converter.temperature(snap.resi).tolist()
+        snap.duration = time.perf_counter() - t0
+        return snap
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
@@ -0,0 +1,234 @@
+# Sampling scheduler for the RTD loggers
+
+'''
+Drift-free sample timing shared by the fixed and mobile loggers.
+
+The old loops did "scan, then sleep 30 s", so every sample landed 30 s
+plus the scan time after the previous one, and a 5-min window never
+held its 10 samples. The boundary sleep also used the wall clock, which
+jumps when NTP corrects it.
+
+SampleScheduler instead anchors once to the next even window boundary
+and then computes every deadline as
+
+    anchor + k * interval        (on time.monotonic())
+
+so scan time never accumulates. Window timestamps come from the same
+anchor, so a wall-clock step can't shift or split a window.
+
+Usage:
+
+    scheduler = SampleScheduler(interval=30, samples_per_window=10)
+    for tick in scheduler:
+        if not tick.skipped:
+            ... read sensors ...
+        if tick.last_in_window:
+            ... write the window labelled tick.window_start ...
+
+When a scan overruns past later deadlines, the policy decides what
+happens to the missed ticks:
+
+    'catchup' - run them immediately, back to back, so the window still
+                gets all its samples (up to max_catchup missed ticks)
+    'skip'    - yield them with tick.skipped = True and wait for the
+                next deadline still in the future
+
+Skipped ticks are still yielded so that last_in_window always fires
+exactly once per window.
+
+Under asyncio, await scheduler.next_tick_async() instead; it sleeps on
+the event loop, so other tasks keep running until the deadline.
+
+scheduler.slept accumulates the seconds spent waiting for deadlines
+(never reset), from which shared/power.py estimates the duty cycle.
+'''
+
+import asyncio
+import math
+import time
+from datetime import datetime, timezone
+
+
+class Tick:
+    """One scheduled sample slot."""
+
+    __slots__ = ("index", "deadline", "epoch", "lateness", "skipped",
+                 "window_start", "sample_in_window", "last_in_window")
+
+    def __init__(self, index, deadline, epoch, lateness, skipped,
+                 window_start, sample_in_window, last_in_window):
+        self.index = index                          # ticks since the anchor
+        self.deadline = deadline                    # monotonic seconds
+        self.epoch = epoch                          # scheduled wall time (s)
+        self.lateness = lateness                    # seconds past deadline at wake-up
+        self.skipped = skipped                      # True -> don't sample
+        self.window_start = window_start            # datetime label of this window
+        self.sample_in_window = sample_in_window    # 0 .. samples_per_window-1
+        self.last_in_window = last_in_window
+
+
+class SampleScheduler:
+    """
+    Absolute-deadline sample clock aligned to even window boundaries.
+
+    interval           - seconds between samples
+    samples_per_window - samples in one averaging window
+    policy             - 'catchup' or 'skip' (see module docstring)
+    max_catchup        - in 'catchup', ticks more overdue than this many
+                         intervals are skipped instead (e.g. after suspend)
+    resync_threshold   - seconds of wall vs. monotonic disagreement that
+                         trigger re-anchoring at the next window boundary
+    local_time         - label windows in local time instead of UTC
+    join_current       - start in the window already in progress (from its
+                         next tick) instead of waiting for the next boundary;
+                         joined_at is then the number of ticks already past
+    """
+
+    def __init__(self, interval=30, samples_per_window=10, policy="catchup",
+                 max_catchup=2, resync_threshold=2.0, local_time=False,
+                 join_current=False, clock=time.monotonic, wall=time.time, sleep=time.sleep):
+        if policy not in ("catchup", "skip"):
+            raise ValueError(f"Unknown scheduler policy '{policy}'")
+        self.interval = interval
+        self.samples_per_window = samples_per_window
+        self.window_seconds = interval * samples_per_window
+        self.policy = policy
+        self.max_catchup = max_catchup
+        self.resync_threshold = resync_threshold
+        self.local_time = local_time
+        self.clock = clock
+        self.wall = wall
+        self.sleep = sleep
+        self.resyncs = 0
+        self.slept = 0.0
+        self.reset_stats()
+        self._anchor(join=join_current)
+        self.joined_at = self._next_index
+
+    # --------------------------------------------------
+    # Anchoring
+    # --------------------------------------------------
+    def _anchor(self, join=False):
+        """
+        Tie tick 0 to the next even window boundary on the wall clock,
+        or with join to the current window's start, continuing from its
+        next tick.
+        """
+        mono_now, wall_now = self.clock(), self.wall()
+        boundary = (wall_now // self.window_seconds + 1) * self.window_seconds
+        k = 0
+        if join:
+            boundary -= self.window_seconds
+            k = math.ceil((wall_now - boundary) / self.interval)
+            if k >= self.samples_per_window:
+                boundary, k = boundary + self.window_seconds, 0
+        self.anchor_wall = boundary
+        self.anchor_mono = mono_now + (boundary - wall_now)
+        self._next_index = k
+
+    def clock_offset(self):
+        """Seconds the wall clock has moved relative to the anchor."""
+        expected = self.anchor_wall + (self.clock() - self.anchor_mono)
+        return self.wall() - expected
+
+    def window_label(self, epoch):
+        if self.local_time:
+            return datetime.fromtimestamp(epoch)
+        return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None)
+
+    @property
+    def first_window(self):
+        return self.window_label(self.anchor_wall)
+
+    # --------------------------------------------------
+    # Statistics
+    # --------------------------------------------------
+    def reset_stats(self):
+        self.ticks = 0
+        self.skipped = 0
+        self.caught_up = 0
+        self.overruns = 0
+        self.max_lateness = 0.0
+        self._lateness_sum = 0.0
+
+    def stats(self):
+        """Jitter / overrun counters since the last reset_stats()."""
+        sampled = self.ticks - self.skipped
+        return {
+            "ticks": self.ticks,
+            "skipped": self.skipped,
+            "caught_up": self.caught_up,
+            "overruns": self.overruns,
+            "mean_lateness_s": self._lateness_sum / sampled if sampled else 0.0,
+            "max_lateness_s": self.max_lateness,
+        }
+
+    # --------------------------------------------------
+    # Tick generation
+    # --------------------------------------------------
+    def __iter__(self):
+        while True:
+            yield self.next_tick()
+
+    def next_tick(self):
+        """Block until the next deadline and return its Tick."""
+        k, deadline = self._next_deadline()
+        now = start = self.clock()
+        while now < deadline:
+            self.sleep(deadline - now)
+            now = self.clock()
+        self.slept += now - start
+        return self._make_tick(k, deadline, now)
+
+    async def next_tick_async(self):
+        """next_tick() for asyncio: awaits the deadline instead of blocking."""
+        k, deadline = self._next_deadline()
+        now = start = self.clock()
+        while now < deadline:
+            await asyncio.sleep(deadline - now)
+            now = self.clock()
+        self.slept += now - start
+        return self._make_tick(k, deadline, now)
+
+    def _next_deadline(self):
+        k = self._next_index
+
+        # Re-anchor only between windows, never in the middle of one
+        if k % self.samples_per_window == 0 and abs(self.clock_offset()) > self.resync_threshold:
+            self.resyncs += 1
+            self._anchor()
+            k = 0
+
+        return k, self.anchor_mono + k * self.interval
+
+    def _make_tick(self, k, deadline, now):
+        spw = self.samples_per_window
+        lateness = now - deadline
+        overdue = int(lateness // self.interval)   # later deadlines already passed
+        if overdue:
+            self.overruns += 1
+        skipped = overdue > 0 and (
+            self.policy == "skip" or overdue > self.max_catchup
+        )
+        if not skipped and lateness >= self.interval:
+            self.caught_up += 1
+
+        self.ticks += 1
+        if skipped:
+            self.skipped += 1
+        else:
+            self._lateness_sum += lateness
+            self.max_lateness = max(self.max_lateness, lateness)
+
+        self._next_index = k + 1
+        window_epoch = self.anchor_wall + (k // spw) * self.window_seconds
+        return Tick(
+            index=k,
+            deadline=deadline,
+            epoch=self.anchor_wall + k * self.interval,
+            lateness=lateness,
+            skipped=skipped,
+            window_start=self.window_label(window_epoch),
+            sample_in_window=k % spw,
+            last_in_window=(k % spw == spw - 1),
+        )
@@ -0,0 +1,136 @@
+# Per-sensor circuit breaker for the RTD loggers
+
+'''
+Stops reading sensors that keep failing, and keeps their errors out of
+the log except for a summary.
+
+A dead probe or hat used to cost every scan a librtd timeout per call,
+and stretched the scan for every other sensor on that hat. Each error
+was logged as it happened, so one dead channel meant 10 log lines a
+window. SensorHealth tracks every sensor separately:
+
+    closed  - read normally; consecutive failures are counted
+    open    - after `threshold` consecutive failures the sensor is
+              skipped (Scanner.scan(skip=health.skip())) and flagged
+              as faulted in the output
+    re-probe - once its backoff has passed, an open sensor is read
+              again on the next tick: success closes the breaker,
+              another failure doubles the backoff (up to max_backoff)
+
+Logging is rate-limited: update() returns only the first error of each
+sensor in a window plus breaker transitions (faulted / recovered), and
+end_window() returns one summary line per sensor that had more.
+
+    health = SensorHealth(['h0c1', ...])
+    snap = scanner.scan(skip=health.skip())
+    for message in health.update(snap):
+        log_message(message)
+    ...
+    fault = health.window_fault        # per-sensor flag for the row
+    for message in health.end_window():
+        log_message(message)
+'''
+
+import time
+
+import numpy as np
+
+
+class SensorHealth:
+    """
+    names       - one label per sensor, in scan order (for messages)
+    threshold   - consecutive failures that open a sensor's breaker
+    backoff     - seconds before the first re-probe of an open sensor
+    max_backoff - cap on the doubling backoff
+    """
+
+    def __init__(self, names, threshold=3, backoff=60, max_backoff=3600, clock=time.monotonic):
+        n = len(names)
+        self.names = list(names)
+        self.threshold = threshold
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+
+        self.failures = np.zeros(n, dtype=np.int64)   # consecutive failed reads
+        self.open = np.zeros(n, dtype=bool)           # breaker open -> skip
+        self.wait = np.full(n, float(backoff))        # current backoff (s)
+        self.retry_at = np.zeros(n)                   # clock() of the next re-probe
+        self.opened_at = np.zeros(n)
+
+        # Per-window counters (reset by end_window)
+        self.window_errors = np.zeros(n, dtype=np.int64)
+        self.window_skipped = np.zeros(n, dtype=np.int64)
+        self.window_fault = np.zeros(n, dtype=bool)   # breaker open at any point
+        self._last_error = [""] * n
+
+    @property
+    def faulted(self):
+        """Indices whose breaker is open right now."""
+        return np.flatnonzero(self.open).tolist()
+
+    def skip(self):
+        """Open sensors not yet due for a re-probe (pass to Scanner.scan)."""
+        return np.flatnonzero(self.open & (self.clock() < self.retry_at)).tolist()
+
+    def update(self, snap):
+        """Fold in one scan; returns the messages worth logging now."""
+        now = self.clock()
+        messages = []
+
+        failed = np.zeros(len(self.names), dtype=bool)
+        failed[list(snap.errors)] = True
+        skipped = np.zeros(len(self.names), dtype=bool)
+        skipped[list(snap.skipped)] = True
+        self.window_skipped += skipped
+
+        for i, error in snap.errors.items():
+            name = self.names[i]
+            self.failures[i] += 1
+            self.window_errors[i] += 1
+            self._last_error[i] = error
+            if self.open[i]:
+                # Failed re-probe: wait longer before the next one
+                self.wait[i] = min(self.wait[i] * 2, self.max_backoff)
+                self.retry_at[i] = now + self.wait[i]
+            elif self.failures[i] >= self.threshold:
+                self.open[i] = True
+                self.opened_at[i] = now
+                self.retry_at[i] = now + self.wait[i]
+                messages.append(
+                    f"{name} faulted after {self.failures[i]} consecutive failures ({error}); "
+                    f"skipping it, re-probe in {self.wait[i]:.0f} s"
+                )
+            elif self.window_errors[i] == 1:
+                messages.append(f"Error reading {name}: {error}")
+
+        ok = ~failed & ~skipped
+        for i in np.flatnonzero(ok & self.open):
+            messages.append(
+                f"{self.names[i]} recovered after {now - self.opened_at[i]:.0f} s faulted"
+            )
+        self.failures[ok] = 0
+        self.open[ok] = False
+        self.wait[ok] = self.backoff
+
+        self.window_fault |= self.open
+        return messages
+
+    def end_window(self):
+        """Summary lines for the window just closed; resets the window counters."""
+        messages = []
+        for i, name in enumerate(self.names):
+            errors, skipped = self.window_errors[i], self.window_skipped[i]
+            if self.open[i]:
+                messages.append(
+                    f"{name} faulted: {errors} read errors, {skipped} reads skipped this window, "
+                    f"next re-probe in {max(0.0, self.retry_at[i] - self.clock()):.0f} s"
+                )
+            elif errors > 1:
+                messages.append(
+                    f"{name}: {errors} read errors this window (last: {self._last_error[i]})"
+                )
+        self.window_errors.fill(0)
+        self.window_skipped.fill(0)
+        self.window_fault[:] = self.open
+        return messages
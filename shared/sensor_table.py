@@ -0,0 +1,243 @@
+# Precompiled sensor table for the RTD loggers
+
+'''
+One loader for every array's sensor layout and offsets.
+
+The loggers used to look offsets up in the raw JSON dicts for every
+sensor on every sample - offsets_dict.get(key, [...]) on the tower,
+offsets_all[serial]["ch_N"] on the mobile units - with the sign of the
+correction hard-coded differently in each script. The JSON is now
+compiled once at startup into a SensorTable: read-only NumPy arrays in
+scan order, checked up front, with the sign convention built in.
+
+    fixed  sensor_offsets.json   "h<hat>c<ch>": [height_cm, sensor_number, offset]
+                                 corrected = raw + offset
+    mobile sensor_offsets.json   "<pi serial>": {"ch_<ch>": offset, ...}
+           raspi_serials.json    "<pi serial>": "<unit name>"
+                                 corrected = raw - offset
+
+    table = load_fixed("sensor_offsets.json")
+    corr = table.correct(snap.temp)            # one vector op per scan
+
+Problems (missing or unknown sensors, malformed entries, duplicate
+heights or sensor numbers, implausible offsets) raise ValueError, all of
+them listed in one message. The loggers pass missing_ok=True instead: a
+bad entry then costs only its own sensor, which is still scanned but has
+an unknown height / number and a NaN offset (so a NaN corrected
+temperature), and each problem goes to table.warnings. That is the one
+policy for both arrays and every kind of problem - a missing entry, a
+malformed one, or a mobile unit with no offsets at all: an uncalibrated
+sensor never passes its raw value off as corrected; the raw temperature
+is still logged in its own column.
+'''
+
+import json
+import math
+
+import numpy as np
+
+MAX_OFFSET = 5.0    # degC; anything larger is a typo, not a calibration
+
+
+class SensorTable:
+    """
+    Immutable per-sensor arrays, in scan order.
+
+    hat, ch      - librtd address
+    height_cm    - sensor height (-1 where unknown, e.g. mobile probes)
+    sensor_num   - physical sensor number (-1 where unknown)
+    offset       - calibration offset as stored in the JSON
+    sign         - +1 (corrected = raw + offset) or -1 (raw - offset)
+    correction   - sign * offset, added to raw temperatures
+    keys         - JSON key of each sensor ('h0c1', 'ch_1', ...)
+    unit         - array name ('fixed', 'OPIE_I', ...)
+    """
+
+    def __init__(self, unit, keys, hat, ch, height_cm, sensor_num, offset, sign, warnings=()):
+        self.unit = unit
+        self.keys = tuple(keys)
+        self.warnings = tuple(warnings)
+        self.hat = _frozen(hat, np.int16)
+        self.ch = _frozen(ch, np.int16)
+        self.height_cm = _frozen(height_cm, np.int32)
+        self.sensor_num = _frozen(sensor_num, np.int32)
+        self.offset = _frozen(offset, np.float64)
+        self.sign = _frozen(sign, np.float64)
+        self.correction = _frozen(self.sign * self.offset, np.float64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def sensors(self):
+        """[(hat, ch), ...] for Scanner / LivePublisher."""
+        return list(zip(self.hat.tolist(), self.ch.tolist()))
+
+    def correct(self, temp):
+        """Corrected temperatures for one scan (or a stack of scans)."""
+        return np.asarray(temp, dtype=np.float64) + self.correction
+
+    def labels(self):
+        """Column label per sensor: '<height>cm', or the key where the height is unknown."""
+        return [f"{h}cm" if h >= 0 else key for h, key in zip(self.height_cm.tolist(), self.keys)]
+
+    def meta(self):
+        """Per-sensor dicts for file headers / sidecars."""
+        rows = []
+        for i, key in enumerate(self.keys):
+            row = {"hat": int(self.hat[i]), "ch": int(self.ch[i]), "key": key}
+            if self.height_cm[i] >= 0:
+                row["height_cm"] = int(self.height_cm[i])
+            if self.sensor_num[i] >= 0:
+                row["sensor_num"] = int(self.sensor_num[i])
+            rows.append(row)
+        return rows
+
+
+def _frozen(values, dtype):
+    array = np.array(values, dtype=dtype)
+    array.flags.writeable = False
+    return array
+
+
+def _check_offset(key, offset, problems):
+    if not isinstance(offset, (int, float)) or isinstance(offset, bool) \
+            or not math.isfinite(offset) or abs(offset) > MAX_OFFSET:
+        problems.append(f"{key}: offset {offset!r} is not a number within +/-{MAX_OFFSET}")
+        return False
+    return True
+
+
+def _raise(path, problems):
+    if problems:
+        raise ValueError(f"{path}: " + "; ".join(problems))
+
+
+# ------------------------------------------------------
+# Fixed array
+# ------------------------------------------------------
+def load_fixed(offsets_path="sensor_offsets.json", hats=range(4), channels=range(1, 9),
+               missing_ok=False):
+    """
+    Tower layout: one [height_cm, sensor_number, offset] per h<hat>c<ch>.
+
+    missing_ok - a missing, malformed or duplicate entry leaves that
+                 sensor in the table with unknown height / number and a
+                 NaN offset, plus a warning (in table.warnings), instead
+                 of a ValueError, so the other sensors still log
+    """
+    with open(offsets_path) as f:
+        entries = json.load(f)
+
+    problems = []
+    keys, hat_col, ch_col, heights, numbers, offsets = [], [], [], [], [], []
+    bad = set()         # sensors (by index) whose entry failed validation
+    for hat in hats:
+        for ch in channels:
+            key = f"h{hat}c{ch}"
+            keys.append(key)
+            hat_col.append(hat)
+            ch_col.append(ch)
+            heights.append(-1)
+            numbers.append(-1)
+            offsets.append(math.nan)
+
+            entry = entries.get(key)
+            before = len(problems)
+            if entry is None:
+                problems.append(f"{key}: missing")
+            elif not isinstance(entry, list) or len(entry) != 3:
+                problems.append(f"{key}: expected [height_cm, sensor_number, offset], got {entry!r}")
+            else:
+                height, number, offset = entry
+                if not isinstance(height, int) or height < 0:
+                    problems.append(f"{key}: height {height!r} is not a whole number of cm")
+                elif not isinstance(number, int) or number < 0:
+                    problems.append(f"{key}: sensor number {number!r} is not a whole number")
+                elif _check_offset(key, offset, problems):
+                    heights[-1], numbers[-1], offsets[-1] = height, number, offset
+            if len(problems) > before:
+                bad.add(len(keys) - 1)
+
+    expected = set(keys)
+    unknown = [f"{key}: not a sensor of this array" for key in entries if key not in expected]
+    for name, column in (("height", heights), ("sensor number", numbers)):
+        seen = set()
+        for i, value in enumerate(column):
+            if i in bad:
+                continue
+            if value in seen:
+                problems.append(f"{keys[i]}: duplicate {name} {value}")
+                bad.add(i)
+            seen.add(value)
+
+    if not missing_ok:
+        _raise(offsets_path, problems + unknown)
+    for i in bad:
+        heights[i] = numbers[i] = -1
+        offsets[i] = math.nan
+    warnings = [f"{offsets_path}: {p}; logged without offset (corrected temperature NaN)" for p in problems]
+    warnings += [f"{offsets_path}: {p}; ignored" for p in unknown]
+
+    return SensorTable("fixed", keys, hat_col, ch_col, heights, numbers, offsets,
+                       [1.0] * len(keys), warnings)
+
+
+# ------------------------------------------------------
+# Mobile units
+# ------------------------------------------------------
+def load_mobile(serial, offsets_path="sensor_offsets.json", serials_path="raspi_serials.json",
+                channels=range(1, 9), missing_ok=False):
+    """
+    One hat, offsets by Pi serial ("ch_<ch>": offset), subtracted.
+
+    missing_ok - an unknown serial, or a missing or malformed ch_<ch>
+                 entry, gives the channels concerned a NaN offset and a
+                 warning (in table.warnings) instead of a ValueError, so
+                 a unit still logs raw data on every channel
+    """
+    with open(offsets_path) as f:
+        entries = json.load(f)
+    try:
+        with open(serials_path) as f:
+            units = json.load(f)
+    except FileNotFoundError:
+        units = {}
+
+    problems, warnings = [], []
+    unit = units.get(serial)
+    if unit is None:
+        warnings.append(f"serial {serial} is not listed in {serials_path}")
+        unit = serial
+
+    per_channel = entries.get(serial)
+    if per_channel is None:
+        if not missing_ok:
+            _raise(offsets_path, [f"no offsets for Raspberry Pi with serial {serial}"])
+        warnings.append(f"{offsets_path}: no offsets for serial {serial}; "
+                        f"logged without offsets (corrected temperatures NaN)")
+        per_channel = {}
+
+    keys, offsets = [], []
+    for ch in channels:
+        key = f"ch_{ch}"
+        keys.append(key)
+        offsets.append(math.nan)
+        offset = per_channel.get(key)
+        if offset is None:
+            if serial in entries:       # (an unlisted serial is one warning, above)
+                problems.append(f"{serial}/{key}: missing")
+        elif _check_offset(f"{serial}/{key}", offset, problems):
+            offsets[-1] = offset
+    expected = set(keys)
+    unknown = [f"{serial}/{key}: not a channel of this unit" for key in per_channel
+               if key not in expected]
+
+    if not missing_ok:
+        _raise(offsets_path, problems + unknown)
+    warnings += [f"{offsets_path}: {p}; logged without offset (corrected temperature NaN)" for p in problems]
+    warnings += [f"{offsets_path}: {p}; ignored" for p in unknown]
+
+    n = len(keys)
+    return SensorTable(unit, keys, [0] * n, list(channels), [-1] * n, [-1] * n, offsets,
+                       [-1.0] * n, warnings)
@@ -0,0 +1,123 @@
+# Wide-format CSV output for the RTD loggers
+
+'''
+One row per window, one column per sensor height.
+
+The long format writes one row per sensor per window and repeats the
+timestamp, hat, channel, height and sensor number on each of them. The
+wide format writes the timestamp once, followed by the chosen fields for
+every sensor, and moves the per-sensor metadata into a JSON sidecar next
+to the CSV (<name>.json). A season then loads with one read_csv() and
+no pivot.
+
+Fields (column prefix, format):
+
+    corr  T_<h>cm     corrected temperature   (default)
+    raw   Traw_<h>cm  raw temperature
+    resi  R_<h>cm     resistance
+    std   Tstd_<h>cm  temperature std-dev in the window
+    n     N_<h>cm     valid samples in the window
+    fault F_<h>cm     1 = sensor faulted (circuit breaker open) in the window
+
+With only 'corr' the tower writes 1 write per window instead of 32.
+
+Size against the long format, 32 heights, measured on synthetic windows
+(long rows ~1.9 kB per window either way):
+
+    decimals   wide row     smaller by
+    2 (default)  191-223 B    8.6x (all below 0 degC) to 9.9x (all above)
+    1            159-191 B    10.1x to 11.9x
+
+The default does NOT reach 10x: every height still needs its own value,
+and at 2 decimals that value is most of the row. decimals=1 (0.1 degC,
+about the probes' accuracy) does. The long format keeps 2 decimals
+either way.
+'''
+
+import json
+
+from data_files import prepare_data_file
+
+FIELDS = {
+    "corr": ("T", "{:.2f}", "corrected temperature (degC)"),
+    "raw": ("Traw", "{:.2f}", "raw temperature (degC)"),
+    "resi": ("R", "{:.1f}", "resistance (ohms)"),
+    "std": ("Tstd", "{:.3f}", "temperature std-dev within the window (degC)"),
+    "n": ("N", "{:d}", "valid samples in the window"),
+    "fault": ("F", "{:d}", "1 = sensor faulted (circuit breaker open) during the window"),
+}
+TEMPERATURE_FIELDS = ("corr", "raw")
+
+
+def _label(sensor):
+    return f"{sensor['height_cm']}cm" if "height_cm" in sensor else sensor["key"]
+
+
+class WideCsv:
+    """
+    Wide-format CSV writer.
+
+    sensors     - list of dicts with height_cm (or, where the height is
+                  unknown, key), in column order
+    fields      - which FIELDS to write, in order
+    time_column - name of the first column
+    decimals    - decimals of the temperature fields (corr, raw), None
+                  for the FIELDS default of 2
+    """
+
+    def __init__(self, path, sensors, fields=("corr",), time_column="Time(UTC)", decimals=None):
+        unknown = [f for f in fields if f not in FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown wide field(s) {unknown}, expected some of {list(FIELDS)}")
+        self.path = path
+        self.sensors = list(sensors)
+        self.fields = tuple(fields)
+        self.time_column = time_column
+        self.columns = [
+            f"{FIELDS[field][0]}_{_label(sensor)}"
+            for field in self.fields for sensor in self.sensors
+        ]
+        self._formats = [
+            f"{{:.{decimals}f}}" if decimals is not None and field in TEMPERATURE_FIELDS
+            else FIELDS[field][1]
+            for field in self.fields
+        ]
+
+    @property
+    def sidecar_path(self):
+        return self.path.with_suffix(".json")
+
+    def prepare(self):
+        """Write header and sidecar; returns an archived old file, if any."""
+        header = ",".join([self.time_column] + self.columns) + "\n"
+        archived = prepare_data_file(self.path, header)
+        self.sidecar_path.write_text(json.dumps(self.sidecar(), indent=2) + "\n")
+        return archived
+
+    def sidecar(self):
+        columns = []
+        for field, fmt in zip(self.fields, self._formats):
+            prefix, _, description = FIELDS[field]
+            for sensor in self.sensors:
+                columns.append({
+                    "name": f"{prefix}_{_label(sensor)}",
+                    "field": field,
+                    "description": description,
+                    "format": fmt,
+                    **sensor,
+                })
+        return {"time_column": self.time_column, "columns": columns}
+
+    def format_row(self, timestamp, values):
+        """values maps each field to a sequence aligned with sensors."""
+        parts = [f"{timestamp:%Y-%m-%d %H:%M:%S}"]
+        for field, fmt in zip(self.fields, self._formats):
+            if field in ("n", "fault"):
+                parts.extend(fmt.format(int(v)) for v in values[field])
+            else:
+                parts.extend(fmt.format(v) for v in values[field])
+        return ",".join(parts) + "\n"
+
+    def write(self, timestamp, values):
+        with self.path.open("a") as f:
+            f.write(self.format_row(timestamp, values))
@@ -0,0 +1,89 @@
+# Incremental windowing engine for the RTD loggers
+
+'''
+Bins timestamped scans into fixed windows and closes each window once.
+
+The old mobile log_rtd.py concatenated every scan onto a DataFrame,
+re-parsed all its timestamps and, every 5 minutes, grouped the whole
+buffer and re-wrote every bin in it, so finished windows were written
+again and again.
+
+WindowEngine folds each scan into a WindowAccumulator for the open bin
+(O(1) work, no per-sample allocation). When a scan lands in a later bin
+the open one is closed and returned exactly once. Closed windows go
+into a fixed-size ring so recent history stays available in memory.
+
+    engine = WindowEngine(8, fields=('temp', 'resi', 'corr'))
+    for closed in engine.add(epoch, temp, resi, corr):
+        write(closed.start, closed.stats)
+
+Scans that arrive for an already-closed bin are dropped and counted in
+engine.late instead of reopening it.
+'''
+
+from collections import deque
+
+from window_stats import WindowAccumulator
+
+
+class ClosedWindow:
+    """One completed window: start epoch (s) and its WindowStats."""
+
+    __slots__ = ("start", "stats")
+
+    def __init__(self, start, stats):
+        self.start = start
+        self.stats = stats
+
+
+class WindowEngine:
+    """
+    Streaming fixed-window binning.
+
+    n_sensors      - values per field in every scan
+    fields         - field names, in the order add() receives them
+    window_seconds - bin width; bins start on multiples of it (epoch)
+    history        - closed windows kept in the in-memory ring
+    """
+
+    def __init__(self, n_sensors, fields=("resi", "temp", "corr"),
+                 window_seconds=300, history=12):
+        self.window_seconds = window_seconds
+        self.accum = WindowAccumulator(n_sensors, fields)
+        self.recent = deque(maxlen=history)
+        self.open_start = None
+        self.late = 0
+
+    def bin_start(self, epoch):
+        return epoch - epoch % self.window_seconds
+
+    def add(self, epoch, *values):
+        """Fold in one scan; return the windows this scan completed."""
+        start = self.bin_start(epoch)
+        closed = []
+        if self.open_start is not None and start != self.open_start:
+            if start < self.open_start:
+                self.late += 1
+                return closed
+            closed.append(self._close())
+        if self.open_start is None:
+            self.open_start = start
+        self.accum.add(*values)
+        return closed
+
+    def flush(self):
+        """Close the open window early (e.g. on shutdown)."""
+        return [self._close()] if self.open_start is not None else []
+
+    def current(self):
+        """Partial statistics of the open window, or None."""
+        if self.open_start is None:
+            return None
+        return ClosedWindow(self.open_start, self.accum.result())
+
+    def _close(self):
+        window = ClosedWindow(self.open_start, self.accum.result())
+        self.recent.append(window)
+        self.accum.reset()
+        self.open_start = None
+        return window
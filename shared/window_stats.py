@@ -0,0 +1,97 @@
+# Streaming window statistics for the RTD loggers
+
+'''
+Constant-memory accumulator for one averaging window.
+
+The old loggers kept a list of (resi, temp, corr_temp) tuples per
+channel, rebuilt the dict every window and averaged it with three
+sum() passes. One failed read (NaN) also made the whole window NaN.
+
+WindowAccumulator keeps count / mean / M2 / min / max for every field
+of every sensor in fixed NumPy arrays and folds each scan in with
+Welford's update, in place. NaN readings are skipped, so a window with
+one bad read still averages its 9 good ones, and the count of valid
+samples goes out with the result.
+
+    accum = WindowAccumulator(n_sensors=32, fields=('resi', 'temp', 'corr'))
+    accum.add(resi, temp, corr)         # once per scan, sequences of 32
+    stats = accum.result()              # at window close
+    stats.mean[accum.field('temp')]     # -> array of 32 means
+    accum.reset()
+'''
+
+import numpy as np
+
+
+class WindowStats:
+    """Per-field, per-sensor statistics for one closed window."""
+
+    def __init__(self, fields, count, mean, std, minimum, maximum):
+        self.fields = fields
+        self.count = count        # (n_fields, n_sensors) valid samples
+        self.mean = mean          # NaN where count == 0
+        self.std = std            # sample std-dev, NaN where count < 2
+        self.min = minimum
+        self.max = maximum
+
+
+class WindowAccumulator:
+    """Welford accumulator over (n_fields, n_sensors) arrays, NaN-aware."""
+
+    def __init__(self, n_sensors, fields=("resi", "temp", "corr")):
+        self.fields = tuple(fields)
+        self.n_sensors = n_sensors
+        shape = (len(self.fields), n_sensors)
+
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+        self.min = np.empty(shape)
+        self.max = np.empty(shape)
+
+        # Scratch buffers, reused by every add()
+        self._x = np.empty(shape)
+        self._valid = np.empty(shape, dtype=bool)
+        self._delta = np.empty(shape)
+        self._tmp = np.empty(shape)
+        self.reset()
+
+    def field(self, name):
+        """Row index of a field in the result arrays."""
+        return self.fields.index(name)
+
+    def reset(self):
+        self.count.fill(0)
+        self.mean.fill(0.0)
+        self.m2.fill(0.0)
+        self.min.fill(np.inf)
+        self.max.fill(-np.inf)
+
+    def add(self, *values):
+        """Fold in one scan: one sequence of n_sensors values per field."""
+        x, valid, delta, tmp = self._x, self._valid, self._delta, self._tmp
+        for row, v in zip(x, values):
+            row[:] = v
+        np.isfinite(x, out=valid)
+
+        np.add(self.count, 1, out=self.count, where=valid)
+        np.subtract(x, self.mean, out=delta, where=valid)
+        np.divide(delta, self.count, out=tmp, where=valid)
+        np.add(self.mean, tmp, out=self.mean, where=valid)
+        np.subtract(x, self.mean, out=tmp, where=valid)
+        np.multiply(delta, tmp, out=tmp, where=valid)
+        np.add(self.m2, tmp, out=self.m2, where=valid)
+        np.fmin(self.min, x, out=self.min)
+        np.fmax(self.max, x, out=self.max)
+
+    def result(self):
+        """Snapshot of the current window (safe to keep after reset())."""
+        count = self.count.copy()
+        empty = count == 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            var = self.m2 / (count - 1)
+        var[count < 2] = np.nan
+        mean = np.where(empty, np.nan, self.mean)
+        minimum = np.where(empty, np.nan, self.min)
+        maximum = np.where(empty, np.nan, self.max)
+        return WindowStats(self.fields, count, mean, np.sqrt(var), minimum, maximum)
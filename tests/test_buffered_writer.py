@@ -0,0 +1,41 @@
+# Tests for the journaled buffered writer
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'shared'))
+from buffered_writer import BufferedWriter
+
+
+def test_close_after_interrupted_flush_writes_rows_once(tmp_path):
+    writer = BufferedWriter(tmp_path / 'rtd.journal', sync=False)
+    a, b = tmp_path / 'a.csv', tmp_path / 'b.csv'
+    writer.write(a, 'row1\n')
+    writer.write(b, 'row1\n')
+    writer.commit()
+
+    # SIGTERM -> SystemExit right after the first file was appended
+    fsync = writer._fsync
+    writer._fsync = lambda f: (_ for _ in ()).throw(SystemExit(0))
+    with pytest.raises(SystemExit):
+        writer.flush()
+    writer._fsync = fsync
+
+    writer.close()
+    assert a.read_text() == 'row1\n'
+    assert b.read_text() == 'row1\n'
+
+
+def test_replay_after_crash_restores_committed_rows(tmp_path):
+    journal = tmp_path / 'rtd.journal'
+    data = tmp_path / 'a.csv'
+    writer = BufferedWriter(journal, sync=False)
+    writer.write(data, 'row1\nrow2\n')
+    writer.commit()
+    writer._journal.close()     # power loss: nothing flushed to the file
+
+    replayed = BufferedWriter(journal, sync=False)
+    assert replayed.replayed == len('row1\nrow2\n')
+    assert data.read_text() == 'row1\nrow2\n'
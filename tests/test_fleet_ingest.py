@@ -0,0 +1,39 @@
+# Tests for the fleet ingest time handling
+
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'shared'))
+from fleet_ingest import LOCAL_TZ, Layout, _to_utc
+
+MOBILE_HEADER = "Timestamp,Channel,Temp,Resi,Corr_Temp,Temp_Std,N_Valid,Fault\r\n"
+
+
+def local_windows(start, count, channels=2):
+    """5-min local window labels, one row per channel."""
+    return [start + timedelta(minutes=5 * k) for k in range(count) for _ in range(channels)]
+
+
+@pytest.mark.parametrize('split', [None, 30, 47])
+def test_fall_back_gives_unique_utc_times(split):
+    # 2026-11-01 in Los Angeles: 01:00-01:59 local happens twice
+    local = (local_windows(datetime(2026, 11, 1, 0, 30), 18)       # 00:30 .. 01:55 PDT
+             + local_windows(datetime(2026, 11, 1, 1, 0), 18))     # 01:00 .. 02:25 PST
+    layout = Layout(MOBILE_HEADER)
+    blocks = [local] if split is None else [local[:split], local[split:]]
+
+    utc, state = [], None
+    for block in blocks:
+        times, state = _to_utc(pa.array(block, pa.timestamp('s')), layout, LOCAL_TZ, state)
+        utc += times.cast(pa.int64()).to_pylist()     # epoch seconds
+
+    stamps = sorted(set(utc))
+    assert len(stamps) == len(local) // 2
+    assert {b - a for a, b in zip(stamps, stamps[1:])} == {300}
+    assert stamps[0] == datetime(2026, 11, 1, 7, 30, tzinfo=timezone.utc).timestamp()    # 00:30 PDT
+    assert stamps[-1] == datetime(2026, 11, 1, 10, 25, tzinfo=timezone.utc).timestamp()  # 02:25 PST
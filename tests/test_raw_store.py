@@ -0,0 +1,59 @@
+# Tests for the binary raw-sample store
+
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'shared'))
+from raw_store import RawStoreReader, RawStoreWriter
+from sensor_table import load_fixed
+
+REPO = Path(__file__).resolve().parents[1]
+FIXED_OFFSETS = REPO / 'fixed-array' / 'scripts' / 'sensor_offsets.json'
+
+
+def append_scan(store, epoch):
+    store.append(epoch, np.full(store.n, 100.0), np.full(store.n, -2.0))
+    store.flush()
+
+
+def test_reopen_after_offsets_edit_keeps_appending(tmp_path):
+    path = tmp_path / 'raw.bin'
+    store = RawStoreWriter(path, load_fixed(FIXED_OFFSETS).meta())
+    append_scan(store, 1.0)
+    store.close()
+
+    # Re-surveyed height and a sensor the loader now drops to unknown
+    offsets = json.loads(FIXED_OFFSETS.read_text())
+    offsets['h0c1'][0] += 1000
+    del offsets['h0c2']
+    edited = tmp_path / 'sensor_offsets.json'
+    edited.write_text(json.dumps(offsets))
+    sensors = load_fixed(edited, missing_ok=True).meta()
+
+    store = RawStoreWriter(path, sensors)
+    append_scan(store, 2.0)
+    store.close()
+
+    assert store.archived is None
+    reader = RawStoreReader(path)
+    assert reader.records['epoch'].tolist() == [1.0, 2.0]
+    assert reader.sensors == sensors
+
+
+def test_reopen_with_other_layout_archives_old_store(tmp_path):
+    path = tmp_path / 'raw.bin'
+    sensors = load_fixed(FIXED_OFFSETS).meta()
+    store = RawStoreWriter(path, sensors)
+    append_scan(store, 1.0)
+    store.close()
+
+    store = RawStoreWriter(path, sensors[:8])
+    append_scan(store, 2.0)
+    store.close()
+
+    assert store.archived is not None and store.archived.is_file()
+    assert RawStoreReader(store.archived).records['epoch'].tolist() == [1.0]
+    assert RawStoreReader(path).records['epoch'].tolist() == [2.0]
@@ -0,0 +1,33 @@
+# Tests for the hourly / daily rollups
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'shared'))
+from data_files import prepare_data_file
+from rollups import Rollups
+
+BASELINE_HEADER = ("Time(UTC),Hat,Channel,Height_cm,Sensor_Number,Resistance_ohms,"
+                   "RawTemp_degC,CorrectedTemp_degC\n")
+DATA_HEADER = ("Time(UTC),Hat,Channel,Height_cm,Sensor_Number,Resistance_ohms,"
+               "RawTemp_degC,CorrectedTemp_degC,StdTemp_degC,N_Valid,Fault\n")
+
+
+def test_replay_keeps_archived_baseline_windows(tmp_path):
+    data = tmp_path / 'rtd_tower_data.csv'
+    data.write_text(BASELINE_HEADER + "".join(
+        f"2026-01-01 {h:02d}:{m:02d}:00,0,1,0,1,990.0,-2.00,-2.50\n"
+        for h in range(3) for m in range(0, 60, 5)
+    ))
+    assert prepare_data_file(data, DATA_HEADER) is not None
+    with data.open('a') as f:
+        f.write("2026-01-01 03:00:00,0,1,0,1,990.0,-1.00,-1.50,0.010,10,0\n")
+
+    rows = {}
+    rollups = Rollups(data, ['0cm'], lambda path, text: rows.setdefault(path.name, []).append(text))
+    rollups.prepare()
+    replayed = rollups.replay(data, ('Hat', 'Channel'), [('0', '1')], 'CorrectedTemp_degC', 'N_Valid')
+
+    assert replayed == 37
+    hourly = rows['rtd_tower_data_hourly.csv']
+    assert hourly == ["2026-01-01 0%d:00:00,-2.50,-2.50,-2.50,12\n" % h for h in range(3)]
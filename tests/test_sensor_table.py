@@ -0,0 +1,52 @@
+# Tests for the compiled sensor table
+
+import json
+import math
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'shared'))
+from sensor_table import load_mobile
+
+SERIAL = "abc"
+
+
+def write_offsets(tmp_path, per_channel):
+    path = tmp_path / "sensor_offsets.json"
+    path.write_text(json.dumps({SERIAL: per_channel}))
+    return path
+
+
+def test_mobile_bad_channel_costs_only_that_channel(tmp_path):
+    per_channel = {f"ch_{ch}": 0.1 for ch in range(1, 9)}
+    del per_channel["ch_2"]
+    per_channel["ch_5"] = 99.0
+    path = write_offsets(tmp_path, per_channel)
+
+    table = load_mobile(SERIAL, path, tmp_path / "raspi_serials.json", missing_ok=True)
+
+    assert len(table) == 8
+    assert table.ch.tolist() == list(range(1, 9))
+    assert math.isnan(table.offset[1]) and math.isnan(table.offset[4])
+    assert table.offset[0] == 0.1
+    assert any("ch_2: missing" in w for w in table.warnings)
+    assert any("ch_5" in w for w in table.warnings)
+
+
+def test_mobile_bad_channel_raises_without_missing_ok(tmp_path):
+    path = write_offsets(tmp_path, {f"ch_{ch}": 0.1 for ch in range(1, 8)})
+    with pytest.raises(ValueError, match="ch_8: missing"):
+        load_mobile(SERIAL, path, tmp_path / "raspi_serials.json")
+
+
+def test_mobile_unknown_serial_gets_nan_offsets(tmp_path):
+    path = write_offsets(tmp_path, {f"ch_{ch}": 0.1 for ch in range(1, 9)})
+
+    table = load_mobile("not-a-unit", path, tmp_path / "raspi_serials.json", missing_ok=True)
+
+    assert len(table) == 8
+    assert all(math.isnan(offset) for offset in table.offset)
+    assert all(math.isnan(value) for value in table.correct([-2.0] * 8))
+    assert any("no offsets for serial not-a-unit" in w for w in table.warnings)